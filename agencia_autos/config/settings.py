@@ -34,11 +34,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricasRequestMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RolesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -47,7 +49,8 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render (core.metricas)
+        'BACKEND': 'core.plantillas.DjangoTemplatesMedidos',
         'DIRS': [BASE_DIR / 'core' / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,9 +78,30 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASS', 'autos_pass'),
         'HOST': os.getenv('DB_HOST', '127.0.0.1'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Conexiones persistentes: segundos que se reutiliza la conexión de cada
+        # hilo entre requests (0 = una conexión por request, None = sin límite)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        # Verificar la conexión persistente (o la del pool) antes de reutilizarla
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# Pool de conexiones en proceso (core.db_pool) para servidores con hilos.
+# Cada proceso abre como máximo DB_POOL_MAX conexiones: procesos x DB_POOL_MAX
+# debe quedar por debajo de max_connections de PostgreSQL.
+if os.getenv('DB_POOL_ACTIVO', 'False') == 'True':
+    DATABASES['default'].update({
+        'ENGINE': 'core.db_pool',
+        # Cada request devuelve su conexión al pool al terminar
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MIN': int(os.getenv('DB_POOL_MIN', '2')),
+            'MAX': int(os.getenv('DB_POOL_MAX', '10')),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            'MAX_INACTIVO': float(os.getenv('DB_POOL_MAX_INACTIVO', '300')),
+        },
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -126,20 +150,96 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'  # Redirigir al dashboard después del login
 LOGOUT_REDIRECT_URL = 'login'
 
-# Logging de SQL queries para debugging
+# Tiempo (segundos) que se conservan en caché los roles de cada usuario.
+# Los cambios hechos en este proceso se invalidan al instante por señales.
+ROLES_CACHE_TIMEOUT = int(os.getenv('ROLES_CACHE_TIMEOUT', '300'))
+
+# Tiempo (segundos) que se conservan en caché los catálogos (marcas, tipos, etc.).
+# Guardar un catálogo en este proceso los invalida al instante por señales.
+CATALOGOS_CACHE_TIMEOUT = int(os.getenv('CATALOGOS_CACHE_TIMEOUT', '3600'))
+
+# Tiempo (segundos) que se conserva en caché el ranking mensual de vendedores.
+# Registrar o cancelar ventas en este proceso lo invalida al instante.
+RANKING_VENDEDORES_CACHE_TIMEOUT = int(os.getenv('RANKING_VENDEDORES_CACHE_TIMEOUT', '60'))
+
+# Tiempo (segundos) que se conservan en caché los agregados de ventas del año en
+# curso para PIVOT, top de marcas y tendencias. Los años cerrados no expiran: su
+# llave cambia cuando refrescar_reportes recalcula meses de años anteriores.
+REPORTES_ANIO_ACTUAL_CACHE_TIMEOUT = int(os.getenv('REPORTES_ANIO_ACTUAL_CACHE_TIMEOUT', '300'))
+
+# Vistas asíncronas (core.views_async) para inicio, dashboard y reportes por año:
+# sus consultas independientes se ejecutan en paralelo, cada una con su propia
+# conexión. Pensado para servir con ASGI (config.asgi); con WSGI también
+# funcionan. Con el pool activo, cada página puede tomar varias conexiones a la vez.
+VISTAS_ASINCRONAS = os.getenv('VISTAS_ASINCRONAS', 'False') == 'True'
+
+# Exportaciones PDF/Excel en segundo plano (python manage.py procesar_exportaciones).
+# Con True las vistas encolan el trabajo en lugar de generar el archivo en el request.
+EXPORTACIONES_EN_SEGUNDO_PLANO = os.getenv('EXPORTACIONES_EN_SEGUNDO_PLANO', 'False') == 'True'
+EXPORTACIONES_DIR = os.getenv('EXPORTACIONES_DIR', str(BASE_DIR / 'exportaciones'))
+# Veces que se toma un trabajo colgado antes de marcarlo como ERROR en lugar de reencolarlo
+EXPORTACIONES_MAX_INTENTOS = int(os.getenv('EXPORTACIONES_MAX_INTENTOS', '3'))
+
+# Caché en disco de reportes PDF/Excel (clave: tipo + filtros + versión de datos).
+# Se expulsan los archivos de uso menos reciente al superar cualquiera de los límites.
+REPORTES_CACHE_ACTIVO = os.getenv('REPORTES_CACHE_ACTIVO', 'True') == 'True'
+REPORTES_CACHE_DIR = os.getenv('REPORTES_CACHE_DIR', str(BASE_DIR / 'exportaciones' / 'cache'))
+REPORTES_CACHE_MAX_MB = int(os.getenv('REPORTES_CACHE_MAX_MB', '200'))
+REPORTES_CACHE_MAX_ARCHIVOS = int(os.getenv('REPORTES_CACHE_MAX_ARCHIVOS', '500'))
+
+# Métricas por vista (consultas, tiempo de BD/render, tamaño) en memoria y
+# cabecera Server-Timing; se consultan en /admin/diagnostico/rendimiento/.
+# VENTANA = muestras recientes que se conservan por vista para los percentiles.
+METRICAS_REQUESTS_ACTIVO = os.getenv('METRICAS_REQUESTS_ACTIVO', 'True') == 'True'
+METRICAS_REQUESTS_VENTANA = int(os.getenv('METRICAS_REQUESTS_VENTANA', '500'))
+
+# Logging de SQL, apagado por defecto (formatear y escribir cada consulta cuesta
+# CPU y E/S en cada request):
+#   SQL_LOG=off     sin logging de SQL
+#   SQL_LOG=lentas  consultas con duración >= SQL_LOG_UMBRAL_MS, con la vista
+#                   que las originó, en un archivo rotativo (SQL_LOG_ARCHIVO)
+#   SQL_LOG=todas   todas las consultas a consola (django.db.backends, solo con DEBUG=True)
+SQL_LOG = os.getenv('SQL_LOG', 'off')
+SQL_LOG_UMBRAL_MS = float(os.getenv('SQL_LOG_UMBRAL_MS', '200'))
+SQL_LOG_ARCHIVO = os.getenv('SQL_LOG_ARCHIVO', str(BASE_DIR / 'logs' / 'sql_lentas.log'))
+SQL_LOG_MAX_MB = int(os.getenv('SQL_LOG_MAX_MB', '10'))
+SQL_LOG_RESPALDOS = int(os.getenv('SQL_LOG_RESPALDOS', '5'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'sql_lentas': {
+            'format': '%(asctime)s %(message)s',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
     },
-    'loggers': {
-        'django.db.backends': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
-        },
-    },
+    'loggers': {},
 }
+
+if SQL_LOG == 'lentas':
+    os.makedirs(os.path.dirname(SQL_LOG_ARCHIVO), exist_ok=True)
+    MIDDLEWARE.insert(0, 'core.middleware.ConsultasLentasMiddleware')
+    LOGGING['handlers']['sql_lentas'] = {
+        'class': 'logging.handlers.RotatingFileHandler',
+        'filename': SQL_LOG_ARCHIVO,
+        'maxBytes': SQL_LOG_MAX_MB * 1024 * 1024,
+        'backupCount': SQL_LOG_RESPALDOS,
+        'encoding': 'utf-8',
+        'formatter': 'sql_lentas',
+    }
+    LOGGING['loggers']['core.sql_lentas'] = {
+        'handlers': ['sql_lentas'],
+        'level': 'WARNING',
+        'propagate': False,
+    }
+elif SQL_LOG == 'todas':
+    LOGGING['loggers']['django.db.backends'] = {
+        'handlers': ['console'],
+        'level': 'DEBUG',
+        'propagate': False,
+    }
@@ -5,7 +5,8 @@ from django.contrib import admin
 from django.urls import path, include
 from core.admin import (
     top_marcas_view, disponibilidad_view, clasificacion_clientes_view,
-    pivot_ventas_view, ranking_marcas_view, inventario_analisis_view
+    pivot_ventas_view, ranking_marcas_view, inventario_analisis_view,
+    diagnostico_conexiones_view, rendimiento_view
 )
 
 urlpatterns = [
@@ -16,6 +17,8 @@ urlpatterns = [
     path('admin/reportes/pivot-ventas/', pivot_ventas_view, name='admin_pivot_ventas'),
     path('admin/reportes/ranking-marcas/', ranking_marcas_view, name='admin_ranking_marcas'),
     path('admin/reportes/inventario-analisis/', inventario_analisis_view, name='admin_inventario_analisis'),
+    path('admin/diagnostico/conexiones/', diagnostico_conexiones_view, name='admin_diagnostico_conexiones'),
+    path('admin/diagnostico/rendimiento/', rendimiento_view, name='admin_diagnostico_rendimiento'),
     
     # Admin principal
     path('admin/', admin.site.urls),
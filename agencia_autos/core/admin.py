@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     Marca, TipoVehiculo, MetodoPago, TipoDocumento,
     Empleado, Cliente, Vehiculo, Venta, DetalleVenta,
-    AudVenta, AudVehiculo, AudErrores
+    AudVenta, AudVehiculo, AudErrores, TrabajoExportacion
 )
 
 
@@ -61,6 +61,7 @@ class EmpleadoAdmin(admin.ModelAdmin):
 class ClienteAdmin(admin.ModelAdmin):
     list_display = ['id', 'nombre_completo', 'email', 'telefono', 'tipo_documento', 'fecha_registro', 'get_clasificacion']
     list_filter = ['tipo_documento', 'fecha_registro']
+    list_select_related = ['tipo_documento', 'metricas']
     search_fields = ['nombre_completo', 'email', 'numero_documento']
     readonly_fields = ['fecha_creacion', 'fecha_modificacion', 'ver_historial']
     actions = ['ver_clasificacion_clientes']
@@ -81,26 +82,10 @@ class ClienteAdmin(admin.ModelAdmin):
     )
     
     def get_clasificacion(self, obj):
-        from django.db import connection
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT 
-                        CASE 
-                            WHEN COUNT(v.id) >= 5 THEN 'VIP'
-                            WHEN COUNT(v.id) >= 3 THEN 'FRECUENTE'
-                            WHEN COUNT(v.id) >= 1 THEN 'REGULAR'
-                            ELSE 'NUEVO'
-                        END AS clasificacion
-                    FROM cliente c
-                    LEFT JOIN venta v ON c.id = v.cliente_id AND v.estado_venta = 'ACTIVA'
-                    WHERE c.id = %s
-                    GROUP BY c.id
-                """, [obj.id])
-                result = cursor.fetchone()
-                return result[0] if result else 'NUEVO'
-        except:
-            return 'N/A'
+        # Leída de cliente_metricas en la misma consulta del listado (list_select_related)
+        metricas = getattr(obj, 'metricas', None)
+        return metricas.segmento if metricas else 'NUEVO'
+    get_clasificacion.admin_order_field = 'metricas__total_compras'
     get_clasificacion.short_description = 'Clasificacion'
     
     def ver_historial(self, obj):
@@ -148,10 +133,10 @@ class ClienteAdmin(admin.ModelAdmin):
             cursor.execute("SELECT * FROM clasificar_clientes()")
             rows = cursor.fetchall()
             
-            vip = sum(1 for r in rows if r[3] == 'VIP')
-            frecuente = sum(1 for r in rows if r[3] == 'FRECUENTE')
-            regular = sum(1 for r in rows if r[3] == 'REGULAR')
-            nuevo = sum(1 for r in rows if r[3] == 'NUEVO')
+            vip = sum(1 for r in rows if r[5] == 'VIP')
+            frecuente = sum(1 for r in rows if r[5] == 'FRECUENTE')
+            regular = sum(1 for r in rows if r[5] == 'REGULAR')
+            nuevo = sum(1 for r in rows if r[5] == 'NUEVO')
             
             self.message_user(
                 request,
@@ -221,33 +206,30 @@ class VentaAdmin(admin.ModelAdmin):
     )
     
     def cancelar_ventas_seleccionadas(self, request, queryset):
-        from django.db import connection
+        from django.contrib import messages
+        from .services.ventas import cancelar_ventas_lote_service
         
-        ventas_canceladas = 0
-        vehiculos_liberados = 0
+        # Una sola llamada a cancelar_ventas_lote() para toda la selección
+        venta_ids = list(queryset.order_by('id').values_list('id', flat=True))
+        resultados = cancelar_ventas_lote_service(venta_ids)
         
-        for venta in queryset:
-            if venta.estado_venta == 'ACTIVA':
-                # Usar el procedimiento almacenado de la BD
-                with connection.cursor() as cursor:
-                    cursor.execute("SELECT cancelar_venta(%s)", [venta.id])
-                    resultado = cursor.fetchone()[0]
-                    
-                    if resultado:
-                        ventas_canceladas += 1
-                        # Contar vehiculos liberados
-                        vehiculos_liberados += venta.detalles.count()
+        canceladas = [r for r in resultados if r['cancelada']]
+        rechazadas = [r for r in resultados if not r['cancelada']]
         
-        if ventas_canceladas > 0:
+        if canceladas:
+            vehiculos_liberados = sum(r['vehiculos_liberados'] for r in canceladas)
             self.message_user(
                 request,
-                f'{ventas_canceladas} venta(s) cancelada(s) exitosamente. {vehiculos_liberados} vehiculo(s) liberado(s).'
+                f'{len(canceladas)} venta(s) cancelada(s) exitosamente. {vehiculos_liberados} vehiculo(s) liberado(s).'
             )
-        else:
+        if rechazadas:
+            detalle = '; '.join(f"#{r['venta_id']}: {r['error']}" for r in rechazadas[:10])
+            if len(rechazadas) > 10:
+                detalle += f'; y {len(rechazadas) - 10} más'
             self.message_user(
                 request,
-                'No se cancelaron ventas. Solo se pueden cancelar ventas ACTIVAS.',
-                level='warning'
+                f'{len(rechazadas)} venta(s) no cancelada(s): {detalle}',
+                level=messages.WARNING
             )
     
     cancelar_ventas_seleccionadas.short_description = "Cancelar ventas seleccionadas"
@@ -291,9 +273,16 @@ admin.site.index_title = 'Panel de Administración'
 
 
 # Vistas personalizadas para reportes de procedimientos almacenados
+from datetime import date
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db import connection
+from . import catalogos
+from .services.reportes import (
+    anios_con_ventas, estado_reportes_materializados, analisis_inventario, NIVELES_INVENTARIO,
+    pivot_ventas_mes_marca,
+)
+from .paginacion import KeysetPaginator
 
 @staff_member_required
 def top_marcas_view(request):
@@ -311,9 +300,7 @@ def top_marcas_view(request):
         results = [dict(zip(columns, row)) for row in cursor.fetchall()]
     
     # Obtener años disponibles
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT DISTINCT EXTRACT(YEAR FROM fecha_venta)::INT as anio FROM venta ORDER BY anio DESC")
-        anios_disponibles = [row[0] for row in cursor.fetchall()]
+    anios_disponibles = anios_con_ventas()
     
     context = {
         'title': 'Top Marcas y Modelos Más Vendidos',
@@ -344,9 +331,8 @@ def disponibilidad_view(request):
         results = [dict(zip(columns, row)) for row in cursor.fetchall()]
     
     # Obtener marcas y tipos para filtros
-    from .models import Marca, TipoVehiculo
-    marcas = Marca.objects.filter(activo=True).order_by('nombre')
-    tipos = TipoVehiculo.objects.filter(activo=True).order_by('nombre')
+    marcas = catalogos.activos('marca')
+    tipos = catalogos.activos('tipo_vehiculo')
     
     context = {
         'title': 'Disponibilidad de Vehículos por Marca y Tipo',
@@ -367,23 +353,18 @@ def disponibilidad_view(request):
 def clasificacion_clientes_view(request):
     """Vista para mostrar Clasificación de Clientes (Procedimiento: clasificar_clientes)"""
     with connection.cursor() as cursor:
+        # cliente_metricas se mantiene por triggers: no hace falta agrupar venta
         cursor.execute("""
             SELECT 
-                c.id::bigint AS cliente_id,
-                c.nombre_completo::varchar AS nombre_completo,
-                c.email::varchar AS email,
-                COUNT(v.id)::bigint AS total_compras,
-                COALESCE(SUM(v.total_venta), 0)::numeric AS monto_total,
-                CASE 
-                    WHEN COUNT(v.id) >= 5 THEN 'VIP'
-                    WHEN COUNT(v.id) >= 3 THEN 'FRECUENTE'
-                    WHEN COUNT(v.id) >= 1 THEN 'REGULAR'
-                    ELSE 'NUEVO'
-                END AS clasificacion
-            FROM cliente c
-            LEFT JOIN venta v ON c.id = v.cliente_id AND v.estado_venta = 'ACTIVA'
-            GROUP BY c.id, c.nombre_completo, c.email
-            ORDER BY total_compras DESC, monto_total DESC
+                c.id AS cliente_id,
+                c.nombre_completo,
+                c.email,
+                m.total_compras,
+                m.monto_total,
+                m.segmento AS clasificacion
+            FROM cliente_metricas m
+            JOIN cliente c ON c.id = m.cliente_id
+            ORDER BY m.total_compras DESC, m.monto_total DESC
         """)
         columns = [col[0] for col in cursor.description]
         results = [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -413,28 +394,21 @@ def clasificacion_clientes_view(request):
 
 @staff_member_required
 def pivot_ventas_view(request):
-    """Vista para mostrar PIVOT de Ventas por Mes y Marca (Vista: vw_ventas_mes_marca)"""
+    """Vista para mostrar PIVOT de Ventas por Mes y Marca (una columna por marca vendida)"""
     anio = request.GET.get('anio', None)
     
-    with connection.cursor() as cursor:
-        if anio:
-            cursor.execute("SELECT * FROM obtener_ventas_pivot(%s)", [int(anio)])
-        else:
-            cursor.execute("SELECT * FROM vw_ventas_mes_marca ORDER BY anio DESC, mes DESC LIMIT 12")
-        
-        columns = [col[0] for col in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    # Sin año: últimos 12 meses con ventas
+    pivot = pivot_ventas_mes_marca(int(anio) if anio and anio.isdigit() else None)
     
     # Obtener años disponibles
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT DISTINCT anio FROM vw_ventas_mes_marca ORDER BY anio DESC")
-        anios_disponibles = [row[0] for row in cursor.fetchall()]
+    anios_disponibles = anios_con_ventas()
     
     context = {
         'title': 'Reporte PIVOT - Ventas por Mes y Marca',
-        'results': results,
+        'pivot': pivot,
         'anio_seleccionado': anio,
         'anios_disponibles': anios_disponibles,
+        'frescura': estado_reportes_materializados(),
         'site_header': admin.site.site_header,
         'site_title': admin.site.site_title,
     }
@@ -444,28 +418,33 @@ def pivot_ventas_view(request):
 
 @staff_member_required
 def ranking_marcas_view(request):
-    """Vista para mostrar RANKING de Marcas (Vista: vw_top_marcas_anio)"""
+    """Vista para mostrar RANKING de Marcas (Vista materializada: mv_top_marcas_anio)"""
     anio = request.GET.get('anio', None)
     
     with connection.cursor() as cursor:
         if anio:
             cursor.execute("SELECT * FROM obtener_top5_marcas(%s)", [int(anio)])
         else:
-            cursor.execute("SELECT * FROM vw_top5_marcas ORDER BY anio DESC, posicion ASC")
+            cursor.execute("""
+                SELECT anio, marca, total_ventas, cantidad_ventas, cantidad_vehiculos,
+                       promedio_venta, posicion_rank AS posicion, porcentaje_del_anio
+                FROM mv_top_marcas_anio
+                WHERE posicion_rank <= 5
+                ORDER BY anio DESC, posicion_rank ASC
+            """)
         
         columns = [col[0] for col in cursor.description]
         results = [dict(zip(columns, row)) for row in cursor.fetchall()]
     
     # Obtener años disponibles
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT DISTINCT anio FROM vw_top_marcas_anio ORDER BY anio DESC")
-        anios_disponibles = [row[0] for row in cursor.fetchall()]
+    anios_disponibles = anios_con_ventas()
     
     context = {
         'title': 'RANKING - Top 5 Marcas Más Vendidas',
         'results': results,
         'anio_seleccionado': anio,
         'anios_disponibles': anios_disponibles,
+        'frescura': estado_reportes_materializados(),
         'site_header': admin.site.site_header,
         'site_title': admin.site.site_title,
     }
@@ -475,35 +454,29 @@ def ranking_marcas_view(request):
 
 @staff_member_required
 def inventario_analisis_view(request):
-    """Vista para mostrar Análisis de Inventario con Subconsultas (Vista: vw_inventario_analisis)"""
+    """Vista para mostrar Análisis de Inventario (Vista: vw_inventario_analisis) paginada por cursor"""
     estado = request.GET.get('estado', None)
     nivel = request.GET.get('nivel', None)
     
-    with connection.cursor() as cursor:
-        query = "SELECT * FROM vw_inventario_analisis WHERE 1=1"
-        params = []
-        
-        if estado:
-            query += " AND estado_disponibilidad = %s"
-            params.append(estado)
-        
-        if nivel:
-            query += " AND nivel_inventario = %s"
-            params.append(nivel)
-        
-        query += " ORDER BY dias_en_inventario DESC LIMIT 50"
-        
-        cursor.execute(query, params)
-        columns = [col[0] for col in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    # Los filtros, el cursor y el LIMIT se aplican en la consulta a vehiculo
+    paginator = KeysetPaginator(
+        lambda valores, hacia_atras, limite: analisis_inventario(
+            estado, nivel, despues=valores, hacia_atras=hacia_atras, limite=limite
+        ),
+        50,
+        orden=('fecha_ingreso', 'vehiculo_id'),
+        tipos=(date.fromisoformat, int),
+    )
+    page_obj = paginator.get_page(request.GET)
     
     context = {
-        'title': 'Análisis de Inventario con Subconsultas',
-        'results': results,
+        'title': 'Análisis de Inventario',
+        'results': page_obj,
+        'page_obj': page_obj,
         'estado_seleccionado': estado,
         'nivel_seleccionado': nivel,
         'estados': ['DISPONIBLE', 'VENDIDO', 'RESERVADO'],
-        'niveles': ['NUEVO', 'MEDIO', 'ALTO', 'CRITICO'],
+        'niveles': list(NIVELES_INVENTARIO),
         'site_header': admin.site.site_header,
         'site_title': admin.site.site_title,
     }
@@ -511,6 +484,51 @@ def inventario_analisis_view(request):
     return render(request, 'admin/reportes/inventario_analisis.html', context)
 
 
+@staff_member_required
+def diagnostico_conexiones_view(request):
+    """Vista de diagnóstico de conexiones: configuración, pool del proceso y ocupación del servidor"""
+    from .services.diagnostico import (
+        configuracion_conexiones, estadisticas_pool, conexiones_servidor
+    )
+
+    context = {
+        'title': 'Diagnóstico de Conexiones',
+        'configuracion': configuracion_conexiones(),
+        'pools': estadisticas_pool(),
+        'servidor': conexiones_servidor(),
+        'site_header': admin.site.site_header,
+        'site_title': admin.site.site_title,
+    }
+
+    return render(request, 'admin/reportes/diagnostico_conexiones.html', context)
+
+
+@staff_member_required
+def rendimiento_view(request):
+    """Vista de percentiles por vista (consultas, BD, render y total) de core.metricas"""
+    from datetime import datetime
+    from django.conf import settings
+    from django.shortcuts import redirect
+    from . import metricas
+
+    if request.method == 'POST' and 'reiniciar' in request.POST:
+        metricas.reiniciar()
+        return redirect('admin_diagnostico_rendimiento')
+
+    datos = metricas.resumen()
+    context = {
+        'title': 'Rendimiento por Vista',
+        'vistas': datos['vistas'],
+        'desde': datetime.fromtimestamp(datos['desde']),
+        'activo': getattr(settings, 'METRICAS_REQUESTS_ACTIVO', True),
+        'ventana': getattr(settings, 'METRICAS_REQUESTS_VENTANA', 500),
+        'site_header': admin.site.site_header,
+        'site_title': admin.site.site_title,
+    }
+
+    return render(request, 'admin/reportes/rendimiento.html', context)
+
+
 
 # Administración de tablas de auditoría
 
@@ -605,6 +623,20 @@ class AudErroresAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(TrabajoExportacion)
+class TrabajoExportacionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo_reporte', 'formato', 'estado', 'usuario_id', 'intentos',
+                    'fecha_creacion', 'fecha_fin']
+    list_filter = ['estado', 'tipo_reporte', 'formato']
+    readonly_fields = ['id', 'tipo_reporte', 'formato', 'filtros', 'estado', 'usuario_id',
+                       'nombre_archivo', 'ruta_archivo', 'mensaje_error', 'intentos',
+                       'fecha_creacion', 'fecha_inicio', 'fecha_fin']
+    
+    def has_add_permission(self, request):
+        # Los trabajos los crean las vistas de reportes
+        return False
+
+
 # Administrador para la sección de Reportes
 from .models import Reporte
 
@@ -650,14 +682,14 @@ class ReporteAdmin(admin.ModelAdmin):
             {
                 'nombre': 'PIVOT - Ventas por Mes',
                 'url': '/admin/reportes/pivot-ventas/',
-                'descripcion': 'Vista: vw_ventas_mes_marca',
+                'descripcion': 'Resumen: resumen_ventas_mes_marca (una columna por marca)',
                 'tecnicas': 'PIVOT con SUM(CASE...)',
                 'color': 'purple'
             },
             {
                 'nombre': 'RANKING - Top 5 Marcas',
                 'url': '/admin/reportes/ranking-marcas/',
-                'descripcion': 'Vista: vw_top_marcas_anio',
+                'descripcion': 'Vista materializada: mv_top_marcas_anio',
                 'tecnicas': 'RANK(), DENSE_RANK(), ROW_NUMBER()',
                 'color': 'pink'
             },
@@ -668,6 +700,20 @@ class ReporteAdmin(admin.ModelAdmin):
                 'tecnicas': 'Subconsultas, CASE, Comparaciones',
                 'color': 'teal'
             },
+            {
+                'nombre': 'Diagnóstico de Conexiones',
+                'url': '/admin/diagnostico/conexiones/',
+                'descripcion': 'Pool de conexiones y pg_stat_activity',
+                'tecnicas': 'CONN_MAX_AGE, health checks, max_connections',
+                'color': 'gray'
+            },
+            {
+                'nombre': 'Rendimiento por Vista',
+                'url': '/admin/diagnostico/rendimiento/',
+                'descripcion': 'Middleware: MetricasRequestMiddleware',
+                'tecnicas': 'Consultas, tiempo de BD y render, percentiles p50/p95/p99',
+                'color': 'gray'
+            },
         ]
         
         context = {
@@ -0,0 +1,113 @@
+"""
+Caché de catálogos (Marca, TipoVehiculo, MetodoPago, TipoDocumento).
+
+Los formularios y listados muestran siempre las mismas tablas pequeñas de
+catálogo. En lugar de consultarlas en cada render, cada catálogo se lee
+completo una sola vez y se guarda en la caché de proceso (framework de caché
+de Django) bajo una clave con sello de versión.
+
+Al guardar o eliminar una fila de catálogo (por ejemplo desde el admin) las
+señales de ``core/signals.py`` incrementan la versión, con lo que todas las
+entradas quedan obsoletas de una vez. ``CATALOGOS_CACHE_TIMEOUT`` acota la
+desactualización cuando el cambio ocurre en otro proceso.
+
+Una fila nueva creada en otro proceso (la caché es por proceso) o cargada sin
+señales (``generar_datos`` usa COPY con los triggers desactivados) no estaría
+en la caché hasta que expire. Por eso ``nombres`` e ``ids`` reciben los ids o
+nombres que deben resolver y, si falta alguno, releen el catálogo una vez
+antes de devolverlo: un reporte nunca filtra por una marca "inexistente" ni
+la muestra sin nombre por una caché vieja.
+
+Uso:
+    activos('marca')                      # filas activas ordenadas por nombre
+    nombres('tipo_vehiculo')              # {id: nombre}, incluye inactivos
+    nombres('marca', incluir={3, 7})      # relee si falta el id 3 o el 7
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Marca, TipoVehiculo, MetodoPago, TipoDocumento
+
+
+CATALOGOS = {
+    'marca': Marca,
+    'tipo_vehiculo': TipoVehiculo,
+    'metodo_pago': MetodoPago,
+    'tipo_documento': TipoDocumento,
+}
+
+_CACHE_VERSION_KEY = 'catalogos:version'
+
+
+def _version():
+    """Versión global de la caché de catálogos (se incrementa al invalidar)"""
+    version = cache.get(_CACHE_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(_CACHE_VERSION_KEY, version, None)
+    return version
+
+
+def _cache_key(catalogo):
+    return f'catalogos:{_version()}:{catalogo}'
+
+
+def obtener_catalogo(catalogo):
+    """
+    Devuelve todas las filas del catálogo ordenadas por nombre.
+
+    Con la caché caliente no se ejecuta ninguna consulta; en caso contrario
+    se lee la tabla completa (pocas filas) en una sola consulta.
+
+    Args:
+        catalogo: 'marca', 'tipo_vehiculo', 'metodo_pago' o 'tipo_documento'
+    """
+    key = _cache_key(catalogo)
+    filas = cache.get(key)
+    if filas is None:
+        filas = _leer(catalogo, key)
+    return filas
+
+
+def _leer(catalogo, key=None):
+    """Lee el catálogo de la BD y lo guarda en caché (bajo la versión actual)"""
+    filas = tuple(CATALOGOS[catalogo].objects.order_by('nombre'))
+    cache.set(key or _cache_key(catalogo), filas, getattr(settings, 'CATALOGOS_CACHE_TIMEOUT', 3600))
+    return filas
+
+
+def activos(catalogo):
+    """Filas activas del catálogo, ordenadas por nombre (para formularios y filtros)"""
+    return [fila for fila in obtener_catalogo(catalogo) if fila.activo]
+
+
+def nombres(catalogo, incluir=()):
+    """
+    Mapa id → nombre del catálogo, incluyendo filas inactivas, para que los
+    reportes y exportadores resuelvan nombres sin JOIN.
+
+    Args:
+        incluir: ids que el llamador va a resolver; si alguno no está en la
+            caché se relee el catálogo una vez (fila creada en otro proceso)
+    """
+    mapa = {fila.id: fila.nombre for fila in obtener_catalogo(catalogo)}
+    if any(clave not in mapa for clave in incluir):
+        mapa = {fila.id: fila.nombre for fila in _leer(catalogo)}
+    return mapa
+
+
+def ids(catalogo, incluir=()):
+    """Mapa nombre → id del catálogo (inverso de ``nombres``; ``incluir`` son nombres)"""
+    mapa = {fila.nombre: fila.id for fila in obtener_catalogo(catalogo)}
+    if any(clave not in mapa for clave in incluir):
+        mapa = {fila.nombre: fila.id for fila in _leer(catalogo)}
+    return mapa
+
+
+def invalidar_catalogos():
+    """Invalida todos los catálogos incrementando la versión global"""
+    try:
+        cache.incr(_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(_CACHE_VERSION_KEY, 2, None)
@@ -0,0 +1,8 @@
+"""
+Backend PostgreSQL con pool de conexiones en proceso.
+
+Se activa con ``DB_POOL_ACTIVO=True`` (ENGINE ``core.db_pool``). Pensado para
+servidores con hilos (gunicorn --threads, runserver): cada proceso mantiene
+hasta ``DB_POOL_MAX`` conexiones abiertas y las reparte entre sus hilos, en
+lugar de abrir una conexión nueva por request.
+"""
@@ -0,0 +1,89 @@
+"""
+DatabaseWrapper de PostgreSQL que toma y devuelve conexiones de un pool.
+
+Django sigue "abriendo" y "cerrando" la conexión de cada hilo como siempre
+(al inicio/fin del request según ``CONN_MAX_AGE``); este backend solo cambia
+qué significa: abrir toma una conexión del pool del proceso y cerrar la
+devuelve. La configuración va en ``DATABASES[alias]['POOL']``::
+
+    'POOL': {'MIN': 2, 'MAX': 10, 'TIMEOUT': 10, 'MAX_INACTIVO': 300}
+"""
+import threading
+
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from .pool import PoolConexiones
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obtener_pool(alias, settings_dict):
+    """
+    Pool del proceso para ``alias`` (se crea al primer uso).
+
+    La clave incluye el nombre de la BD: el runner de tests cambia ``NAME``
+    en caliente y las conexiones a la BD original no deben reutilizarse.
+    """
+    clave = (alias, settings_dict['NAME'])
+    pool = _pools.get(clave)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        if clave not in _pools:
+            opciones = settings_dict.get('POOL') or {}
+            _pools[clave] = PoolConexiones(
+                f"{alias} ({settings_dict['NAME']})",
+                minimo=int(opciones.get('MIN', 0)),
+                maximo=int(opciones.get('MAX', 10)),
+                timeout=float(opciones.get('TIMEOUT', 10)),
+                max_inactivo=float(opciones.get('MAX_INACTIVO', 300)),
+                verificar=settings_dict.get('CONN_HEALTH_CHECKS', True),
+            )
+        return _pools[clave]
+
+
+def estadisticas_pools():
+    """Estadísticas de los pools creados en este proceso (lista vacía si no hay)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.estadisticas() for pool in pools]
+
+
+def cerrar_pool(alias, nombre_bd):
+    """Cierra las conexiones inactivas del pool de ``alias`` hacia ``nombre_bd``"""
+    with _pools_lock:
+        pool = _pools.pop((alias, nombre_bd), None)
+    if pool is not None:
+        pool.cerrar_todas()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # DROP DATABASE falla si quedan conexiones inactivas en el pool
+        cerrar_pool(self.connection.alias, test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        pool = obtener_pool(self.alias, self.settings_dict)
+        conexion, reutilizada = pool.obtener(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+        if reutilizada:
+            # La conexión nueva lo fija en super(); al reutilizar se replica
+            nivel = self.settings_dict['OPTIONS'].get('isolation_level')
+            self.isolation_level = (
+                IsolationLevel.READ_COMMITTED if nivel is None else IsolationLevel(nivel)
+            )
+        return conexion
+
+    def _close(self):
+        if self.connection is not None:
+            obtener_pool(self.alias, self.settings_dict).devolver(self.connection)
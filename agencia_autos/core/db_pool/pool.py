@@ -0,0 +1,223 @@
+"""
+Pool de conexiones psycopg2 seguro para hilos.
+
+Las conexiones inactivas se guardan en una pila (LIFO: se reutiliza la más
+reciente y las viejas envejecen hasta cerrarse). Si todas están en uso y ya
+se alcanzó ``maximo``, el hilo espera hasta ``timeout`` segundos a que otro
+devuelva una; al vencer se lanza ``PoolAgotadoError``.
+"""
+import threading
+import time
+
+import psycopg2.extensions as ext
+from django.db import OperationalError
+
+
+class PoolAgotadoError(OperationalError):
+    """No se obtuvo una conexión del pool dentro del tiempo de espera"""
+
+
+class PoolConexiones:
+
+    def __init__(self, alias, minimo=0, maximo=10, timeout=10.0,
+                 max_inactivo=300, verificar=True):
+        """
+        Args:
+            alias: Alias de la BD en DATABASES (solo informativo)
+            minimo: Conexiones inactivas que se conservan aunque envejezcan
+            maximo: Tope de conexiones abiertas (en uso + inactivas)
+            timeout: Segundos máximos de espera cuando el pool está lleno
+            max_inactivo: Segundos tras los cuales se cierra una conexión inactiva
+            verificar: Ejecutar ``SELECT 1`` al reutilizar una conexión inactiva
+        """
+        self.alias = alias
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.max_inactivo = max_inactivo
+        self.verificar = verificar
+
+        self._condicion = threading.Condition()
+        self._inactivas = []  # [(conexion, devuelta_en)]
+        self._abiertas = 0
+        self._esperando = 0
+        self._contadores = {
+            'entregas': 0,
+            'creadas': 0,
+            'descartadas': 0,
+            'esperas': 0,
+            'agotado': 0,
+            'espera_total_ms': 0.0,
+            'espera_max_ms': 0.0,
+        }
+
+    def obtener(self, conectar):
+        """
+        Entrega una conexión (reutilizada o nueva).
+
+        Args:
+            conectar: Función sin argumentos que abre una conexión nueva;
+                solo se llama si no hay inactivas y queda lugar en el pool
+
+        Returns:
+            tuple: (conexion, reutilizada)
+        Raises:
+            PoolAgotadoError: Si no se liberó ninguna dentro de ``timeout``
+        """
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        espero = False
+
+        while True:
+            with self._condicion:
+                self._podar()
+                while not self._inactivas and self._abiertas >= self.maximo:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._contadores['agotado'] += 1
+                        raise PoolAgotadoError(
+                            f"Pool de conexiones '{self.alias}' agotado: "
+                            f"{self.maximo} conexiones en uso tras esperar {self.timeout}s"
+                        )
+                    espero = True
+                    self._esperando += 1
+                    try:
+                        self._condicion.wait(restante)
+                    finally:
+                        self._esperando -= 1
+
+                if self._inactivas:
+                    conexion, _ = self._inactivas.pop()
+                else:
+                    conexion = None
+                    # Se reserva el lugar antes de conectar (fuera del candado)
+                    self._abiertas += 1
+
+            if conexion is None:
+                try:
+                    conexion = conectar()
+                except Exception:
+                    self._liberar_lugar()
+                    raise
+                self._registrar_entrega(inicio, espero, creada=True)
+                return conexion, False
+
+            if self._utilizable(conexion):
+                self._registrar_entrega(inicio, espero)
+                return conexion, True
+
+            # Conexión rota (p. ej. reinicio del servidor): se descarta y se reintenta
+            self._cerrar(conexion)
+
+    def devolver(self, conexion):
+        """Regresa una conexión al pool; se descarta si quedó en mal estado"""
+        if not self._limpiar(conexion):
+            self._cerrar(conexion)
+            return
+        with self._condicion:
+            self._inactivas.append((conexion, time.monotonic()))
+            self._condicion.notify()
+
+    def cerrar_todas(self):
+        """Cierra las conexiones inactivas (las que están en uso se cierran al devolverse)"""
+        with self._condicion:
+            inactivas, self._inactivas = self._inactivas, []
+        for conexion, _ in inactivas:
+            self._cerrar(conexion)
+
+    def estadisticas(self):
+        """Tamaño, configuración y contadores acumulados del pool"""
+        with self._condicion:
+            datos = dict(self._contadores)
+            datos.update({
+                'alias': self.alias,
+                'minimo': self.minimo,
+                'maximo': self.maximo,
+                'timeout': self.timeout,
+                'max_inactivo': self.max_inactivo,
+                'abiertas': self._abiertas,
+                'inactivas': len(self._inactivas),
+                'en_uso': self._abiertas - len(self._inactivas),
+                'esperando': self._esperando,
+            })
+        datos['espera_promedio_ms'] = (
+            datos['espera_total_ms'] / datos['esperas'] if datos['esperas'] else 0.0
+        )
+        return datos
+
+    # ----- Internos -----
+
+    def _registrar_entrega(self, inicio, espero, creada=False):
+        espera_ms = (time.monotonic() - inicio) * 1000
+        with self._condicion:
+            self._contadores['entregas'] += 1
+            if creada:
+                self._contadores['creadas'] += 1
+            if espero:
+                self._contadores['esperas'] += 1
+                self._contadores['espera_total_ms'] += espera_ms
+                self._contadores['espera_max_ms'] = max(self._contadores['espera_max_ms'], espera_ms)
+
+    def _podar(self):
+        """Cierra inactivas más viejas que max_inactivo (se llama con el candado tomado)"""
+        if not self.max_inactivo or len(self._inactivas) <= self.minimo:
+            return
+        vencimiento = time.monotonic() - self.max_inactivo
+        # La pila está ordenada por antigüedad: las más viejas al inicio
+        vencidas = 0
+        for _, devuelta_en in self._inactivas:
+            if devuelta_en >= vencimiento or len(self._inactivas) - vencidas <= self.minimo:
+                break
+            vencidas += 1
+        if vencidas:
+            for conexion, _ in self._inactivas[:vencidas]:
+                self._cerrar(conexion, notificar=False)
+            del self._inactivas[:vencidas]
+
+    def _utilizable(self, conexion):
+        if conexion.closed:
+            return False
+        if not self.verificar:
+            return True
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not conexion.autocommit:
+                conexion.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _limpiar(self, conexion):
+        """Deja la conexión sin transacción abierta; False si no es reutilizable"""
+        if conexion.closed:
+            return False
+        estado = conexion.info.transaction_status
+        if estado == ext.TRANSACTION_STATUS_IDLE:
+            return True
+        if estado in (ext.TRANSACTION_STATUS_INTRANS, ext.TRANSACTION_STATUS_INERROR):
+            try:
+                conexion.rollback()
+                return True
+            except Exception:
+                return False
+        # ACTIVE (consulta en curso) o UNKNOWN (conexión perdida)
+        return False
+
+    def _cerrar(self, conexion, notificar=True):
+        try:
+            conexion.close()
+        except Exception:
+            pass
+        if notificar:
+            self._liberar_lugar(descartada=True)
+        else:
+            self._abiertas -= 1
+            self._contadores['descartadas'] += 1
+
+    def _liberar_lugar(self, descartada=False):
+        with self._condicion:
+            self._abiertas -= 1
+            if descartada:
+                self._contadores['descartadas'] += 1
+            self._condicion.notify()
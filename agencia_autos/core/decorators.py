@@ -3,13 +3,19 @@ Decoradores personalizados para control de acceso basado en roles.
 
 Este módulo proporciona decoradores que restringen el acceso a vistas
 según el rol del empleado (Administrador o Vendedor).
+
+Los roles se obtienen con ``obtener_roles(request)``, que los resuelve una
+sola vez por request y los mantiene en caché entre requests.
 """
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import user_passes_test
 from django.shortcuts import redirect
 from django.contrib import messages
 from functools import wraps
 
+from .roles import obtener_roles
+
 
 def admin_required(view_func):
     """
@@ -31,7 +37,7 @@ def admin_required(view_func):
             return redirect('login')
         
         # Verificar que el usuario pertenezca al grupo "Administrador"
-        if not request.user.groups.filter(name='Administrador').exists():
+        if not obtener_roles(request).es_admin:
             messages.error(request, 'Solo los Administradores pueden acceder a esta página')
             return redirect('dashboard')
         
@@ -61,10 +67,9 @@ def vendedor_or_admin_required(view_func):
             return redirect('login')
         
         # Verificar que el usuario pertenezca al grupo "Vendedor" o "Administrador"
-        es_vendedor = request.user.groups.filter(name='Vendedor').exists()
-        es_admin = request.user.groups.filter(name='Administrador').exists()
+        roles = obtener_roles(request)
         
-        if not (es_vendedor or es_admin):
+        if not (roles.es_vendedor or roles.es_admin):
             messages.error(request, 'No tienes permisos para acceder a esta página')
             return redirect('dashboard')
         
@@ -95,9 +100,7 @@ def active_employee_required(view_func):
             return redirect('login')
         
         # Verificar que el usuario pertenezca a algún grupo (Vendedor o Administrador)
-        tiene_rol = request.user.groups.filter(name__in=['Vendedor', 'Administrador']).exists()
-        
-        if not tiene_rol:
+        if not obtener_roles(request).tiene_rol:
             messages.error(request, 'Tu usuario no tiene un rol asignado')
             return redirect('login')
         
@@ -105,3 +108,39 @@ def active_employee_required(view_func):
         return view_func(request, *args, **kwargs)
     
     return wrapper
+
+
+def vista_asincrona(*decoradores):
+    """
+    Aplica decoradores de acceso síncronos (``login_required``,
+    ``admin_required``, ...) a una vista ``async def``.
+
+    Las verificaciones consultan la sesión, el usuario y los roles con el
+    ORM, así que se ejecutan en el hilo del request con ``sync_to_async``;
+    si alguna responde (redirección al login o al dashboard) se devuelve esa
+    respuesta y la vista no se ejecuta.
+
+    Uso:
+        @vista_asincrona(login_required, admin_required)
+        async def mi_vista(request):
+            ...
+    """
+    def decorador(vista):
+        def permitir(request, *args, **kwargs):
+            return None
+
+        verificar = permitir
+        for decorador_acceso in reversed(decoradores):
+            verificar = decorador_acceso(verificar)
+        verificar = sync_to_async(verificar)
+
+        @wraps(vista)
+        async def wrapper(request, *args, **kwargs):
+            respuesta = await verificar(request, *args, **kwargs)
+            if respuesta is not None:
+                return respuesta
+            return await vista(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorador
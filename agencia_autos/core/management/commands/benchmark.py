@@ -0,0 +1,272 @@
+"""
+Mide latencia y número de consultas de cada URL de core/urls.py y de las
+vistas de reportes del admin, y emite una línea base en JSON.
+
+Cada URL se pide ``--calentamiento`` veces sin medir y luego
+``--repeticiones`` veces con el cliente de pruebas de Django, autenticado
+como ``--usuario`` (por defecto el primer superusuario). Las URLs con
+parámetros usan el ID más reciente de la tabla correspondiente; si la tabla
+está vacía la URL se omite. Solo se hacen peticiones GET: ninguna vista
+modifica datos (las exportaciones se generan en línea, nunca se encolan).
+
+Uso:
+    python manage.py generar_datos --ventas 1000000 --vehiculos 1200000 --clientes 200000
+    python manage.py benchmark --salida base_v1.json
+    python manage.py benchmark --comparar base_v1.json --tolerancia 0.25
+"""
+import json
+import math
+import platform
+import re
+import time
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+import config.urls
+import core.urls
+
+
+# Parámetro de URL -> tabla de la que se toma el ID más reciente
+PARAMETROS = {
+    'vehiculo_id': 'vehiculo',
+    'venta_id': 'venta',
+    'cliente_id': 'cliente',
+    'empleado_id': 'empleado',
+    'trabajo_id': 'trabajo_exportacion',
+}
+
+# Variantes con query string que ejercitan caminos distintos de la misma vista
+VARIANTES = [
+    ('venta_lista', '?formato=excel'),
+    ('reportes_disponibilidad', '?formato=excel'),
+    ('reportes_disponibilidad', '?formato=pdf'),
+]
+
+# Listados del admin además de las vistas de reportes
+ADMIN_LISTADOS = [
+    'admin:core_reporte_changelist',
+    'admin:core_cliente_changelist',
+    'admin:core_venta_changelist',
+    'admin:core_vehiculo_changelist',
+]
+
+TABLAS_VOLUMEN = ['marca', 'vehiculo', 'cliente', 'venta', 'detalle_venta']
+
+_SERVER_TIMING_DB = re.compile(r'\bdb;dur=([0-9.]+)')
+
+
+def _percentil(ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia y consultas de las vistas y emite/compara una línea base JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5, help='Mediciones por URL')
+        parser.add_argument('--calentamiento', type=int, default=1,
+                            help='Peticiones previas sin medir por URL')
+        parser.add_argument('--usuario', default=None,
+                            help='Usuario con el que se autentica (por defecto el primer superusuario)')
+        parser.add_argument('--solo', default=None,
+                            help='Mide solo las URLs cuyo nombre o ruta contenga este texto')
+        parser.add_argument('--salida', default=None,
+                            help='Archivo donde escribir la línea base (por defecto, la salida estándar)')
+        parser.add_argument('--comparar', default=None,
+                            help='Línea base previa; termina con error si hay regresiones')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Aumento relativo de la mediana tolerado al comparar (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser al menos 1')
+
+        usuario = self._usuario(options['usuario'])
+        host = next((h for h in settings.ALLOWED_HOSTS if h not in ('*', '')), 'localhost')
+        # Un error en una vista se registra como status 500 y no detiene la medición
+        cliente = Client(HTTP_HOST=host.lstrip('.'), raise_request_exception=False)
+        cliente.force_login(usuario)
+
+        resultados = []
+        with override_settings(EXPORTACIONES_EN_SEGUNDO_PLANO=False):
+            for nombre, url in self._urls(options['solo']):
+                resultado = self._medir(cliente, nombre, url,
+                                        options['calentamiento'], options['repeticiones'])
+                resultados.append(resultado)
+                self.stderr.write(
+                    f"{resultado['status']} {resultado['consultas']:>3}q "
+                    f"p50 {resultado['ms']['p50']:>8.1f} ms  {url}"
+                )
+
+        base = {
+            'generado': datetime.now().isoformat(timespec='seconds'),
+            'usuario': usuario.username,
+            'repeticiones': options['repeticiones'],
+            'entorno': self._entorno(),
+            'resultados': resultados,
+        }
+        texto = json.dumps(base, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Línea base escrita en {options['salida']}"))
+        else:
+            self.stdout.write(texto)
+
+        if options['comparar']:
+            self._comparar(options['comparar'], resultados, options['tolerancia'])
+
+    # ----- URLs -----
+
+    def _usuario(self, nombre):
+        if nombre:
+            try:
+                return User.objects.get(username=nombre)
+            except User.DoesNotExist:
+                raise CommandError(f'No existe el usuario {nombre}')
+        usuario = User.objects.filter(is_superuser=True, is_active=True).order_by('id').first()
+        if usuario is None:
+            raise CommandError('No hay superusuarios; indique --usuario')
+        return usuario
+
+    def _ids_recientes(self):
+        ids = {}
+        with connection.cursor() as cursor:
+            for parametro, tabla in PARAMETROS.items():
+                cursor.execute(f'SELECT MAX(id) FROM {tabla}')
+                ids[parametro] = cursor.fetchone()[0]
+        return ids
+
+    def _urls(self, solo):
+        """Lista de (nombre, url) a medir"""
+        ids = self._ids_recientes()
+        urls = []
+
+        for patron in core.urls.urlpatterns:
+            if not isinstance(patron, URLPattern) or not patron.name:
+                continue
+            parametros = list(patron.pattern.converters)
+            if any(ids.get(p) is None for p in parametros):
+                self.stderr.write(f'Se omite {patron.name}: no hay filas para {parametros}')
+                continue
+            urls.append((patron.name, reverse(patron.name, kwargs={p: ids[p] for p in parametros})))
+
+        for nombre, query in VARIANTES:
+            urls.append((nombre, reverse(nombre) + query))
+
+        for patron in config.urls.urlpatterns:
+            if isinstance(patron, URLPattern) and (patron.name or '').startswith('admin_'):
+                urls.append((patron.name, reverse(patron.name)))
+
+        for nombre in ADMIN_LISTADOS:
+            urls.append((nombre, reverse(nombre)))
+
+        if solo:
+            urls = [(nombre, url) for nombre, url in urls if solo in nombre or solo in url]
+        return urls
+
+    # ----- Medición -----
+
+    def _pedir(self, cliente, url):
+        respuesta = cliente.get(url)
+        if respuesta.streaming:
+            tamano = sum(len(bloque) for bloque in respuesta.streaming_content)
+        else:
+            tamano = len(respuesta.content)
+        respuesta.close()
+        return respuesta, tamano
+
+    def _medir(self, cliente, nombre, url, calentamiento, repeticiones):
+        for _ in range(calentamiento):
+            self._pedir(cliente, url)
+
+        tiempos, tiempos_db = [], []
+        consultas = 0
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                respuesta, tamano = self._pedir(cliente, url)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = max(consultas, len(capturadas))
+            encontrado = _SERVER_TIMING_DB.search(respuesta.get('Server-Timing', ''))
+            if encontrado:
+                tiempos_db.append(float(encontrado.group(1)))
+
+        tiempos.sort()
+        tiempos_db.sort()
+        return {
+            'nombre': nombre,
+            'url': url,
+            'status': respuesta.status_code,
+            'consultas': consultas,
+            'bytes': tamano,
+            'ms': {
+                'min': round(tiempos[0], 2),
+                'p50': round(_percentil(tiempos, 50), 2),
+                'p95': round(_percentil(tiempos, 95), 2),
+                'max': round(tiempos[-1], 2),
+                'promedio': round(sum(tiempos) / len(tiempos), 2),
+            },
+            'db_ms_p50': round(_percentil(tiempos_db, 50), 2) if tiempos_db else None,
+        }
+
+    def _entorno(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW server_version')
+            version_pg = cursor.fetchone()[0]
+            filas = {}
+            for tabla in TABLAS_VOLUMEN:
+                cursor.execute(f'SELECT COUNT(*) FROM {tabla}')
+                filas[tabla] = cursor.fetchone()[0]
+        return {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'postgresql': version_pg,
+            'debug': settings.DEBUG,
+            'filas': filas,
+        }
+
+    # ----- Comparación -----
+
+    def _comparar(self, ruta, resultados, tolerancia):
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                previa = json.load(archivo)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer la línea base {ruta}: {e}')
+
+        anteriores = {r['url']: r for r in previa.get('resultados', [])}
+        regresiones = []
+        for actual in resultados:
+            anterior = anteriores.get(actual['url'])
+            if anterior is None:
+                continue
+            if actual['consultas'] > anterior['consultas']:
+                regresiones.append(
+                    f"{actual['url']}: consultas {anterior['consultas']} -> {actual['consultas']}"
+                )
+            limite = anterior['ms']['p50'] * (1 + tolerancia)
+            if actual['ms']['p50'] > limite:
+                regresiones.append(
+                    f"{actual['url']}: p50 {anterior['ms']['p50']:.1f} -> {actual['ms']['p50']:.1f} ms"
+                )
+            if actual['status'] != anterior['status']:
+                regresiones.append(
+                    f"{actual['url']}: status {anterior['status']} -> {actual['status']}"
+                )
+
+        if not regresiones:
+            self.stderr.write(self.style.SUCCESS(f'Sin regresiones respecto a {ruta}'))
+            return
+        for regresion in regresiones:
+            self.stderr.write(self.style.ERROR(f'  {regresion}'))
+        raise CommandError(f'{len(regresiones)} regresión(es) respecto a {ruta}')
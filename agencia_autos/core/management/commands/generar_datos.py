@@ -0,0 +1,359 @@
+"""
+Genera datos sintéticos (marcas, vehículos, clientes, ventas y detalles)
+con volúmenes configurables para pruebas de rendimiento.
+
+Las filas se cargan con COPY en lotes y con los triggers de usuario
+desactivados durante la carga (una sola transacción); al terminar se
+reconstruyen kpi_contador, kpi_ventas_mes y cliente_metricas con
+recalcular_kpis(), se actualizan las secuencias y se ejecuta ANALYZE.
+La carga no genera filas de auditoría, por eso se vacía la caché de reportes
+y las vistas materializadas de reportes se refrescan completas.
+
+Los datos son consistentes con las reglas de la BD: cada vehículo se vende
+a lo sumo una vez, los vendidos en ventas activas/pendientes quedan VENDIDO
+y los de ventas canceladas vuelven a DISPONIBLE.
+
+Uso:
+    python manage.py generar_datos                         # tamaños por defecto
+    python manage.py generar_datos --ventas 1000000 --vehiculos 1200000 \\
+        --clientes 200000 --semilla 7
+    python manage.py generar_datos --limpiar               # vacía antes de cargar
+"""
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.catalogos import invalidar_catalogos
+from core.services.cache_reportes import vaciar_cache
+from core.services.kpis import reconstruir_contadores
+from core.services.reportes import refrescar_reportes_materializados
+
+
+MARCAS = [
+    'Toyota', 'Honda', 'Ford', 'Chevrolet', 'Nissan', 'Mazda', 'Volkswagen',
+    'Hyundai', 'Kia', 'BMW', 'Audi', 'Mercedes-Benz', 'Subaru', 'Mitsubishi',
+    'Peugeot', 'Renault', 'SEAT', 'Jeep', 'Dodge', 'RAM', 'Volvo', 'Lexus',
+    'Suzuki', 'Fiat', 'MG', 'Chirey', 'JAC', 'GMC', 'Buick', 'Cupra',
+]
+
+MODELOS = [
+    'Aster', 'Brio', 'Cielo', 'Duna', 'Eón', 'Flux', 'Gala', 'Halo', 'Iris',
+    'Jade', 'Koa', 'Lumen', 'Mira', 'Nova', 'Orión', 'Pulso', 'Quasar', 'Río',
+    'Sol', 'Terra', 'Vela', 'Zen',
+]
+
+VERSIONES = ['', ' LX', ' GT', ' Sport', ' Hybrid', ' Limited']
+
+COLORES = ['Blanco', 'Negro', 'Gris', 'Plata', 'Rojo', 'Azul', 'Verde', 'Beige', 'Naranja']
+
+NOMBRES = [
+    'Carlos', 'Laura', 'Miguel', 'Patricia', 'Jorge', 'Ana', 'Ricardo', 'Gabriela',
+    'Fernando', 'Sofía', 'Diego', 'Valeria', 'Andrés', 'Carolina', 'Héctor',
+    'Lucía', 'Javier', 'Mariana', 'Alejandro', 'Daniela', 'Raúl', 'Fernanda',
+]
+
+APELLIDOS = [
+    'Sánchez', 'Hernández', 'Rodríguez', 'Gómez', 'Martínez', 'López', 'Fernández',
+    'Torres', 'Ramírez', 'Mendoza', 'Cruz', 'Jiménez', 'Morales', 'Vega', 'Flores',
+    'Castro', 'Ortiz', 'Ruiz', 'Reyes', 'Aguilar', 'Navarro', 'Salazar',
+]
+
+CIUDADES = [
+    'CDMX', 'Guadalajara', 'Monterrey', 'Puebla', 'Querétaro', 'León', 'Tijuana',
+    'Cancún', 'Mérida', 'Morelia', 'Toluca', 'Aguascalientes',
+]
+
+# Tablas con triggers de usuario que se desactivan durante la carga
+TABLAS_CARGA = ['marca', 'cliente', 'vehiculo', 'venta', 'detalle_venta']
+
+
+def _texto(valor):
+    """Valor en formato de texto de COPY"""
+    if valor is None:
+        return '\\N'
+    return str(valor)
+
+
+def _copiar(cursor, tabla, columnas, filas):
+    """Carga ``filas`` (lista de tuplas) en ``tabla`` con un solo COPY"""
+    if not filas:
+        return
+    buffer = io.StringIO()
+    for fila in filas:
+        buffer.write('\t'.join(_texto(v) for v in fila))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN", buffer)
+
+
+class Command(BaseCommand):
+    help = 'Genera marcas, vehículos, clientes, ventas y detalles sintéticos con COPY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--marcas', type=int, default=25,
+                            help='Total de marcas a garantizar (se agregan las que falten)')
+        parser.add_argument('--vehiculos', type=int, default=60000,
+                            help='Vehículos nuevos (vendidos + en inventario)')
+        parser.add_argument('--clientes', type=int, default=20000, help='Clientes nuevos')
+        parser.add_argument('--ventas', type=int, default=50000, help='Ventas nuevas')
+        parser.add_argument('--semilla', type=int, default=42,
+                            help='Semilla del generador (misma semilla = mismos datos)')
+        parser.add_argument('--desde', default=None,
+                            help='Fecha de la primera venta (AAAA-MM-DD, por defecto hace 3 años)')
+        parser.add_argument('--lote', type=int, default=20000,
+                            help='Ventas por lote de COPY')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Vacía vehículos, clientes, ventas y auditoría antes de cargar '
+                                 '(conserva catálogos y empleados)')
+
+    def handle(self, *args, **options):
+        for opcion in ('marcas', 'vehiculos', 'clientes', 'ventas', 'lote'):
+            if options[opcion] < 0 or (opcion == 'lote' and options[opcion] == 0):
+                raise CommandError(f'--{opcion} debe ser positivo')
+
+        self.rng = random.Random(options['semilla'])
+        self.hoy = timezone.localdate()
+        if options['desde']:
+            try:
+                self.desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError('--desde debe tener formato AAAA-MM-DD')
+        else:
+            self.desde = self.hoy.replace(year=self.hoy.year - 3)
+        if self.desde > self.hoy:
+            raise CommandError('--desde no puede ser posterior a hoy')
+
+        inicio = time.monotonic()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                self.cursor = cursor
+                self._cargar(options)
+
+        self.stdout.write('Analizando tablas...')
+        with connection.cursor() as cursor:
+            for tabla in TABLAS_CARGA + ['cliente_metricas', 'kpi_ventas_mes']:
+                cursor.execute(f'ANALYZE {tabla}')
+        vaciar_cache()
+        # Las marcas se cargaron con COPY y sin triggers: las señales no las vieron
+        invalidar_catalogos()
+
+        self.stdout.write('Refrescando vistas materializadas de reportes...')
+        refrescar_reportes_materializados(completo=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos generados en {time.monotonic() - inicio:.1f} s: "
+            f"{self.resumen['marcas']} marcas, {self.resumen['clientes']} clientes, "
+            f"{self.resumen['vehiculos']} vehículos, {self.resumen['ventas']} ventas, "
+            f"{self.resumen['detalles']} detalles"
+        ))
+
+    # ----- Carga -----
+
+    def _cargar(self, options):
+        cursor = self.cursor
+        self.resumen = {'marcas': 0, 'clientes': 0, 'vehiculos': 0, 'ventas': 0, 'detalles': 0}
+
+        if options['limpiar']:
+            self.stdout.write('Vaciando vehículos, clientes, ventas y auditoría...')
+            cursor.execute("""
+                TRUNCATE detalle_venta, venta, vehiculo, cliente, cliente_metricas,
+                         aud_ventas, aud_vehiculos
+                RESTART IDENTITY
+            """)
+
+        for tabla in TABLAS_CARGA:
+            cursor.execute(f'ALTER TABLE {tabla} DISABLE TRIGGER USER')
+
+        self.tipos_vehiculo = self._ids("SELECT id FROM tipo_vehiculo WHERE activo ORDER BY id")
+        self.metodos_pago = self._ids("SELECT id FROM metodo_pago WHERE activo ORDER BY id")
+        self.tipos_documento = self._ids("SELECT id FROM tipo_documento WHERE activo ORDER BY id")
+        self.vendedores = self._ids("SELECT id FROM empleado WHERE estado = 'ACTIVO' ORDER BY id")
+        if not (self.tipos_vehiculo and self.metodos_pago and self.tipos_documento and self.vendedores):
+            raise CommandError(
+                'Faltan catálogos o empleados activos: cargue primero db/06-seed.sql'
+            )
+
+        self._cargar_marcas(options['marcas'])
+        self.marcas = self._ids("SELECT id FROM marca WHERE activo ORDER BY id")
+        self._cargar_clientes(options['clientes'])
+        self._cargar_ventas(options['ventas'], options['vehiculos'], options['lote'])
+
+        for tabla in TABLAS_CARGA:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), "
+                f"GREATEST((SELECT MAX(id) FROM {tabla}), 1))"
+            )
+            cursor.execute(f'ALTER TABLE {tabla} ENABLE TRIGGER USER')
+
+        self.stdout.write('Reconstruyendo KPIs y métricas de clientes...')
+        reconstruir_contadores()
+
+    def _ids(self, sql):
+        self.cursor.execute(sql)
+        return [fila[0] for fila in self.cursor.fetchall()]
+
+    def _siguiente_id(self, tabla):
+        self.cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {tabla}')
+        return self.cursor.fetchone()[0]
+
+    def _cargar_marcas(self, total):
+        self.cursor.execute("SELECT nombre FROM marca")
+        existentes = {fila[0] for fila in self.cursor.fetchall()}
+        faltantes = total - len(existentes)
+        if faltantes <= 0:
+            return
+        candidatas = [m for m in MARCAS if m not in existentes]
+        numero = 1
+        while len(candidatas) < faltantes:
+            nombre = f'Marca {numero:03d}'
+            if nombre not in existentes:
+                candidatas.append(nombre)
+            numero += 1
+        siguiente = self._siguiente_id('marca')
+        filas = [(siguiente + i, nombre) for i, nombre in enumerate(candidatas[:faltantes])]
+        _copiar(self.cursor, 'marca', ['id', 'nombre'], filas)
+        self.resumen['marcas'] = len(filas)
+
+    def _cargar_clientes(self, total):
+        rng = self.rng
+        if not total:
+            # Sin clientes nuevos las ventas se reparten entre los existentes
+            self.clientes = self._ids("SELECT id FROM cliente ORDER BY id")
+            return
+        primer_cliente = self._siguiente_id('cliente')
+        self.clientes = range(primer_cliente, primer_cliente + total)
+
+        columnas = ['id', 'nombre_completo', 'email', 'telefono', 'direccion',
+                    'tipo_documento_id', 'numero_documento', 'fecha_registro']
+        dias = (self.hoy - self.desde).days + 365
+        filas = []
+        for i in range(total):
+            cliente_id = primer_cliente + i
+            filas.append((
+                cliente_id,
+                f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}',
+                f'cliente{cliente_id}@sintetico.test',
+                f'55{rng.randrange(10**8):08d}',
+                f'Calle {rng.randint(1, 999)} #{rng.randint(1, 9999)}, {rng.choice(CIUDADES)}',
+                rng.choice(self.tipos_documento),
+                f'SIN{cliente_id:012d}',
+                self.hoy - timedelta(days=rng.randrange(dias)),
+            ))
+            if len(filas) >= 50000:
+                _copiar(self.cursor, 'cliente', columnas, filas)
+                filas = []
+        _copiar(self.cursor, 'cliente', columnas, filas)
+        self.resumen['clientes'] = total
+
+    def _vehiculo(self, vehiculo_id, anio_max, estado, fecha_ingreso):
+        rng = self.rng
+        marca_id = rng.choice(self.marcas)
+        # Precio según "gama" de la marca y el año, redondeado a centenas
+        gama = 1 + (marca_id % 5) * 0.35
+        anio = anio_max - rng.choice([0, 0, 0, 1, 1, 2, 3])
+        precio = round(rng.uniform(220000, 650000) * gama / 100) * 100
+        return (
+            vehiculo_id,
+            marca_id,
+            f'{MODELOS[(marca_id * 7 + rng.randrange(4)) % len(MODELOS)]}{rng.choice(VERSIONES)}',
+            anio,
+            f'{precio:.2f}',
+            rng.choice(COLORES),
+            rng.choice(self.tipos_vehiculo),
+            f'SIN{vehiculo_id:014d}',
+            estado,
+            fecha_ingreso,
+        ), precio
+
+    def _cargar_ventas(self, total_ventas, total_vehiculos, lote):
+        rng = self.rng
+        col_vehiculo = ['id', 'marca_id', 'modelo', 'anio', 'precio', 'color',
+                        'tipo_vehiculo_id', 'vin', 'estado_disponibilidad', 'fecha_ingreso']
+        col_venta = ['id', 'cliente_id', 'empleado_id', 'metodo_pago_id', 'fecha_venta',
+                     'total_venta', 'descuento_aplicado', 'estado_venta', 'fecha_creacion',
+                     'fecha_modificacion']
+        col_detalle = ['id', 'venta_id', 'vehiculo_id', 'cantidad', 'precio_unitario',
+                       'subtotal', 'fecha_creacion']
+
+        if total_ventas and not self.clientes:
+            raise CommandError('No hay clientes para las ventas: use --clientes mayor que 0')
+
+        siguiente_vehiculo = self._siguiente_id('vehiculo')
+        siguiente_venta = self._siguiente_id('venta')
+        siguiente_detalle = self._siguiente_id('detalle_venta')
+        dias = (self.hoy - self.desde).days + 1
+        usados = 0
+
+        for inicio_lote in range(0, total_ventas, lote):
+            vehiculos, ventas, detalles = [], [], []
+            for _ in range(min(lote, total_ventas - inicio_lote)):
+                # 95% de las ventas son de un vehículo; el resto, flotillas de 2 a 4
+                cantidad = 1 if rng.random() < 0.95 else rng.randint(2, 4)
+                if usados + cantidad > total_vehiculos:
+                    raise CommandError(
+                        f'--vehiculos ({total_vehiculos}) no alcanza para {total_ventas} ventas; '
+                        f'use al menos {int(total_ventas * 1.2)}'
+                    )
+                fecha = self.desde + timedelta(days=rng.randrange(dias))
+                creada = datetime.combine(fecha, datetime.min.time()) + timedelta(
+                    seconds=rng.randrange(9 * 3600, 20 * 3600)
+                )
+                sorteo = rng.random()
+                estado = 'ACTIVA' if sorteo < 0.95 else ('CANCELADA' if sorteo < 0.99 else 'PENDIENTE')
+                # Los clientes de id bajo compran más (distribución sesgada)
+                cliente_id = self.clientes[int(len(self.clientes) * rng.random() ** 2)]
+
+                venta_id = siguiente_venta
+                siguiente_venta += 1
+                bruto = 0
+                for _ in range(cantidad):
+                    vehiculo, precio = self._vehiculo(
+                        siguiente_vehiculo,
+                        fecha.year + (1 if fecha.month >= 8 else 0),
+                        'DISPONIBLE' if estado == 'CANCELADA' else 'VENDIDO',
+                        fecha - timedelta(days=rng.randint(5, 180)),
+                    )
+                    vehiculos.append(vehiculo)
+                    detalles.append((siguiente_detalle, venta_id, siguiente_vehiculo, 1,
+                                     f'{precio:.2f}', f'{precio:.2f}', creada))
+                    siguiente_detalle += 1
+                    siguiente_vehiculo += 1
+                    bruto += precio
+                usados += cantidad
+
+                porcentaje = rng.choice([0, 0, 0, 0.05, 0.10, 0.145])
+                descuento = round(bruto * porcentaje, 2)
+                ventas.append((venta_id, cliente_id, rng.choice(self.vendedores),
+                               rng.choice(self.metodos_pago), fecha,
+                               f'{bruto - descuento:.2f}', f'{descuento:.2f}', estado,
+                               creada, creada))
+
+            _copiar(self.cursor, 'vehiculo', col_vehiculo, vehiculos)
+            _copiar(self.cursor, 'venta', col_venta, ventas)
+            _copiar(self.cursor, 'detalle_venta', col_detalle, detalles)
+            self.resumen['ventas'] += len(ventas)
+            self.resumen['detalles'] += len(detalles)
+            self.stdout.write(f"  {self.resumen['ventas']} / {total_ventas} ventas")
+
+        # Resto del inventario: vehículos sin vender
+        filas = []
+        for _ in range(total_vehiculos - usados):
+            fecha_ingreso = self.hoy - timedelta(days=rng.randrange(400))
+            vehiculo, _ = self._vehiculo(
+                siguiente_vehiculo,
+                self.hoy.year + (1 if self.hoy.month >= 8 else 0),
+                'DISPONIBLE' if rng.random() < 0.92 else 'RESERVADO',
+                fecha_ingreso,
+            )
+            filas.append(vehiculo)
+            siguiente_vehiculo += 1
+            if len(filas) >= 50000:
+                _copiar(self.cursor, 'vehiculo', col_vehiculo, filas)
+                filas = []
+        _copiar(self.cursor, 'vehiculo', col_vehiculo, filas)
+        self.resumen['vehiculos'] = total_vehiculos
@@ -0,0 +1,81 @@
+"""
+Worker de exportaciones en segundo plano (tabla trabajo_exportacion).
+
+Uso:
+    python manage.py procesar_exportaciones              # procesar en bucle
+    python manage.py procesar_exportaciones --una-vez    # vaciar la cola y salir
+
+Se pueden ejecutar varios workers a la vez: cada trabajo se toma con
+SELECT ... FOR UPDATE SKIP LOCKED.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.services.exportaciones import (
+    tomar_siguiente_trabajo, procesar_trabajo, reencolar_trabajos_colgados
+)
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de exportaciones PDF/Excel en segundo plano'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa los trabajos pendientes y termina en lugar de esperar nuevos',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando la cola está vacía (por defecto 2)',
+        )
+        parser.add_argument(
+            '--reencolar-minutos',
+            type=int,
+            default=30,
+            help='Reencola trabajos EN_PROCESO con más de N minutos (worker caído). 0 desactiva',
+        )
+        parser.add_argument(
+            '--max-intentos',
+            type=int,
+            default=None,
+            help='Intentos antes de marcar como ERROR un trabajo colgado (por defecto EXPORTACIONES_MAX_INTENTOS)',
+        )
+
+    def handle(self, *args, **options):
+        if options['reencolar_minutos']:
+            reencolados, fallidos = reencolar_trabajos_colgados(
+                options['reencolar_minutos'], options['max_intentos']
+            )
+            if reencolados:
+                self.stdout.write(self.style.WARNING(f'{reencolados} trabajo(s) colgado(s) reencolado(s)'))
+            if fallidos:
+                self.stdout.write(self.style.ERROR(
+                    f'{fallidos} trabajo(s) colgado(s) marcado(s) como ERROR por exceder los intentos'
+                ))
+
+        self.stdout.write('Esperando trabajos de exportación...')
+        try:
+            while True:
+                close_old_connections()
+                trabajo = tomar_siguiente_trabajo()
+                if trabajo is None:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                inicio = time.monotonic()
+                ok = procesar_trabajo(trabajo)
+                duracion = time.monotonic() - inicio
+                descripcion = f"#{trabajo['id']} {trabajo['tipo_reporte']} ({trabajo['formato']}) en {duracion:.1f}s"
+                if ok:
+                    self.stdout.write(self.style.SUCCESS(f'Completado {descripcion}'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'Error en {descripcion}'))
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido')
@@ -0,0 +1,40 @@
+"""
+Reconstruye y verifica los contadores de KPIs (kpi_contador, kpi_ventas_mes)
+y las métricas por cliente (cliente_metricas).
+
+Uso:
+    python manage.py reconstruir_kpis                  # reconstruir y verificar
+    python manage.py reconstruir_kpis --solo-verificar # solo comparar
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.kpis import reconstruir_contadores, verificar_contadores
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero los contadores de KPIs y verifica que coincidan con las tablas base'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo-verificar',
+            action='store_true',
+            help='No reconstruye; solo reporta diferencias (termina con error si las hay)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['solo_verificar']:
+            self.stdout.write('Reconstruyendo contadores de KPIs...')
+            reconstruir_contadores()
+
+        diferencias = verificar_contadores()
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('Contadores de KPIs consistentes'))
+            return
+
+        for d in diferencias:
+            self.stdout.write(
+                f"  {d['origen']:<10} {d['clave']:<25} "
+                f"cantidad {d['cantidad_guardada']} (real {d['cantidad_real']}), "
+                f"monto {d['monto_guardado']} (real {d['monto_real']})"
+            )
+        raise CommandError(f'{len(diferencias)} contador(es) no coinciden con las tablas base')
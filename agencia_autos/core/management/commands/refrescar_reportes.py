@@ -0,0 +1,45 @@
+"""
+Refresca las vistas materializadas de reportes de ventas por marca
+(mv_ventas_mes_marca, mv_top_marcas_anio).
+
+Solo se recalculan los meses con altas, cambios o cancelaciones de ventas
+registrados en aud_ventas desde el último refresco; las vistas se refrescan
+con CONCURRENTLY, así que los reportes se siguen leyendo mientras tanto.
+Pensado para ejecutarse periódicamente (cron / tarea programada).
+
+Uso:
+    python manage.py refrescar_reportes             # incremental
+    python manage.py refrescar_reportes --completo  # recalcular todo
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.reportes import (
+    estado_reportes_materializados, refrescar_reportes_materializados
+)
+
+
+class Command(BaseCommand):
+    help = 'Refresca de forma incremental las vistas materializadas de reportes de ventas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Recalcula todos los meses (por ejemplo tras cambiar la marca de vehículos vendidos)',
+        )
+
+    def handle(self, *args, **options):
+        estado = estado_reportes_materializados()
+        self.stdout.write(
+            f"Último refresco: {estado['fecha_refresco'] or 'nunca'}; "
+            f"cambios pendientes en aud_ventas: {estado['cambios_pendientes']}"
+        )
+
+        resultado = refrescar_reportes_materializados(completo=options['completo'])
+        if resultado['meses_recalculados'] or options['completo']:
+            self.stdout.write(self.style.SUCCESS(
+                f"{resultado['meses_recalculados']} mes(es) recalculado(s); "
+                f"vistas materializadas refrescadas hasta aud_ventas #{resultado['ultimo_aud_id']}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Sin cambios desde el último refresco'))
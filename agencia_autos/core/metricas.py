@@ -0,0 +1,137 @@
+"""
+Métricas de rendimiento por vista (en memoria, por proceso).
+
+``MetricasRequestMiddleware`` mide cada request: número de consultas y
+tiempo en BD (``connection.execute_wrapper``), tiempo de render de
+plantillas (backend ``core.plantillas.DjangoTemplatesMedidos``), tiempo total
+y tamaño de la respuesta. Las últimas ``METRICAS_REQUESTS_VENTANA`` muestras
+de cada vista se guardan aquí y se resumen en percentiles para la página
+``/admin/diagnostico/rendimiento/``.
+
+Cada proceso del servidor tiene sus propias muestras; se pierden al reiniciar.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+_medicion_actual = ContextVar('medicion_request', default=None)
+
+_muestras = {}  # vista -> deque[(total_ms, db_ms, render_ms, consultas, bytes)]
+_lock = threading.Lock()
+_desde = time.time()
+
+
+class Medicion:
+    """
+    Acumuladores del request en curso.
+
+    Las vistas asíncronas instalan ``envolver`` en la conexión de varios
+    hilos a la vez (``core.paralelo``): las sumas van bajo ``lock``.
+    """
+
+    __slots__ = ('consultas', 'db', 'render', 'lock')
+
+    def __init__(self):
+        self.consultas = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.lock = threading.Lock()
+
+    def envolver(self, execute, sql, params, many, context):
+        """Wrapper para ``connection.execute_wrapper``: cuenta y cronometra la consulta"""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self.lock:
+                self.db += duracion
+                self.consultas += 1
+
+
+def iniciar_medicion():
+    """Activa una medición para el contexto actual; devuelve (medicion, token)"""
+    medicion = Medicion()
+    return medicion, _medicion_actual.set(medicion)
+
+
+def terminar_medicion(token):
+    _medicion_actual.reset(token)
+
+
+def sumar_render(segundos):
+    """Suma tiempo de render a la medición en curso (si hay una)"""
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        medicion.render += segundos
+
+
+def registrar(vista, total_ms, db_ms, render_ms, consultas, tamano):
+    ventana = getattr(settings, 'METRICAS_REQUESTS_VENTANA', 500)
+    with _lock:
+        muestras = _muestras.get(vista)
+        if muestras is None:
+            muestras = _muestras[vista] = deque(maxlen=ventana)
+        muestras.append((total_ms, db_ms, render_ms, consultas, tamano))
+
+
+def reiniciar():
+    """Descarta todas las muestras de este proceso"""
+    global _desde
+    with _lock:
+        _muestras.clear()
+        _desde = time.time()
+
+
+def _percentil(ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not ordenados:
+        return 0
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+def resumen():
+    """
+    Percentiles por vista, de la más lenta (p95 total) a la más rápida
+
+    Returns:
+        dict: desde (timestamp del inicio de las muestras) y vistas (lista de
+            dicts con vista, muestras, total_p50/p95/p99, db_p50/p95,
+            render_p50/p95, consultas_prom, consultas_max, db_porcentaje y
+            bytes_prom)
+    """
+    with _lock:
+        copia = {vista: list(muestras) for vista, muestras in _muestras.items()}
+        desde = _desde
+
+    vistas = []
+    for vista, muestras in copia.items():
+        total = sorted(m[0] for m in muestras)
+        db = sorted(m[1] for m in muestras)
+        render = sorted(m[2] for m in muestras)
+        consultas = [m[3] for m in muestras]
+        tamanos = [m[4] for m in muestras if m[4] is not None]
+        suma_total = sum(total)
+        vistas.append({
+            'vista': vista,
+            'muestras': len(muestras),
+            'total_p50': _percentil(total, 50),
+            'total_p95': _percentil(total, 95),
+            'total_p99': _percentil(total, 99),
+            'db_p50': _percentil(db, 50),
+            'db_p95': _percentil(db, 95),
+            'render_p50': _percentil(render, 50),
+            'render_p95': _percentil(render, 95),
+            'consultas_prom': sum(consultas) / len(consultas),
+            'consultas_max': max(consultas),
+            'db_porcentaje': round(sum(db) * 100 / suma_total, 1) if suma_total else 0,
+            'bytes_prom': sum(tamanos) / len(tamanos) if tamanos else None,
+        })
+    vistas.sort(key=lambda v: v['total_p95'], reverse=True)
+    return {'desde': desde, 'vistas': vistas}
@@ -0,0 +1,119 @@
+"""
+Middleware propios del proyecto.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.functional import SimpleLazyObject
+
+from . import metricas
+from .roles import resolver_roles
+
+
+class RolesMiddleware:
+    """
+    Adjunta ``request.roles`` con los roles del usuario autenticado.
+
+    La resolución es perezosa: solo se consulta la caché (o la BD) si algún
+    decorador, vista o plantilla accede a ``request.roles``. Debe ir después
+    de ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.roles = SimpleLazyObject(lambda: resolver_roles(request.user))
+        return self.get_response(request)
+
+
+
+class ConsultasLentasMiddleware:
+    """
+    Registra en el logger ``core.sql_lentas`` las consultas del request cuya
+    duración supera ``SQL_LOG_UMBRAL_MS``, con la vista que las originó.
+
+    Solo se instala con ``SQL_LOG=lentas`` (ver settings): envuelve la
+    conexión con ``connection.execute_wrapper`` y mide cada consulta, pero
+    solo formatea y escribe las lentas.
+    """
+
+    MAX_SQL = 2000
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.umbral = settings.SQL_LOG_UMBRAL_MS / 1000
+        self.logger = logging.getLogger('core.sql_lentas')
+
+    def __call__(self, request):
+        def medir(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                duracion = time.perf_counter() - inicio
+                if duracion >= self.umbral:
+                    self._registrar(request, duracion, sql, params, many)
+
+        with connection.execute_wrapper(medir):
+            return self.get_response(request)
+
+    def _registrar(self, request, duracion, sql, params, many):
+        match = getattr(request, 'resolver_match', None)
+        vista = match.view_name if match else '-'
+        sql = ' '.join(sql.split())
+        if len(sql) > self.MAX_SQL:
+            sql = sql[:self.MAX_SQL] + '...'
+        self.logger.warning(
+            '%.1f ms vista=%s %s %s%s sql=%s params=%s',
+            duracion * 1000, vista, request.method, request.path,
+            ' (executemany)' if many else '', sql,
+            '[...]' if many else params,
+        )
+
+
+class MetricasRequestMiddleware:
+    """
+    Mide consultas, tiempo de BD, tiempo de render, tiempo total y tamaño de
+    cada respuesta; los agrega a ``core.metricas`` por vista y los expone en
+    la cabecera ``Server-Timing`` (visible en las herramientas del navegador).
+
+    Va primero en MIDDLEWARE para que el total incluya al resto. Se desactiva
+    con ``METRICAS_REQUESTS_ACTIVO=False``.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICAS_REQUESTS_ACTIVO', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion, token = metricas.iniciar_medicion()
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(medicion.envolver):
+                response = self.get_response(request)
+        finally:
+            metricas.terminar_medicion(token)
+        total_ms = (time.perf_counter() - inicio) * 1000
+        db_ms = medicion.db * 1000
+        render_ms = medicion.render * 1000
+
+        if response.streaming:
+            tamano = int(response['Content-Length']) if response.has_header('Content-Length') else None
+        else:
+            tamano = len(response.content)
+
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{medicion.consultas} consultas", '
+            f'render;dur={render_ms:.1f}, total;dur={total_ms:.1f}'
+        )
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            metricas.registrar(match.view_name, total_ms, db_ms, render_ms,
+                               medicion.consultas, tamano)
+        return response
@@ -145,6 +145,36 @@ class Cliente(models.Model):
         return ' '.join(partes[1:]) if len(partes) > 1 else ''
 
 
+class ClienteMetricas(models.Model):
+    """Compras activas, monto acumulado y segmento del cliente (mantenida por triggers)"""
+    SEGMENTO_CHOICES = [
+        ('VIP', 'VIP'),
+        ('FRECUENTE', 'Frecuente'),
+        ('REGULAR', 'Regular'),
+        ('NUEVO', 'Nuevo'),
+    ]
+
+    cliente = models.OneToOneField(
+        Cliente, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='cliente_id', related_name='metricas'
+    )
+    total_compras = models.BigIntegerField(default=0)
+    monto_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ultima_compra = models.DateField(null=True, blank=True)
+    ventas_registradas = models.BigIntegerField(default=0)
+    segmento = models.CharField(max_length=20, choices=SEGMENTO_CHOICES, editable=False)
+    fecha_modificacion = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'cliente_metricas'
+        managed = False
+        verbose_name = 'Métricas de Cliente'
+        verbose_name_plural = 'Métricas de Clientes'
+
+    def __str__(self):
+        return f"Cliente {self.cliente_id}: {self.segmento}"
+
+
 class Vehiculo(models.Model):
     ESTADO_CHOICES = [
         ('DISPONIBLE', 'Disponible'),
@@ -315,6 +345,40 @@ class AudErrores(models.Model):
         return f"{self.origen} - {self.fecha_evento}"
 
 
+class TrabajoExportacion(models.Model):
+    """Cola de exportaciones de reportes procesadas en segundo plano"""
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En proceso'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    tipo_reporte = models.CharField(max_length=30)
+    formato = models.CharField(max_length=10)
+    filtros = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    usuario_id = models.IntegerField(null=True, blank=True)
+    nombre_archivo = models.CharField(max_length=200, null=True, blank=True)
+    ruta_archivo = models.CharField(max_length=500, null=True, blank=True)
+    mensaje_error = models.TextField(null=True, blank=True)
+    intentos = models.IntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'trabajo_exportacion'
+        managed = False
+        verbose_name = 'Trabajo de Exportación'
+        verbose_name_plural = 'Trabajos de Exportación'
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"Exportación #{self.id} - {self.tipo_reporte} ({self.formato}) - {self.estado}"
+
+
 # Modelo proxy para la sección de Reportes en el admin
 class Reporte(models.Model):
     """Modelo proxy para organizar los reportes en el admin"""
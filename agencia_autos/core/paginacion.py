@@ -0,0 +1,325 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+``django.core.paginator.Paginator`` ejecuta un ``COUNT(*)`` extra y usa
+``OFFSET``, cuyo costo crece linealmente con el número de página. Aquí cada
+página se obtiene con ``WHERE (orden) > (último visto) ORDER BY ... LIMIT n+1``,
+de modo que la página 500 cuesta lo mismo que la primera si existe un índice
+sobre las columnas de orden.
+
+Uso:
+    paginator = KeysetPaginator(vehiculos, 20, orden=('id',))
+    page_obj = paginator.get_page(request.GET)
+
+La navegación usa los parámetros ``despues`` / ``antes`` con un cursor opaco.
+El total solo se muestra cuando es barato: aproximado (``pg_class.reltuples``)
+si el queryset no tiene filtros, o exacto si se pide ``conteo='exacto'``.
+"""
+import base64
+import json
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connection
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+
+PARAM_DESPUES = 'despues'
+PARAM_ANTES = 'antes'
+PARAMS_PAGINACION = (PARAM_DESPUES, PARAM_ANTES, 'page')
+
+
+def _codificar(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def _fecha_bd(valor):
+    """
+    Las columnas TIMESTAMP (sin zona) se leen como datetime naive en la zona de
+    la conexión (UTC). Al filtrar con USE_TZ activo se marcan como UTC para que
+    Django no las reinterprete en TIME_ZONE y se compare el mismo instante.
+    """
+    if isinstance(valor, datetime) and settings.USE_TZ and timezone.is_naive(valor):
+        return timezone.make_aware(valor, dt_timezone.utc)
+    return valor
+
+
+def codificar_cursor(valores):
+    """Convierte los valores de las columnas de orden en un cursor para la URL"""
+    datos = json.dumps([_codificar(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Inverso de codificar_cursor; devuelve None si el cursor no es válido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        return None
+    return valores if isinstance(valores, list) else None
+
+
+def total_aproximado(model):
+    """
+    Número aproximado de filas de la tabla del modelo según las estadísticas
+    de PostgreSQL (pg_class.reltuples). No recorre la tabla.
+
+    Returns:
+        int | None: None si la tabla nunca fue analizada
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::BIGINT FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class KeysetPage:
+    """Página de resultados con cursores hacia la página anterior y siguiente"""
+
+    def __init__(self, object_list, paginator, has_previous, has_next, querydict):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self._querydict = querydict
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def _querystring(self, parametro, fila):
+        params = self._querydict.copy()
+        for nombre in PARAMS_PAGINACION:
+            params.pop(nombre, None)
+        params[parametro] = codificar_cursor(self.paginator.valores_orden(fila))
+        return params.urlencode()
+
+    @property
+    def previous_querystring(self):
+        if not (self._has_previous and self.object_list):
+            return ''
+        return self._querystring(PARAM_ANTES, self.object_list[0])
+
+    @property
+    def next_querystring(self):
+        if not (self._has_next and self.object_list):
+            return ''
+        return self._querystring(PARAM_DESPUES, self.object_list[-1])
+
+    @property
+    def total(self):
+        return self.paginator.total
+
+    @property
+    def total_es_aproximado(self):
+        return self.paginator.total_es_aproximado
+
+
+class KeysetPaginator:
+    """
+    Paginador por cursor sobre un QuerySet, una lista de diccionarios
+    (la lista debe venir ordenada según ``orden``) o una función
+    ``obtener(valores, hacia_atras, limite)`` que devuelve directamente las
+    filas (dicts) posteriores al cursor, para consultas SQL que aplican el
+    cursor y el LIMIT en la BD.
+
+    Args:
+        object_list: QuerySet, lista de dicts o función
+        per_page: Registros por página
+        orden: Columnas de orden, con '-' para descendente. La última debe ser
+            única (normalmente 'id') para que el cursor sea determinista.
+        conteo: 'aproximado' (por defecto), 'exacto' o None
+        tipos: Para listas y funciones, una función de conversión por columna
+            de orden (por ejemplo ``(date.fromisoformat, int)``) que se aplica
+            a los valores del cursor; en un QuerySet se usan los campos del modelo
+    """
+
+    def __init__(self, object_list, per_page, orden=('id',), conteo='aproximado', tipos=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.orden = tuple(orden)
+        self.conteo = conteo
+        self.tipos = tuple(tipos) if tipos is not None else None
+        self._total = None
+        self._total_calculado = False
+        self.total_es_aproximado = False
+
+    @property
+    def _es_queryset(self):
+        return isinstance(self.object_list, QuerySet)
+
+    def _campos(self):
+        return [(campo.lstrip('-'), campo.startswith('-')) for campo in self.orden]
+
+    def valores_orden(self, fila):
+        """Valores de las columnas de orden de una fila (modelo o dict)"""
+        if isinstance(fila, dict):
+            return [fila[nombre] for nombre, _ in self._campos()]
+        return [getattr(fila, nombre) for nombre, _ in self._campos()]
+
+    def _convertir(self, valores):
+        """Convierte los valores del cursor al tipo de cada campo del modelo"""
+        campos = self._campos()
+        if len(valores) != len(campos):
+            return None
+        if not self._es_queryset:
+            return self._convertir_sin_modelo(valores)
+        meta = self.object_list.model._meta
+        try:
+            convertidos = [meta.get_field(nombre).to_python(valor) for (nombre, _), valor in zip(campos, valores)]
+        except (ValidationError, FieldDoesNotExist):
+            return None
+        # Las columnas de orden no deberían ser NULL; un cursor con NULL no es navegable
+        if None in convertidos:
+            return None
+        return [_fecha_bd(valor) for valor in convertidos]
+
+    def _convertir_sin_modelo(self, valores):
+        """
+        Valores del cursor para listas y funciones: se convierten con ``tipos``
+        (si se indicaron) y solo se aceptan escalares no nulos, para que un
+        cursor manipulado no llegue tal cual a la consulta.
+        """
+        if self.tipos is not None:
+            try:
+                valores = [tipo(valor) for tipo, valor in zip(self.tipos, valores)]
+            except (TypeError, ValueError):
+                return None
+        if any(valor is None or isinstance(valor, (list, dict)) for valor in valores):
+            return None
+        return valores
+
+    def _filtro_despues(self, valores, invertido=False):
+        """
+        Construye (a > x) OR (a = x AND b > y) ... respetando la dirección de cada columna.
+
+        PostgreSQL no usa el OR como límite de rango del índice, así que se
+        agrega la condición redundante a >= x (o a <= x) sobre la primera
+        columna: el recorrido del índice empieza en el cursor y no al inicio.
+        """
+        condicion = Q()
+        iguales = {}
+        for (nombre, desc), valor in zip(self._campos(), valores):
+            mayor = desc == invertido  # ascendente hacia adelante => '>'
+            lookup = f'{nombre}__gt' if mayor else f'{nombre}__lt'
+            condicion |= Q(**iguales, **{lookup: valor})
+            iguales[nombre] = valor
+        if len(iguales) > 1:
+            (nombre, desc), valor = self._campos()[0], valores[0]
+            lookup = f'{nombre}__gte' if desc == invertido else f'{nombre}__lte'
+            condicion = Q(**{lookup: valor}) & condicion
+        return condicion
+
+    def _orden_queryset(self, invertido=False):
+        if not invertido:
+            return self.orden
+        return tuple(c[1:] if c.startswith('-') else f'-{c}' for c in self.orden)
+
+    def _pagina_queryset(self, valores, hacia_atras):
+        qs = self.object_list
+        if valores is not None:
+            qs = qs.filter(self._filtro_despues(valores, invertido=hacia_atras))
+        qs = qs.order_by(*self._orden_queryset(invertido=hacia_atras))
+        return list(qs[:self.per_page + 1])
+
+    def _esta_despues(self, fila, valores, invertido=False):
+        """Equivalente en memoria de _filtro_despues para listas de dicts"""
+        for (nombre, desc), valor, actual in zip(self._campos(), valores, self.valores_orden(fila)):
+            if actual != valor:
+                return (actual > valor) == (desc == invertido)
+        return False
+
+    def _pagina_lista(self, valores, hacia_atras):
+        filas = list(self.object_list)
+        if valores is not None:
+            filas = [f for f in filas if self._esta_despues(f, valores, invertido=hacia_atras)]
+        if hacia_atras:
+            filas.reverse()
+        return filas[:self.per_page + 1]
+
+    def _filas(self, valores, hacia_atras):
+        if self._es_queryset:
+            filas = self._pagina_queryset(valores, hacia_atras)
+        elif callable(self.object_list):
+            filas = list(self.object_list(valores, hacia_atras, self.per_page + 1))
+        else:
+            filas = self._pagina_lista(valores, hacia_atras)
+        return filas[:self.per_page], len(filas) > self.per_page
+
+    def get_page(self, querydict):
+        """
+        Devuelve la página indicada por ``despues``/``antes`` en ``querydict``
+        (normalmente ``request.GET``). Un cursor inválido devuelve la primera página.
+        """
+        antes = querydict.get(PARAM_ANTES)
+        despues = querydict.get(PARAM_DESPUES)
+        hacia_atras = bool(antes) and not despues
+        cursor = antes if hacia_atras else despues
+
+        valores = None
+        if cursor:
+            decodificado = decodificar_cursor(cursor)
+            valores = self._convertir(decodificado) if decodificado is not None else None
+            if valores is None:
+                hacia_atras = False
+
+        filas, hay_mas = self._filas(valores, hacia_atras)
+
+        if hacia_atras and not hay_mas:
+            # Se llegó al inicio: mostrar la primera página completa
+            valores, hacia_atras = None, False
+            filas, hay_mas = self._filas(None, False)
+
+        if hacia_atras:
+            filas.reverse()
+            has_previous, has_next = hay_mas, True
+        else:
+            has_previous, has_next = valores is not None, hay_mas
+
+        return KeysetPage(filas, self, has_previous, has_next, querydict)
+
+    @property
+    def total(self):
+        """Total de registros según ``conteo`` (None si no se calcula)"""
+        if self._total_calculado:
+            return self._total
+        self._total_calculado = True
+
+        if callable(self.object_list):
+            self._total = None
+        elif not self._es_queryset:
+            self._total = len(self.object_list)
+        elif self.conteo == 'exacto':
+            self._total = self.object_list.count()
+        elif self.conteo == 'aproximado' and not self.object_list.query.where:
+            self._total = total_aproximado(self.object_list.model)
+            self.total_es_aproximado = self._total is not None
+        return self._total
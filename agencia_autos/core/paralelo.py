@@ -0,0 +1,77 @@
+"""
+Ejecución concurrente de consultas independientes desde vistas asíncronas.
+
+El ORM y ``connection.cursor`` son síncronos: en una vista ``async def``
+cada llamada se envía a un hilo con ``sync_to_async``. Con
+``thread_sensitive=False`` cada llamada usa un hilo (y una conexión) propio,
+así varias consultas corren a la vez y la página tarda lo que la más lenta
+en lugar de la suma.
+
+Uso:
+    contadores, antiguos = await en_paralelo(
+        leer_contadores,
+        (contar_vehiculos_antiguos, hoy),
+    )
+
+Cada hilo abre su propia conexión y la cierra al terminar la llamada: bajo
+WSGI cada request crea un executor nuevo cuyos hilos no se reutilizan, y una
+conexión persistente (``CONN_MAX_AGE``) quedaría abierta en un hilo muerto.
+Con ``core.db_pool`` se usa ``close_old_connections``, que la devuelve al
+pool. Las consultas se siguen midiendo: los wrappers de
+``connection.execute_wrapper`` del request (métricas, log de consultas
+lentas) se instalan también en la conexión de cada hilo.
+
+Si el request corre dentro de una transacción (``ATOMIC_REQUESTS`` o los
+tests), otra conexión no vería sus cambios: las llamadas se ejecutan una
+tras otra en el hilo del request.
+"""
+import asyncio
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+
+
+def _contexto_request():
+    """(en transacción, wrappers de ejecución) de la conexión del hilo del request"""
+    return connection.in_atomic_block, list(connection.execute_wrappers)
+
+
+def _con_pool():
+    return connection.settings_dict['ENGINE'] == 'core.db_pool'
+
+
+def _en_hilo(envolturas, funcion, args):
+    close_old_connections()
+    try:
+        with ExitStack() as pila:
+            for envoltura in envolturas:
+                pila.enter_context(connection.execute_wrapper(envoltura))
+            return funcion(*args)
+    finally:
+        if _con_pool():
+            close_old_connections()
+        else:
+            connection.close()
+
+
+async def en_paralelo(*llamadas):
+    """
+    Ejecuta funciones síncronas independientes de forma concurrente.
+
+    Args:
+        llamadas: funciones sin argumentos o tuplas ``(funcion, *args)``
+
+    Returns:
+        list: resultados en el mismo orden que ``llamadas``
+    """
+    llamadas = [llamada if isinstance(llamada, tuple) else (llamada,) for llamada in llamadas]
+    en_transaccion, envolturas = await sync_to_async(_contexto_request)()
+
+    if en_transaccion:
+        return [await sync_to_async(funcion)(*args) for funcion, *args in llamadas]
+
+    return await asyncio.gather(*(
+        sync_to_async(_en_hilo, thread_sensitive=False)(envolturas, funcion, args)
+        for funcion, *args in llamadas
+    ))
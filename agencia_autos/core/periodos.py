@@ -0,0 +1,170 @@
+"""
+Períodos de fechas como rangos semiabiertos [inicio, fin).
+
+Filtrar con ``fecha_venta__month`` / ``fecha_venta__year`` (o con
+``EXTRACT(MONTH FROM fecha_venta)`` en SQL) aplica una función a la columna y
+PostgreSQL ya no puede usar ``idx_venta_fecha`` ni ``idx_venta_fecha_estado``.
+Un ``Periodo`` se traduce siempre a ``columna >= inicio AND columna < fin``,
+que se resuelve con un recorrido de rango del índice.
+
+Uso:
+    periodo = Periodo.mes_actual()
+    Venta.objects.filter(**periodo.filtro('fecha_venta'))
+
+    condiciones, params = Periodo.anio(2024).condiciones('v.fecha_venta')
+
+    # Filtros de la URL: fecha_desde / fecha_hasta (YYYY-MM-DD, ambos
+    # inclusive), o anio y opcionalmente mes
+    periodo = Periodo.desde_parametros(request.GET, por_defecto=Periodo.mes_actual())
+"""
+from datetime import MAXYEAR, date, datetime, timedelta
+
+from django.utils import timezone
+
+
+def _fecha(valor):
+    """date a partir de un date, datetime o texto YYYY-MM-DD; None si no es válido"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return datetime.strptime(str(valor), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _inicio_mes_siguiente(fecha):
+    """Primer día del mes siguiente; None después de diciembre de MAXYEAR (sin límite)"""
+    if fecha.month == 12:
+        return date(fecha.year + 1, 1, 1) if fecha.year < MAXYEAR else None
+    return date(fecha.year, fecha.month + 1, 1)
+
+
+def _dia_siguiente(fecha):
+    """Día siguiente; None para ``date.max`` (no hay fin representable: sin límite)"""
+    return fecha + timedelta(days=1) if fecha < date.max else None
+
+
+class Periodo:
+    """
+    Rango de fechas [inicio, fin). Cualquiera de los extremos puede ser None
+    (sin límite por ese lado).
+    """
+
+    __slots__ = ('inicio', 'fin')
+
+    def __init__(self, inicio=None, fin=None):
+        self.inicio = inicio
+        self.fin = fin
+
+    # ----- Constructores -----
+
+    @classmethod
+    def mes(cls, anio, mes):
+        inicio = date(int(anio), int(mes), 1)
+        return cls(inicio, _inicio_mes_siguiente(inicio))
+
+    @classmethod
+    def mes_actual(cls, hoy=None):
+        hoy = hoy or timezone.localdate()
+        return cls.mes(hoy.year, hoy.month)
+
+    @classmethod
+    def anio(cls, anio):
+        anio = int(anio)
+        return cls(date(anio, 1, 1), date(anio + 1, 1, 1) if anio < MAXYEAR else None)
+
+    @classmethod
+    def anio_actual(cls, hoy=None):
+        return cls.anio((hoy or timezone.localdate()).year)
+
+    @classmethod
+    def rango(cls, desde=None, hasta=None):
+        """
+        Período entre dos fechas, ambas inclusive (como las captura un
+        formulario). Acepta date, datetime o texto YYYY-MM-DD; un extremo
+        vacío o inválido queda sin límite, igual que ``hasta = date.max``.
+        """
+        hasta = _fecha(hasta) if hasta else None
+        return cls(_fecha(desde) if desde else None, _dia_siguiente(hasta) if hasta else None)
+
+    @classmethod
+    def desde_parametros(cls, params, por_defecto=None):
+        """
+        Período a partir de los filtros de una petición (``request.GET`` o un
+        dict): ``fecha_desde`` / ``fecha_hasta`` tienen prioridad; si no, se
+        usa ``anio`` y opcionalmente ``mes``. Los valores inválidos se ignoran.
+
+        Returns:
+            Periodo: ``por_defecto`` (o un período sin límites) si no hay filtros
+        """
+        if params.get('fecha_desde') or params.get('fecha_hasta'):
+            periodo = cls.rango(params.get('fecha_desde'), params.get('fecha_hasta'))
+            if not periodo.sin_limites:
+                return periodo
+
+        anio = _entero(params.get('anio'))
+        if anio and 1900 <= anio <= 2100:
+            mes = _entero(params.get('mes'))
+            if mes and 1 <= mes <= 12:
+                return cls.mes(anio, mes)
+            return cls.anio(anio)
+
+        return por_defecto if por_defecto is not None else cls()
+
+    # ----- Consultas -----
+
+    @property
+    def sin_limites(self):
+        return self.inicio is None and self.fin is None
+
+    @property
+    def hasta(self):
+        """Último día incluido en el período (para mostrarlo en formularios)"""
+        return self.fin - timedelta(days=1) if self.fin else None
+
+    def filtro(self, campo):
+        """Kwargs para ``QuerySet.filter`` / ``Q`` sobre ``campo``"""
+        kwargs = {}
+        if self.inicio:
+            kwargs[f'{campo}__gte'] = self.inicio
+        if self.fin:
+            kwargs[f'{campo}__lt'] = self.fin
+        return kwargs
+
+    def condiciones(self, columna):
+        """
+        Condiciones WHERE sobre ``columna``
+
+        Returns:
+            tuple: (lista de condiciones SQL, lista de parámetros)
+        """
+        conditions = []
+        params = []
+        if self.inicio:
+            conditions.append(f'{columna} >= %s')
+            params.append(self.inicio)
+        if self.fin:
+            conditions.append(f'{columna} < %s')
+            params.append(self.fin)
+        return conditions, params
+
+    def contiene(self, fecha):
+        return (self.inicio is None or fecha >= self.inicio) and (self.fin is None or fecha < self.fin)
+
+    def __eq__(self, otro):
+        return isinstance(otro, Periodo) and (self.inicio, self.fin) == (otro.inicio, otro.fin)
+
+    def __hash__(self):
+        return hash((self.inicio, self.fin))
+
+    def __repr__(self):
+        return f'Periodo({self.inicio!r}, {self.fin!r})'
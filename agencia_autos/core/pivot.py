@@ -0,0 +1,129 @@
+"""
+Matriz PIVOT densa construida en Python a partir de datos en formato largo.
+
+Un PIVOT en SQL con ``SUM(CASE WHEN marca = 'Toyota' ...)`` fija las columnas
+en el esquema: cada marca nueva cae en "otras" o requiere cambiar la vista.
+Aquí la consulta devuelve filas ``(fila, columna, valor...)`` y la matriz se
+arma en memoria con índices por fila y por columna, así el número de
+columnas sale de los datos.
+
+Uso:
+    pivot = MatrizPivot.desde_largo(
+        [(mes, marca, total, cantidad), ...], medidas=('total', 'cantidad')
+    )
+    pivot.columnas              # marcas, de mayor a menor total
+    pivot.matriz()              # [[total mes 1 marca 1, ...], ...]
+    pivot.valor(mes, 'Toyota')  # 0 si no hubo ventas
+    pivot.totales_fila('cantidad')
+
+En plantillas: ``{% for renglon in pivot.renglones %}`` con
+``renglon.clave``, ``renglon.valores``, ``renglon.total`` y
+``renglon.totales.<medida>``.
+"""
+from decimal import Decimal
+
+
+CERO = Decimal('0')
+
+
+class MatrizPivot:
+    """
+    Matriz filas × columnas con una o más medidas. Las celdas sin datos
+    valen 0. La primera medida es la principal (orden de columnas,
+    ``renglones``).
+    """
+
+    __slots__ = ('filas', 'columnas', 'medidas', '_indice_fila', '_indice_columna', '_datos')
+
+    def __init__(self, filas, columnas, medidas=('valor',)):
+        self.filas = list(filas)
+        self.columnas = list(columnas)
+        self.medidas = tuple(medidas)
+        self._indice_fila = {fila: i for i, fila in enumerate(self.filas)}
+        self._indice_columna = {columna: j for j, columna in enumerate(self.columnas)}
+        self._datos = {
+            medida: [[CERO] * len(self.columnas) for _ in self.filas]
+            for medida in self.medidas
+        }
+
+    @classmethod
+    def desde_largo(cls, registros, medidas=('valor',), filas=None, columnas=None):
+        """
+        Construye la matriz desde registros ``(fila, columna, valor, ...)``
+        con un valor por medida. Registros repetidos para la misma celda se
+        suman.
+
+        Sin ``filas`` / ``columnas`` explícitas, las filas quedan en orden
+        ascendente y las columnas de mayor a menor total de la primera
+        medida (empates por nombre). Con ellas se respeta ese orden, las que
+        no tienen datos quedan en 0 y los registros fuera de la lista se
+        ignoran.
+        """
+        registros = list(registros)
+        if filas is None:
+            filas = sorted({registro[0] for registro in registros})
+        if columnas is None:
+            totales = {}
+            for registro in registros:
+                totales[registro[1]] = totales.get(registro[1], CERO) + (registro[2] or CERO)
+            columnas = sorted(totales, key=lambda columna: (-totales[columna], columna))
+
+        pivot = cls(filas, columnas, medidas)
+        for fila, columna, *valores in registros:
+            if fila in pivot._indice_fila and columna in pivot._indice_columna:
+                pivot.agregar(fila, columna, *valores)
+        return pivot
+
+    def agregar(self, fila, columna, *valores):
+        """Suma ``valores`` (uno por medida) a la celda (fila, columna)"""
+        i = self._indice_fila[fila]
+        j = self._indice_columna[columna]
+        for medida, valor in zip(self.medidas, valores):
+            self._datos[medida][i][j] += valor or CERO
+
+    def _medida(self, medida):
+        return medida or self.medidas[0]
+
+    @property
+    def vacia(self):
+        return not self.filas
+
+    def valor(self, fila, columna, medida=None):
+        i = self._indice_fila.get(fila)
+        j = self._indice_columna.get(columna)
+        if i is None or j is None:
+            return CERO
+        return self._datos[self._medida(medida)][i][j]
+
+    def matriz(self, medida=None):
+        """Lista de filas (listas) en el orden de ``filas`` × ``columnas``"""
+        return self._datos[self._medida(medida)]
+
+    def totales_fila(self, medida=None):
+        return [sum(fila, CERO) for fila in self.matriz(medida)]
+
+    def totales_columna(self, medida=None):
+        return [sum(columna, CERO) for columna in zip(*self.matriz(medida))] or [CERO] * len(self.columnas)
+
+    def total(self, medida=None):
+        return sum(self.totales_fila(medida), CERO)
+
+    def renglones(self):
+        """
+        Filas listas para plantillas y exportadores: clave, valores y total
+        de la medida principal, y el total de la fila para cada medida.
+        """
+        totales = {medida: self.totales_fila(medida) for medida in self.medidas}
+        principal = self.matriz()
+        return [
+            {
+                'clave': fila,
+                'valores': principal[i],
+                'total': totales[self.medidas[0]][i],
+                'totales': {medida: totales[medida][i] for medida in self.medidas},
+            }
+            for i, fila in enumerate(self.filas)
+        ]
+
+    def __repr__(self):
+        return f'MatrizPivot({len(self.filas)} filas × {len(self.columnas)} columnas, medidas={self.medidas!r})'
@@ -0,0 +1,38 @@
+"""
+Backend de plantillas Django que cronometra cada render para core.metricas.
+
+Solo se mide el render de nivel superior (``render()``, ``TemplateResponse``);
+los ``{% include %}`` y ``{% extends %}`` quedan dentro de ese tiempo. Las
+consultas que se disparen desde la plantilla cuentan también en el tiempo de BD.
+"""
+import time
+
+from django.template.backends.django import DjangoTemplates
+
+from . import metricas
+
+
+class PlantillaMedida:
+    """Envuelve la plantilla del backend y suma su tiempo de render"""
+
+    def __init__(self, plantilla):
+        self._plantilla = plantilla
+
+    def __getattr__(self, nombre):
+        return getattr(self._plantilla, nombre)
+
+    def render(self, context=None, request=None):
+        inicio = time.perf_counter()
+        try:
+            return self._plantilla.render(context, request)
+        finally:
+            metricas.sumar_render(time.perf_counter() - inicio)
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+
+    def from_string(self, template_code):
+        return PlantillaMedida(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name))
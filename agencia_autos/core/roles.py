@@ -0,0 +1,117 @@
+"""
+Resolución de roles del usuario (Administrador / Vendedor).
+
+Los decoradores de acceso, las vistas y las plantillas necesitan saber
+a qué grupos pertenece el usuario. En lugar de consultar
+``request.user.groups`` en cada punto, los roles se resuelven una sola vez
+por request y se guardan en una caché de proceso (framework de caché de
+Django) indexada por el id del usuario.
+
+La caché se invalida mediante señales (ver ``core/signals.py``) cuando
+cambia la pertenencia a grupos, y expira sola después de
+``ROLES_CACHE_TIMEOUT`` segundos para acotar la desactualización cuando el
+cambio ocurre en otro proceso (por ejemplo ``setup_roles.py``).
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+ROL_ADMINISTRADOR = 'Administrador'
+ROL_VENDEDOR = 'Vendedor'
+
+_CACHE_VERSION_KEY = 'roles:version'
+
+
+class RolesUsuario:
+    """Roles resueltos de un usuario (inmutables durante el request)"""
+
+    def __init__(self, grupos=()):
+        self.grupos = tuple(grupos)
+
+    @property
+    def es_admin(self):
+        return ROL_ADMINISTRADOR in self.grupos
+
+    @property
+    def es_vendedor(self):
+        return ROL_VENDEDOR in self.grupos
+
+    @property
+    def tiene_rol(self):
+        """True si el usuario es Vendedor o Administrador"""
+        return self.es_admin or self.es_vendedor
+
+    @property
+    def nombre(self):
+        """Rol principal para mostrar en la interfaz"""
+        if self.es_admin:
+            return ROL_ADMINISTRADOR
+        if self.es_vendedor:
+            return ROL_VENDEDOR
+        return self.grupos[0] if self.grupos else ''
+
+    def __repr__(self):
+        return f"RolesUsuario({', '.join(self.grupos) or '-'})"
+
+
+def _version():
+    """Versión global de la caché de roles (se incrementa al invalidar todo)"""
+    version = cache.get(_CACHE_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(_CACHE_VERSION_KEY, version, None)
+    return version
+
+
+def _cache_key(user_id):
+    return f'roles:{_version()}:usuario:{user_id}'
+
+
+def resolver_roles(user):
+    """
+    Obtiene los roles de un usuario usando la caché de proceso.
+
+    Con la caché caliente no se ejecuta ninguna consulta; en caso contrario
+    se hace una sola consulta a ``auth_user_groups``.
+    """
+    if not user.is_authenticated:
+        return RolesUsuario()
+
+    key = _cache_key(user.pk)
+    grupos = cache.get(key)
+    if grupos is None:
+        grupos = tuple(user.groups.values_list('name', flat=True))
+        cache.set(key, grupos, getattr(settings, 'ROLES_CACHE_TIMEOUT', 300))
+    return RolesUsuario(grupos)
+
+
+def obtener_roles(request):
+    """
+    Devuelve los roles del usuario del request, resolviéndolos una sola vez.
+
+    Si ``RolesMiddleware`` está activo se reutiliza ``request.roles``;
+    si no, el resultado se guarda en el propio request.
+    """
+    roles = getattr(request, 'roles', None)
+    if roles is None:
+        roles = resolver_roles(request.user)
+        request.roles = roles
+    return roles
+
+
+def invalidar_roles(user_id=None):
+    """
+    Invalida la caché de roles.
+
+    Con ``user_id`` se elimina solo la entrada de ese usuario; sin argumentos
+    se invalidan todas las entradas incrementando la versión global.
+    """
+    if user_id is not None:
+        cache.delete(_cache_key(user_id))
+        return
+
+    try:
+        cache.incr(_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(_CACHE_VERSION_KEY, 2, None)
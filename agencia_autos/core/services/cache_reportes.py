@@ -0,0 +1,226 @@
+"""
+Caché en disco de los archivos de reportes (PDF/Excel)
+
+Cada archivo se guarda con un nombre derivado de su contenido lógico: tipo
+de reporte, formato, filtros normalizados y la versión de los datos. La
+versión sale de ``version_auditoria``, que los triggers de auditoría de
+vehículos y ventas incrementan en la transacción de cada cambio, así que
+cualquier alta, cambio o cancelación confirmada produce una clave nueva y
+los archivos anteriores dejan de usarse.
+
+Si el archivo ya existe se sirve directamente, sin ejecutar el SQL del
+reporte ni volver a renderizarlo. El directorio se acota por tamaño y
+cantidad de archivos expulsando los de uso menos reciente (LRU por mtime).
+
+Los cambios en catálogos, clientes o empleados no pasan por la auditoría:
+si se renombra una marca los archivos en caché la muestran con el nombre
+anterior hasta el siguiente cambio de vehículos o ventas.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse
+
+from .exportaciones import EXTENSIONES, GENERADORES
+
+
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def cache_activo():
+    """True si los archivos de reportes deben reutilizarse desde disco"""
+    return getattr(settings, 'REPORTES_CACHE_ACTIVO', True)
+
+
+def version_datos():
+    """
+    Versión de los datos de reportes: contadores de version_auditoria de
+    vehículos y ventas (dos filas por llave primaria).
+
+    No se usa MAX(id) ni MAX(fecha_evento) de la auditoría: se asignan antes
+    del COMMIT, y una transacción que confirma tarde con un id menor no
+    cambiaría la versión, dejando en caché un archivo sin sus cambios. Los
+    contadores se incrementan bajo el bloqueo de su fila, en orden de COMMIT.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT tabla, version FROM version_auditoria ORDER BY tabla")
+        filas = cursor.fetchall()
+    return '|'.join(f'{tabla}:{version}' for tabla, version in filas)
+
+
+def normalizar_filtros(filtros):
+    """Quita filtros vacíos y espacios para que filtros equivalentes den la misma clave"""
+    normalizados = {}
+    for clave, valor in (filtros or {}).items():
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor in (None, ''):
+            continue
+        normalizados[clave] = valor
+    return normalizados
+
+
+def clave_reporte(tipo_reporte, formato, filtros, version):
+    """SHA-256 del tipo, formato, filtros normalizados y versión de datos"""
+    contenido = json.dumps(
+        {
+            'tipo': tipo_reporte,
+            'formato': formato,
+            'filtros': normalizar_filtros(filtros),
+            'version': version,
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _directorio():
+    directorio = settings.REPORTES_CACHE_DIR
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _generar(tipo_reporte, formato, filtros, ruta):
+    """Genera el archivo en un temporal del mismo directorio y lo renombra"""
+    generador = GENERADORES[(tipo_reporte, formato)]
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as destino:
+            generador(formato, filtros, destino)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def podar_cache():
+    """
+    Expulsa los archivos de uso menos reciente hasta respetar
+    REPORTES_CACHE_MAX_MB y REPORTES_CACHE_MAX_ARCHIVOS.
+
+    Returns:
+        int: Cantidad de archivos eliminados
+    """
+    max_bytes = settings.REPORTES_CACHE_MAX_MB * 1024 * 1024
+    max_archivos = settings.REPORTES_CACHE_MAX_ARCHIVOS
+
+    archivos = []
+    with os.scandir(_directorio()) as entradas:
+        for entrada in entradas:
+            if not entrada.is_file() or entrada.name.endswith('.tmp'):
+                continue
+            try:
+                info = entrada.stat()
+            except FileNotFoundError:
+                continue
+            archivos.append((info.st_mtime, info.st_size, entrada.path))
+
+    archivos.sort()
+    total = sum(tamanio for _, tamanio, _ in archivos)
+    eliminados = 0
+    for _, tamanio, ruta in archivos:
+        if total <= max_bytes and len(archivos) - eliminados <= max_archivos:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamanio
+        eliminados += 1
+    return eliminados
+
+
+def vaciar_cache():
+    """
+    Elimina todos los archivos de la caché (por ejemplo tras cargas masivas
+    que no pasan por la auditoría, ver ``generar_datos``).
+
+    Returns:
+        int: Cantidad de archivos eliminados
+    """
+    eliminados = 0
+    with os.scandir(_directorio()) as entradas:
+        for entrada in entradas:
+            if entrada.is_file() and not entrada.name.endswith('.tmp'):
+                try:
+                    os.remove(entrada.path)
+                    eliminados += 1
+                except FileNotFoundError:
+                    pass
+    return eliminados
+
+
+def abrir_reporte(tipo_reporte, formato, filtros=None):
+    """
+    Devuelve el archivo del reporte abierto en modo binario, generándolo solo
+    si no está en caché.
+
+    Se devuelve el archivo abierto (y no la ruta) para que una poda
+    concurrente no lo elimine entre la consulta a la caché y la lectura.
+
+    Args:
+        tipo_reporte: 'disponibilidad' o 'ventas'
+        formato: 'pdf' o 'excel'
+        filtros: dict de filtros del reporte
+
+    Returns:
+        tuple: (archivo abierto, True si vino de la caché)
+    """
+    if (tipo_reporte, formato) not in GENERADORES:
+        raise ValueError(f'Exportación no soportada: {tipo_reporte} en formato {formato}')
+
+    filtros = normalizar_filtros(filtros)
+    clave = clave_reporte(tipo_reporte, formato, filtros, version_datos())
+    ruta = os.path.join(_directorio(), f'{clave}.{EXTENSIONES[formato]}')
+
+    try:
+        archivo = open(ruta, 'rb')
+    except FileNotFoundError:
+        archivo = None
+
+    if archivo is not None:
+        # Marca de uso reciente para la expulsión LRU
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            pass
+        return archivo, True
+
+    _generar(tipo_reporte, formato, filtros, ruta)
+    archivo = open(ruta, 'rb')
+    podar_cache()
+    return archivo, False
+
+
+def respuesta_reporte(tipo_reporte, formato, filtros=None):
+    """
+    FileResponse con el reporte, servido desde la caché cuando es posible
+    """
+    archivo, _ = abrir_reporte(tipo_reporte, formato, filtros)
+    filename = (
+        f'reporte_{tipo_reporte}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{EXTENSIONES[formato]}'
+    )
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=filename,
+        content_type=CONTENT_TYPES[formato]
+    )
+
+
+def copiar_reporte(tipo_reporte, formato, filtros, destino):
+    """Copia el reporte (desde la caché o recién generado) en el archivo ``destino``"""
+    archivo, _ = abrir_reporte(tipo_reporte, formato, filtros)
+    with archivo:
+        shutil.copyfileobj(archivo, destino)
@@ -0,0 +1,65 @@
+"""
+Servicio de diagnóstico - Conexiones a PostgreSQL
+
+Reúne la configuración de conexiones persistentes/pool del proceso actual y
+la ocupación de conexiones en el servidor, para dimensionar ``DB_POOL_MAX``
+y el número de procesos sin agotar ``max_connections``.
+"""
+from django.conf import settings
+from django.db import connection
+
+
+def configuracion_conexiones(alias='default'):
+    """Parámetros de conexión efectivos de ``alias`` (sin credenciales)"""
+    db = settings.DATABASES[alias]
+    return {
+        'engine': db['ENGINE'],
+        'conn_max_age': db.get('CONN_MAX_AGE', 0),
+        'conn_health_checks': db.get('CONN_HEALTH_CHECKS', False),
+        'pool_activo': db['ENGINE'] == 'core.db_pool',
+        'pool': db.get('POOL') or {},
+    }
+
+
+def estadisticas_pool():
+    """Estadísticas de los pools de este proceso (lista vacía si el pool no está activo)"""
+    from ..db_pool.base import estadisticas_pools
+    return estadisticas_pools()
+
+
+def conexiones_servidor():
+    """
+    Ocupación de conexiones en el servidor PostgreSQL
+
+    Returns:
+        dict: max_connections, reservadas (superuser_reserved_connections),
+            total (todas las BD), total_bd (BD actual), porcentaje_uso y
+            por_estado (lista de {estado, cantidad} para la BD actual)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT current_setting('max_connections')::INT,
+                   current_setting('superuser_reserved_connections')::INT,
+                   (SELECT COUNT(*) FROM pg_stat_activity WHERE backend_type = 'client backend')
+        """)
+        max_connections, reservadas, total = cursor.fetchone()
+
+        cursor.execute("""
+            SELECT COALESCE(state, 'desconocido') AS estado, COUNT(*) AS cantidad
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+              AND backend_type = 'client backend'
+            GROUP BY 1
+            ORDER BY 2 DESC
+        """)
+        por_estado = [{'estado': r[0], 'cantidad': r[1]} for r in cursor.fetchall()]
+
+    disponibles = max_connections - reservadas
+    return {
+        'max_connections': max_connections,
+        'reservadas': reservadas,
+        'total': total,
+        'total_bd': sum(r['cantidad'] for r in por_estado),
+        'porcentaje_uso': round(total * 100 / disponibles, 1) if disponibles else 0,
+        'por_estado': por_estado,
+    }
@@ -0,0 +1,240 @@
+"""
+Servicio para exportaciones masivas en CSV (opcionalmente gzip)
+
+Usa ``COPY (...) TO STDOUT`` de PostgreSQL mediante ``copy_expert`` de
+psycopg2: el servidor genera el CSV y los bytes se envían tal cual a la
+respuesta HTTP, sin crear objetos Python por fila.
+
+``copy_expert`` escribe en un objeto archivo y no retorna hasta terminar, por
+eso el COPY corre en un hilo con su propia conexión y entrega los bloques a
+una cola acotada que consume el StreamingHttpResponse. Si el cliente corta
+la descarga, el COPY se aborta.
+
+El PIVOT de ventas por mes y marca es la excepción: se arma en Python (una
+columna por marca) y tiene a lo sumo unas decenas de filas, así que se
+escribe directamente con el módulo csv.
+"""
+import csv
+import gzip
+import queue
+import threading
+from datetime import datetime
+
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .export_excel import condiciones_ventas
+from ..periodos import Periodo
+
+
+# Tamaño de los bloques que se envían al cliente
+TAMANIO_BLOQUE = 64 * 1024
+
+# Bloques en cola entre el hilo del COPY y la respuesta (acota la memoria)
+BLOQUES_EN_COLA = 16
+
+_FIN = object()
+
+
+class ExportacionCancelada(Exception):
+    """El cliente dejó de leer la respuesta; se aborta el COPY"""
+
+
+class _SalidaCola:
+    """
+    Archivo de solo escritura que agrupa lo que escribe COPY (una escritura
+    por fila) en bloques de TAMANIO_BLOQUE y los pone en la cola.
+    """
+
+    def __init__(self, cola, cancelado):
+        self._cola = cola
+        self._cancelado = cancelado
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= TAMANIO_BLOQUE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            _poner(self._cola, bytes(self._buffer), self._cancelado)
+            self._buffer.clear()
+
+
+def _poner(cola, item, cancelado):
+    """Pone un elemento en la cola esperando mientras el cliente siga leyendo"""
+    while True:
+        if cancelado.is_set():
+            raise ExportacionCancelada()
+        try:
+            cola.put(item, timeout=1)
+            return
+        except queue.Full:
+            continue
+
+
+def _copiar(query, params, comprimir, cola, cancelado):
+    """
+    Ejecuta el COPY en el hilo actual (conexión propia del hilo) y deja en
+    la cola los bloques, una excepción si falla y _FIN al terminar.
+    """
+    try:
+        salida = _SalidaCola(cola, cancelado)
+        destino = gzip.GzipFile(fileobj=salida, mode='wb') if comprimir else salida
+
+        with connection.cursor() as cursor:
+            consulta = cursor.mogrify(query, params).decode()
+            cursor.copy_expert(
+                f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER true)",
+                destino
+            )
+
+        if comprimir:
+            destino.close()
+        salida.flush()
+        _poner(cola, _FIN, cancelado)
+    except ExportacionCancelada:
+        pass
+    except Exception as e:
+        try:
+            _poner(cola, e, cancelado)
+        except ExportacionCancelada:
+            pass
+    finally:
+        connection.close()
+
+
+def iterar_copy(query, params=None, comprimir=False):
+    """
+    Generador de bloques de bytes con el resultado de ``query`` en CSV.
+
+    Args:
+        query: SELECT con placeholders %s
+        params: Parámetros de la consulta
+        comprimir: True para gzip
+    """
+    cola = queue.Queue(maxsize=BLOQUES_EN_COLA)
+    cancelado = threading.Event()
+    hilo = threading.Thread(
+        target=_copiar,
+        args=(query, params or [], comprimir, cola, cancelado),
+        daemon=True
+    )
+    hilo.start()
+    try:
+        while True:
+            item = cola.get()
+            if item is _FIN:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelado.set()
+        hilo.join()
+
+
+def respuesta_csv(query, params, prefijo, comprimir=False):
+    """
+    StreamingHttpResponse con el CSV (o CSV gzip) generado por COPY
+    """
+    extension = 'csv.gz' if comprimir else 'csv'
+    response = StreamingHttpResponse(
+        iterar_copy(query, params, comprimir),
+        content_type='application/gzip' if comprimir else 'text/csv; charset=utf-8'
+    )
+    filename = f'{prefijo}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def exportar_disponibilidad_csv(filtros=None, comprimir=False):
+    """
+    Exporta el reporte de disponibilidad (agrupado por marca y tipo) a CSV
+
+    Args:
+        filtros: dict opcional con fecha_desde, fecha_hasta, marca y tipo (nombres)
+        comprimir: True para gzip
+    """
+    filtros = filtros or {}
+    query = """
+        SELECT m.nombre AS marca, tv.nombre AS tipo_vehiculo,
+               COUNT(*) AS cantidad_disponible,
+               ROUND(AVG(v.precio), 2) AS precio_promedio
+        FROM vehiculo v
+        JOIN marca m ON v.marca_id = m.id
+        JOIN tipo_vehiculo tv ON v.tipo_vehiculo_id = tv.id
+        WHERE v.estado_disponibilidad = 'DISPONIBLE'
+    """
+    conditions, params = Periodo.rango(
+        filtros.get('fecha_desde'), filtros.get('fecha_hasta')
+    ).condiciones('v.fecha_ingreso')
+    for condicion in conditions:
+        query += f" AND {condicion}"
+
+    if filtros.get('marca'):
+        query += " AND m.nombre = %s"
+        params.append(filtros['marca'])
+
+    if filtros.get('tipo'):
+        query += " AND tv.nombre = %s"
+        params.append(filtros['tipo'])
+
+    query += """
+        GROUP BY m.nombre, tv.nombre
+        ORDER BY m.nombre, tv.nombre
+    """
+    return respuesta_csv(query, params, 'reporte_disponibilidad', comprimir)
+
+
+def exportar_ventas_csv(filtros=None, comprimir=False):
+    """
+    Exporta ventas con su detalle, vehículo y marca a CSV (una fila por
+    vehículo vendido). Pensado para cargas masivas de BI: no se ordena el
+    resultado para que PostgreSQL pueda emitir las filas sin un sort previo.
+
+    Args:
+        filtros: dict opcional con fecha_desde, fecha_hasta (YYYY-MM-DD) y estado
+        comprimir: True para gzip
+    """
+    query = """
+        SELECT v.id AS venta_id, v.fecha_venta, v.estado_venta,
+               v.cliente_id, v.empleado_id, v.metodo_pago_id,
+               v.total_venta, v.descuento_aplicado,
+               dv.id AS detalle_id, dv.vehiculo_id,
+               m.nombre AS marca, ve.modelo, ve.anio, ve.vin,
+               dv.cantidad, dv.precio_unitario, dv.subtotal
+        FROM venta v
+        JOIN detalle_venta dv ON dv.venta_id = v.id
+        JOIN vehiculo ve ON ve.id = dv.vehiculo_id
+        JOIN marca m ON m.id = ve.marca_id
+    """
+    conditions, params = condiciones_ventas(filtros or {})
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    return respuesta_csv(query, params, 'ventas_detalle', comprimir)
+
+
+def exportar_pivot_ventas_csv(pivot):
+    """
+    Exporta el PIVOT de ventas por mes y marca a CSV: Mes (AAAA-MM), una
+    columna por marca, Total y Vehículos
+
+    Args:
+        pivot: MatrizPivot de ``pivot_ventas_mes_marca``
+    """
+    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    filename = f'reporte_ventas_mes_marca_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    writer = csv.writer(response)
+    writer.writerow(['Mes'] + pivot.columnas + ['Total', 'Vehiculos'])
+    for renglon in pivot.renglones():
+        writer.writerow(
+            [renglon['clave'].strftime('%Y-%m')] + renglon['valores']
+            + [renglon['total'], renglon['totales']['cantidad']]
+        )
+    return response
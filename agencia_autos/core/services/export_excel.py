@@ -1,211 +1,370 @@
 """
 Servicio para exportar reportes a Excel con formato profesional
+
+Los libros se generan en modo write-only de openpyxl: las filas se escriben
+a un archivo temporal a medida que llegan y los formatos se aplican con
+estilos con nombre (NamedStyle) registrados una sola vez en el libro. Las
+ventas se leen con un cursor de servidor en lotes, de modo que la memoria se
+mantiene constante sin importar cuántas filas tenga la exportación. El
+archivo terminado se envía por partes con un StreamingHttpResponse.
 """
+import tempfile
+from datetime import datetime
+
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
-from django.http import HttpResponse
-from datetime import datetime
+from django.db import connection, transaction
+from django.http import FileResponse
 
+from ..periodos import Periodo
 
-def exportar_disponibilidad_excel(datos, filtros=None):
+
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Filas que se piden al cursor de servidor en cada viaje
+TAMANIO_LOTE = 2000
+
+FORMATO_MONEDA = '$#,##0.00'
+
+# Nombres de los estilos registrados en cada libro
+ESTILO_TITULO = 'titulo'
+ESTILO_CENTRADO = 'centrado'
+ESTILO_ENCABEZADO = 'encabezado'
+ESTILO_CELDA = 'celda'
+ESTILO_CELDA_CENTRADA = 'celda_centrada'
+ESTILO_MONEDA = 'moneda'
+ESTILO_TOTAL_ETIQUETA = 'total_etiqueta'
+ESTILO_TOTAL_CENTRADO = 'total_centrado'
+ESTILO_TOTAL_MONEDA = 'total_moneda'
+
+
+def _registrar_estilos(wb, color_encabezado):
     """
-    Exporta el reporte de disponibilidad a Excel con formato profesional
+    Registra en el libro los estilos con nombre que usan las exportaciones.
+    Cada celda referencia el estilo por nombre en lugar de crear sus propios
+    objetos Font/Border/Alignment.
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Disponibilidad"
-    
-    # Estilos
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    border = Border(
+    borde = Border(
         left=Side(style='thin'),
         right=Side(style='thin'),
         top=Side(style='thin'),
         bottom=Side(style='thin')
     )
-    
-    # Título del reporte
-    ws.merge_cells('A1:D1')
-    ws['A1'] = 'REPORTE DE DISPONIBILIDAD DE VEHÍCULOS'
-    ws['A1'].font = Font(bold=True, size=14)
-    ws['A1'].alignment = Alignment(horizontal='center')
-    
-    # Fecha de generación
-    ws.merge_cells('A2:D2')
-    ws['A2'] = f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-    ws['A2'].alignment = Alignment(horizontal='center')
-    
-    # Filtros aplicados
+    estilos = [
+        NamedStyle(name=ESTILO_TITULO, font=Font(bold=True, size=14),
+                   alignment=Alignment(horizontal='center')),
+        NamedStyle(name=ESTILO_CENTRADO, alignment=Alignment(horizontal='center')),
+        NamedStyle(name=ESTILO_ENCABEZADO, font=Font(bold=True, color="FFFFFF", size=12),
+                   fill=PatternFill(start_color=color_encabezado, end_color=color_encabezado, fill_type="solid"),
+                   alignment=Alignment(horizontal='center', vertical='center'), border=borde),
+        NamedStyle(name=ESTILO_CELDA, border=borde),
+        NamedStyle(name=ESTILO_CELDA_CENTRADA, border=borde, alignment=Alignment(horizontal='center')),
+        NamedStyle(name=ESTILO_MONEDA, border=borde, number_format=FORMATO_MONEDA),
+        NamedStyle(name=ESTILO_TOTAL_ETIQUETA, font=Font(bold=True), alignment=Alignment(horizontal='right')),
+        NamedStyle(name=ESTILO_TOTAL_CENTRADO, font=Font(bold=True), border=borde,
+                   alignment=Alignment(horizontal='center')),
+        NamedStyle(name=ESTILO_TOTAL_MONEDA, font=Font(bold=True), border=borde, number_format=FORMATO_MONEDA),
+    ]
+    for estilo in estilos:
+        wb.add_named_style(estilo)
+
+
+def _celda(ws, valor, estilo=None):
+    cell = WriteOnlyCell(ws, value=valor)
+    if estilo:
+        cell.style = estilo
+    return cell
+
+
+def _nuevo_libro(titulo_hoja, color_encabezado, anchos):
+    """
+    Crea un libro write-only con una hoja, los estilos registrados y los
+    anchos de columna (deben fijarse antes de escribir filas).
+    """
+    wb = Workbook(write_only=True)
+    _registrar_estilos(wb, color_encabezado)
+    ws = wb.create_sheet(titulo_hoja)
+    for letra, ancho in anchos.items():
+        ws.column_dimensions[letra].width = ancho
+    return wb, ws
+
+
+def _escribir_cabecera(ws, titulo, ultima_columna, lineas_filtro):
+    """
+    Escribe título, fecha de generación y filtros aplicados, seguidos de una
+    fila en blanco. Las celdas combinadas se declaran antes de guardar.
+
+    Returns:
+        int: Número de filas escritas
+    """
+    lineas = [
+        (titulo, ESTILO_TITULO),
+        (f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}', ESTILO_CENTRADO),
+    ] + [(texto, None) for texto in lineas_filtro]
+
+    for fila, (texto, estilo) in enumerate(lineas, 1):
+        ws.append([_celda(ws, texto, estilo)])
+        ws.merged_cells.add(f'A{fila}:{ultima_columna}{fila}')
+    ws.append([])
+    return len(lineas) + 1
+
+
+def _respuesta_archivo(wb, prefijo):
+    """
+    Guarda el libro en un archivo temporal y lo envía por partes.
+    FileResponse (subclase de StreamingHttpResponse) cierra y elimina el
+    temporal al terminar.
+    """
+    archivo = tempfile.TemporaryFile()
+    wb.save(archivo)
+    archivo.seek(0)
+
+    filename = f'{prefijo}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=filename,
+        content_type=CONTENT_TYPE_XLSX
+    )
+
+
+def iterar_consulta(query, params=None, tamanio_lote=TAMANIO_LOTE):
+    """
+    Ejecuta una consulta con un cursor de servidor (DECLARE ... CURSOR) y
+    devuelve las filas como tuplas, trayendo ``tamanio_lote`` filas por viaje.
+
+    La transacción mantiene el cursor abierto sin WITH HOLD, por lo que
+    PostgreSQL no materializa el resultado completo.
+    """
+    with transaction.atomic():
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(query, params)
+            while True:
+                filas = cursor.fetchmany(tamanio_lote)
+                if not filas:
+                    break
+                yield from filas
+
+
+def exportar_disponibilidad_excel(datos, filtros=None):
+    """
+    Exporta el reporte de disponibilidad a Excel con formato profesional
+
+    Args:
+        datos: Iterable de diccionarios (marca, tipo_vehiculo,
+            cantidad_disponible, precio_promedio); se recorre una sola vez
+        filtros: Filtros aplicados para mostrar en la cabecera
+    """
+    return _respuesta_archivo(_libro_disponibilidad(datos, filtros), 'reporte_disponibilidad')
+
+
+def generar_disponibilidad_excel(datos, filtros, destino):
+    """Genera el Excel de disponibilidad en ``destino`` (ruta o archivo abierto)"""
+    _libro_disponibilidad(datos, filtros).save(destino)
+
+
+def _libro_disponibilidad(datos, filtros):
+    wb, ws = _nuevo_libro(
+        'Disponibilidad', '4472C4',
+        {'A': 20, 'B': 25, 'C': 20, 'D': 20}
+    )
+
+    # Título, fecha de generación y filtros aplicados
+    lineas_filtro = []
     if filtros:
-        row = 3
         if filtros.get('fecha_desde') or filtros.get('fecha_hasta'):
-            ws.merge_cells(f'A{row}:D{row}')
-            fecha_texto = f"Período: {filtros.get('fecha_desde', 'Inicio')} - {filtros.get('fecha_hasta', 'Hoy')}"
-            ws[f'A{row}'] = fecha_texto
-            row += 1
+            lineas_filtro.append(
+                f"Período: {filtros.get('fecha_desde', 'Inicio')} - {filtros.get('fecha_hasta', 'Hoy')}"
+            )
         if filtros.get('marca'):
-            ws.merge_cells(f'A{row}:D{row}')
-            ws[f'A{row}'] = f"Marca: {filtros['marca']}"
-            row += 1
+            lineas_filtro.append(f"Marca: {filtros['marca']}")
         if filtros.get('tipo'):
-            ws.merge_cells(f'A{row}:D{row}')
-            ws[f'A{row}'] = f"Tipo: {filtros['tipo']}"
-            row += 1
-        start_row = row + 1
-    else:
-        start_row = 4
-    
+            lineas_filtro.append(f"Tipo: {filtros['tipo']}")
+    filas_cabecera = _escribir_cabecera(ws, 'REPORTE DE DISPONIBILIDAD DE VEHÍCULOS', 'D', lineas_filtro)
+
     # Encabezados
     headers = ['Marca', 'Tipo de Vehículo', 'Cantidad Disponible', 'Precio Promedio']
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=start_row, column=col_num)
-        cell.value = header
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = border
-    
-    # Datos
-    for row_num, dato in enumerate(datos, start_row + 1):
-        ws.cell(row=row_num, column=1, value=dato['marca']).border = border
-        ws.cell(row=row_num, column=2, value=dato['tipo_vehiculo']).border = border
-        ws.cell(row=row_num, column=3, value=dato['cantidad_disponible']).border = border
-        ws.cell(row=row_num, column=3).alignment = Alignment(horizontal='center')
-        
-        precio_cell = ws.cell(row=row_num, column=4, value=float(dato['precio_promedio']))
-        precio_cell.number_format = '$#,##0.00'
-        precio_cell.border = border
-    
-    # Ajustar anchos de columna
-    ws.column_dimensions['A'].width = 20
-    ws.column_dimensions['B'].width = 25
-    ws.column_dimensions['C'].width = 20
-    ws.column_dimensions['D'].width = 20
-    
+    ws.append([_celda(ws, header, ESTILO_ENCABEZADO) for header in headers])
+
+    # Datos (los totales se acumulan mientras se escribe)
+    total_cantidad = 0
+    suma_precios = 0.0
+    filas = 0
+    for dato in datos:
+        precio = float(dato['precio_promedio'])
+        ws.append([
+            _celda(ws, dato['marca'], ESTILO_CELDA),
+            _celda(ws, dato['tipo_vehiculo'], ESTILO_CELDA),
+            _celda(ws, dato['cantidad_disponible'], ESTILO_CELDA_CENTRADA),
+            _celda(ws, precio, ESTILO_MONEDA),
+        ])
+        total_cantidad += dato['cantidad_disponible']
+        suma_precios += precio
+        filas += 1
+
     # Totales
-    if datos:
-        total_row = len(datos) + start_row + 1
-        ws.merge_cells(f'A{total_row}:B{total_row}')
-        ws[f'A{total_row}'] = 'TOTAL'
-        ws[f'A{total_row}'].font = Font(bold=True)
-        ws[f'A{total_row}'].alignment = Alignment(horizontal='right')
-        
-        total_cantidad = sum(d['cantidad_disponible'] for d in datos)
-        ws[f'C{total_row}'] = total_cantidad
-        ws[f'C{total_row}'].font = Font(bold=True)
-        ws[f'C{total_row}'].alignment = Alignment(horizontal='center')
-        ws[f'C{total_row}'].border = border
-        
-        promedio_precio = sum(float(d['precio_promedio']) for d in datos) / len(datos)
-        ws[f'D{total_row}'] = promedio_precio
-        ws[f'D{total_row}'].number_format = '$#,##0.00'
-        ws[f'D{total_row}'].font = Font(bold=True)
-        ws[f'D{total_row}'].border = border
-    
-    # Preparar respuesta HTTP
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    filename = f'reporte_disponibilidad_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    wb.save(response)
-    return response
+    if filas:
+        ws.append([
+            _celda(ws, 'TOTAL', ESTILO_TOTAL_ETIQUETA),
+            None,
+            _celda(ws, total_cantidad, ESTILO_TOTAL_CENTRADO),
+            _celda(ws, suma_precios / filas, ESTILO_TOTAL_MONEDA),
+        ])
+        fila_total = filas_cabecera + filas + 2
+        ws.merged_cells.add(f'A{fila_total}:B{fila_total}')
+
+    return wb
+
+
+def condiciones_ventas(filtros):
+    """
+    Condiciones WHERE (sobre el alias ``v`` de venta) para los filtros de
+    las exportaciones de ventas: fecha_desde, fecha_hasta (YYYY-MM-DD) y estado.
+
+    Returns:
+        tuple: (lista de condiciones SQL, lista de parámetros)
+    """
+    # Rango semiabierto: incluye todo el día fecha_hasta
+    periodo = Periodo.rango(filtros.get('fecha_desde'), filtros.get('fecha_hasta'))
+    conditions, params = periodo.condiciones('v.fecha_venta')
+
+    if filtros.get('estado'):
+        conditions.append("v.estado_venta = %s")
+        params.append(filtros['estado'])
+
+    return conditions, params
 
 
-def exportar_ventas_excel(datos, filtros=None):
+def _consulta_ventas(filtros):
+    """
+    SQL de la exportación de ventas: trae los nombres de cliente y empleado
+    en la misma consulta en lugar de acceder a venta.cliente / venta.empleado
+    por fila.
+    """
+    query = """
+        SELECT v.id, v.fecha_venta, c.nombre_completo, e.nombre_completo,
+               v.total_venta, v.estado_venta
+        FROM venta v
+        JOIN cliente c ON c.id = v.cliente_id
+        JOIN empleado e ON e.id = v.empleado_id
+    """
+    conditions, params = condiciones_ventas(filtros)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    query += " ORDER BY v.fecha_venta, v.id"
+    return query, params
+
+
+def exportar_ventas_excel(filtros=None):
     """
     Exporta el reporte de ventas a Excel con formato profesional
+
+    Las ventas se leen por lotes con un cursor de servidor y se escriben fila
+    a fila, por lo que exportaciones de varios años no cargan todo en memoria.
+
+    Args:
+        filtros: dict opcional con fecha_desde, fecha_hasta (YYYY-MM-DD) y estado
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Ventas"
-    
-    # Estilos
-    header_fill = PatternFill(start_color="28A745", end_color="28A745", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+    return _respuesta_archivo(_libro_ventas(filtros or {}), 'reporte_ventas')
+
+
+def generar_ventas_excel(filtros, destino):
+    """Genera el Excel de ventas en ``destino`` (ruta o archivo abierto)"""
+    _libro_ventas(filtros or {}).save(destino)
+
+
+def _libro_ventas(filtros):
+    wb, ws = _nuevo_libro(
+        'Ventas', '28A745',
+        {'A': 12, 'B': 15, 'C': 30, 'D': 30, 'E': 15, 'F': 12}
     )
-    
-    # Título
-    ws.merge_cells('A1:F1')
-    ws['A1'] = 'REPORTE DE VENTAS'
-    ws['A1'].font = Font(bold=True, size=14)
-    ws['A1'].alignment = Alignment(horizontal='center')
-    
-    # Fecha de generación
-    ws.merge_cells('A2:F2')
-    ws['A2'] = f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-    ws['A2'].alignment = Alignment(horizontal='center')
-    
-    # Filtros aplicados
-    start_row = 4
-    if filtros:
-        row = 3
-        if filtros.get('fecha_desde') or filtros.get('fecha_hasta'):
-            ws.merge_cells(f'A{row}:F{row}')
-            fecha_texto = f"Período: {filtros.get('fecha_desde', 'Inicio')} - {filtros.get('fecha_hasta', 'Hoy')}"
-            ws[f'A{row}'] = fecha_texto
-            row += 1
-        start_row = row + 1
-    
+
+    # Título, fecha de generación y filtros aplicados
+    lineas_filtro = []
+    if filtros.get('fecha_desde') or filtros.get('fecha_hasta'):
+        lineas_filtro.append(
+            f"Período: {filtros.get('fecha_desde') or 'Inicio'} - {filtros.get('fecha_hasta') or 'Hoy'}"
+        )
+    if filtros.get('estado'):
+        lineas_filtro.append(f"Estado: {filtros['estado']}")
+    filas_cabecera = _escribir_cabecera(ws, 'REPORTE DE VENTAS', 'F', lineas_filtro)
+
     # Encabezados
     headers = ['ID Venta', 'Fecha', 'Cliente', 'Empleado', 'Total', 'Estado']
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=start_row, column=col_num)
-        cell.value = header
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = border
-    
+    ws.append([_celda(ws, header, ESTILO_ENCABEZADO) for header in headers])
+
     # Datos
-    for row_num, venta in enumerate(datos, start_row + 1):
-        ws.cell(row=row_num, column=1, value=venta.id).border = border
-        ws.cell(row=row_num, column=2, value=venta.fecha_venta.strftime('%d/%m/%Y')).border = border
-        ws.cell(row=row_num, column=3, value=venta.cliente.nombre_completo).border = border
-        ws.cell(row=row_num, column=4, value=venta.empleado.nombre_completo).border = border
-        
-        total_cell = ws.cell(row=row_num, column=5, value=float(venta.total_venta))
-        total_cell.number_format = '$#,##0.00'
-        total_cell.border = border
-        
-        ws.cell(row=row_num, column=6, value=venta.estado_venta).border = border
-    
-    # Ajustar anchos
-    ws.column_dimensions['A'].width = 12
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 30
-    ws.column_dimensions['D'].width = 30
-    ws.column_dimensions['E'].width = 15
-    ws.column_dimensions['F'].width = 12
-    
+    query, params = _consulta_ventas(filtros)
+    total_ventas = 0.0
+    filas = 0
+    for venta_id, fecha_venta, cliente, empleado, total, estado in iterar_consulta(query, params):
+        total = float(total)
+        ws.append([
+            _celda(ws, venta_id, ESTILO_CELDA),
+            _celda(ws, fecha_venta.strftime('%d/%m/%Y'), ESTILO_CELDA),
+            _celda(ws, cliente, ESTILO_CELDA),
+            _celda(ws, empleado, ESTILO_CELDA),
+            _celda(ws, total, ESTILO_MONEDA),
+            _celda(ws, estado, ESTILO_CELDA),
+        ])
+        total_ventas += total
+        filas += 1
+
     # Totales
-    if datos:
-        total_row = len(datos) + start_row + 1
-        ws.merge_cells(f'A{total_row}:D{total_row}')
-        ws[f'A{total_row}'] = 'TOTAL'
-        ws[f'A{total_row}'].font = Font(bold=True)
-        ws[f'A{total_row}'].alignment = Alignment(horizontal='right')
-        
-        total_ventas = sum(float(v.total_venta) for v in datos)
-        ws[f'E{total_row}'] = total_ventas
-        ws[f'E{total_row}'].number_format = '$#,##0.00'
-        ws[f'E{total_row}'].font = Font(bold=True)
-        ws[f'E{total_row}'].border = border
-    
-    # Preparar respuesta
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    filename = f'reporte_ventas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    wb.save(response)
-    return response
+    if filas:
+        ws.append([
+            _celda(ws, 'TOTAL', ESTILO_TOTAL_ETIQUETA),
+            None, None, None,
+            _celda(ws, total_ventas, ESTILO_TOTAL_MONEDA),
+        ])
+        fila_total = filas_cabecera + filas + 2
+        ws.merged_cells.add(f'A{fila_total}:D{fila_total}')
+
+    return wb
+
+
+def exportar_pivot_ventas_excel(pivot, titulo_periodo=''):
+    """
+    Exporta el PIVOT de ventas por mes y marca a Excel: una columna por
+    marca de la matriz, más total y vehículos vendidos por mes
+
+    Args:
+        pivot: MatrizPivot de ``pivot_ventas_mes_marca``
+        titulo_periodo: Texto del período para la cabecera (por ejemplo 'Año 2024')
+    """
+    return _respuesta_archivo(_libro_pivot_ventas(pivot, titulo_periodo), 'reporte_ventas_mes_marca')
+
+
+def _libro_pivot_ventas(pivot, titulo_periodo):
+    columnas = len(pivot.columnas) + 3
+    anchos = {'A': 12}
+    anchos.update({get_column_letter(j): 16 for j in range(2, columnas + 1)})
+    wb, ws = _nuevo_libro('Ventas por Mes y Marca', '4472C4', anchos)
+
+    ultima_columna = get_column_letter(columnas)
+    lineas_filtro = [titulo_periodo] if titulo_periodo else []
+    _escribir_cabecera(ws, 'REPORTE PIVOT - VENTAS POR MES Y MARCA', ultima_columna, lineas_filtro)
+
+    headers = ['Mes'] + pivot.columnas + ['Total', 'Vehículos']
+    ws.append([_celda(ws, header, ESTILO_ENCABEZADO) for header in headers])
+
+    for renglon in pivot.renglones():
+        ws.append(
+            [_celda(ws, renglon['clave'].strftime('%Y-%m'), ESTILO_CELDA_CENTRADA)]
+            + [_celda(ws, float(valor), ESTILO_MONEDA) for valor in renglon['valores']]
+            + [_celda(ws, float(renglon['total']), ESTILO_TOTAL_MONEDA),
+               _celda(ws, int(renglon['totales']['cantidad']), ESTILO_CELDA_CENTRADA)]
+        )
+
+    if not pivot.vacia:
+        ws.append(
+            [_celda(ws, 'TOTAL', ESTILO_TOTAL_ETIQUETA)]
+            + [_celda(ws, float(total), ESTILO_TOTAL_MONEDA) for total in pivot.totales_columna()]
+            + [_celda(ws, float(pivot.total()), ESTILO_TOTAL_MONEDA),
+               _celda(ws, int(pivot.total('cantidad')), ESTILO_TOTAL_CENTRADO)]
+        )
+
+    return wb
@@ -20,8 +20,17 @@ def exportar_disponibilidad_pdf(datos, filtros=None):
     filename = f'reporte_disponibilidad_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     
+    generar_disponibilidad_pdf(datos, filtros, response)
+    return response
+
+
+def generar_disponibilidad_pdf(datos, filtros, destino):
+    """
+    Genera el PDF de disponibilidad en ``destino`` (ruta o archivo abierto).
+    Lo usan la respuesta directa y el worker de exportaciones en segundo plano.
+    """
     # Crear documento
-    doc = SimpleDocTemplate(response, pagesize=letter,
+    doc = SimpleDocTemplate(destino, pagesize=letter,
                            rightMargin=72, leftMargin=72,
                            topMargin=72, bottomMargin=18)
     
@@ -139,7 +148,6 @@ def exportar_disponibilidad_pdf(datos, filtros=None):
     
     # Construir PDF
     doc.build(elements)
-    return response
 
 
 def exportar_ventas_pdf(datos, filtros=None):
@@ -0,0 +1,210 @@
+"""
+Servicio de exportaciones en segundo plano - Cola en PostgreSQL
+
+Las vistas encolan un trabajo en la tabla trabajo_exportacion y responden de
+inmediato con una página de estado. El worker
+(``python manage.py procesar_exportaciones``) toma los trabajos con
+``SELECT ... FOR UPDATE SKIP LOCKED``, genera el archivo en
+``EXPORTACIONES_DIR`` y marca el trabajo como COMPLETADO o ERROR.
+"""
+import json
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+TIPOS_REPORTE = {
+    'disponibilidad': 'Disponibilidad de vehículos',
+    'ventas': 'Ventas',
+}
+
+EXTENSIONES = {
+    'pdf': 'pdf',
+    'excel': 'xlsx',
+}
+
+
+def _generar_disponibilidad(formato, filtros, destino):
+    from .reportes import obtener_disponibilidad_por_marca_tipo
+
+    datos = obtener_disponibilidad_por_marca_tipo(
+        fecha_desde=filtros.get('fecha_desde'),
+        fecha_hasta=filtros.get('fecha_hasta'),
+        marca=filtros.get('marca'),
+        tipo=filtros.get('tipo')
+    )
+    if formato == 'pdf':
+        from .export_pdf import generar_disponibilidad_pdf
+        generar_disponibilidad_pdf(datos, filtros, destino)
+    else:
+        from .export_excel import generar_disponibilidad_excel
+        generar_disponibilidad_excel(datos, filtros, destino)
+
+
+def _generar_ventas(formato, filtros, destino):
+    from .export_excel import generar_ventas_excel
+    generar_ventas_excel(filtros, destino)
+
+
+# (tipo_reporte, formato) -> función generadora(formato, filtros, destino)
+GENERADORES = {
+    ('disponibilidad', 'pdf'): _generar_disponibilidad,
+    ('disponibilidad', 'excel'): _generar_disponibilidad,
+    ('ventas', 'excel'): _generar_ventas,
+}
+
+
+def exportacion_en_segundo_plano():
+    """True si las exportaciones PDF/Excel deben encolarse en lugar de generarse en el request"""
+    return getattr(settings, 'EXPORTACIONES_EN_SEGUNDO_PLANO', False)
+
+
+def encolar_exportacion(tipo_reporte, formato, filtros=None, usuario_id=None):
+    """
+    Registra un trabajo de exportación PENDIENTE
+
+    Args:
+        tipo_reporte: 'disponibilidad' o 'ventas'
+        formato: 'pdf' o 'excel'
+        filtros: dict de filtros del reporte (se guarda como JSONB)
+        usuario_id: Usuario que solicita la exportación
+
+    Returns:
+        int: ID del trabajo creado
+    """
+    if (tipo_reporte, formato) not in GENERADORES:
+        raise ValueError(f'Exportación no soportada: {tipo_reporte} en formato {formato}')
+
+    filtros = {k: v for k, v in (filtros or {}).items() if v}
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO trabajo_exportacion (tipo_reporte, formato, filtros, usuario_id)
+            VALUES (%s, %s, %s::JSONB, %s)
+            RETURNING id
+        """, [tipo_reporte, formato, json.dumps(filtros), usuario_id])
+        return cursor.fetchone()[0]
+
+
+def tomar_siguiente_trabajo():
+    """
+    Toma el trabajo PENDIENTE más antiguo y lo marca EN_PROCESO.
+
+    ``FOR UPDATE SKIP LOCKED`` hace que workers concurrentes no esperen ni
+    tomen el mismo trabajo: cada uno salta las filas bloqueadas por otro.
+
+    Returns:
+        dict | None: Trabajo tomado o None si no hay pendientes
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE trabajo_exportacion
+                SET estado = 'EN_PROCESO',
+                    intentos = intentos + 1,
+                    fecha_inicio = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM trabajo_exportacion
+                    WHERE estado = 'PENDIENTE'
+                    ORDER BY id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, tipo_reporte, formato, filtros
+            """)
+            row = cursor.fetchone()
+
+    if row is None:
+        return None
+    columns = ['id', 'tipo_reporte', 'formato', 'filtros']
+    trabajo = dict(zip(columns, row))
+    if isinstance(trabajo['filtros'], str):
+        trabajo['filtros'] = json.loads(trabajo['filtros'])
+    return trabajo
+
+
+def procesar_trabajo(trabajo):
+    """
+    Genera el archivo de un trabajo tomado y registra el resultado
+
+    Returns:
+        bool: True si el archivo se generó correctamente
+    """
+    from .cache_reportes import cache_activo, copiar_reporte
+
+    directorio = settings.EXPORTACIONES_DIR
+    os.makedirs(directorio, exist_ok=True)
+
+    extension = EXTENSIONES[trabajo['formato']]
+    nombre_archivo = (
+        f"reporte_{trabajo['tipo_reporte']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    )
+    ruta = os.path.join(directorio, f"exportacion_{trabajo['id']}.{extension}")
+
+    # Se escribe a un temporal y se renombra: la descarga nunca ve un archivo a medias
+    ruta_temporal = f'{ruta}.tmp'
+    try:
+        with open(ruta_temporal, 'wb') as destino:
+            if cache_activo():
+                copiar_reporte(trabajo['tipo_reporte'], trabajo['formato'], trabajo['filtros'], destino)
+            else:
+                generador = GENERADORES[(trabajo['tipo_reporte'], trabajo['formato'])]
+                generador(trabajo['formato'], trabajo['filtros'], destino)
+        os.replace(ruta_temporal, ruta)
+    except Exception as e:
+        try:
+            os.remove(ruta_temporal)
+        except FileNotFoundError:
+            pass
+        _finalizar(trabajo['id'], 'ERROR', mensaje_error=str(e))
+        return False
+
+    _finalizar(trabajo['id'], 'COMPLETADO', nombre_archivo=nombre_archivo, ruta_archivo=ruta)
+    return True
+
+
+def _finalizar(trabajo_id, estado, nombre_archivo=None, ruta_archivo=None, mensaje_error=None):
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            UPDATE trabajo_exportacion
+            SET estado = %s,
+                nombre_archivo = %s,
+                ruta_archivo = %s,
+                mensaje_error = %s,
+                fecha_fin = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, [estado, nombre_archivo, ruta_archivo, mensaje_error, trabajo_id])
+
+
+def reencolar_trabajos_colgados(minutos, max_intentos=None):
+    """
+    Devuelve a PENDIENTE los trabajos EN_PROCESO hace más de ``minutos``
+    (por ejemplo si un worker se detuvo a mitad de una exportación).
+
+    Un trabajo que ya se tomó ``max_intentos`` veces pasa a ERROR en lugar de
+    reencolarse: si tumba al worker (memoria, timeout) lo haría en cada intento.
+
+    Args:
+        minutos: Antigüedad mínima de fecha_inicio
+        max_intentos: Intentos permitidos; None usa EXPORTACIONES_MAX_INTENTOS
+
+    Returns:
+        tuple: (trabajos reencolados, trabajos marcados como ERROR)
+    """
+    if max_intentos is None:
+        max_intentos = getattr(settings, 'EXPORTACIONES_MAX_INTENTOS', 3)
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            UPDATE trabajo_exportacion
+            SET estado = CASE WHEN intentos >= %(max)s THEN 'ERROR' ELSE 'PENDIENTE' END,
+                mensaje_error = CASE WHEN intentos >= %(max)s
+                    THEN 'El trabajo no terminó tras ' || intentos || ' intento(s)'
+                    ELSE mensaje_error END,
+                fecha_fin = CASE WHEN intentos >= %(max)s THEN CURRENT_TIMESTAMP ELSE fecha_fin END
+            WHERE estado = 'EN_PROCESO'
+              AND fecha_inicio < CURRENT_TIMESTAMP - make_interval(mins => %(minutos)s)
+            RETURNING estado
+        """, {'max': max_intentos, 'minutos': minutos})
+        estados = [row[0] for row in cursor.fetchall()]
+    return estados.count('PENDIENTE'), estados.count('ERROR')
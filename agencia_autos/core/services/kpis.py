@@ -0,0 +1,264 @@
+"""
+Servicio de KPIs - Métricas de las pantallas principales
+
+Los conteos y montos se leen de las tablas kpi_contador y kpi_ventas_mes,
+que los triggers de la BD mantienen de forma incremental (ver
+03-triggers.sql). Así el inicio, el dashboard y los listados leen O(1) filas
+en lugar de hacer COUNT(*) sobre vehiculo y venta.
+
+Para reconstruir o verificar los contadores: python manage.py reconstruir_kpis
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import Vehiculo
+from ..periodos import Periodo
+
+
+DIAS_ALERTA_INVENTARIO = 90
+
+_RANKING_VERSION_KEY = 'ranking_vendedores:version'
+
+
+class Contadores:
+    """
+    Foto de la tabla kpi_contador (mantenida por triggers en la BD)
+
+    Uso:
+        contadores = leer_contadores()
+        contadores.cantidad('vehiculo', 'DISPONIBLE')
+        contadores.cantidad('venta')   # suma de todos los estados
+    """
+
+    def __init__(self, filas):
+        self._filas = {(entidad, clave): (cantidad, monto) for entidad, clave, cantidad, monto in filas}
+
+    def cantidad(self, entidad, clave=None):
+        return sum(c for (e, k), (c, m) in self._filas.items()
+                   if e == entidad and (clave is None or k == clave))
+
+    def monto(self, entidad, clave=None):
+        return sum((m for (e, k), (c, m) in self._filas.items()
+                    if e == entidad and (clave is None or k == clave)), Decimal('0'))
+
+    def promedio(self, entidad, clave=None):
+        cantidad = self.cantidad(entidad, clave)
+        return self.monto(entidad, clave) / cantidad if cantidad else 0
+
+
+def leer_contadores():
+    """
+    Lee todos los contadores de kpi_contador en una consulta (pocas filas)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT entidad, clave, cantidad, monto FROM kpi_contador")
+        return Contadores(cursor.fetchall())
+
+
+def ventas_del_mes(hoy=None, empleado_id=None):
+    """
+    Cantidad e ingresos de ventas ACTIVAS del mes desde kpi_ventas_mes
+
+    Returns:
+        tuple: (cantidad_ventas, total_ventas)
+    """
+    inicio = Periodo.mes_actual(hoy).inicio
+    query = """
+        SELECT COALESCE(SUM(cantidad_ventas), 0), COALESCE(SUM(total_ventas), 0)
+        FROM kpi_ventas_mes
+        WHERE mes = %s
+    """
+    params = [inicio]
+    if empleado_id is not None:
+        query += " AND empleado_id = %s"
+        params.append(empleado_id)
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchone()
+
+
+def kpis_ventas(hoy=None, empleado_id=None, contadores=None):
+    """
+    Métricas de ventas leídas de las tablas de contadores
+
+    Returns:
+        dict: total_ventas, ventas_mes, ingresos_mes, promedio_venta
+    """
+    ventas_mes, ingresos_mes = ventas_del_mes(hoy, empleado_id)
+    resultado = {
+        'ventas_mes': ventas_mes,
+        'ingresos_mes': ingresos_mes,
+    }
+    if empleado_id is None:
+        contadores = contadores or leer_contadores()
+        resultado['total_ventas'] = contadores.cantidad('venta')
+        resultado['promedio_venta'] = contadores.promedio('venta', 'ACTIVA')
+    return resultado
+
+
+def kpis_vehiculos(contadores=None):
+    """
+    Métricas de inventario leídas de kpi_contador
+
+    Returns:
+        dict: total_vehiculos, disponibles, precio_promedio
+    """
+    contadores = contadores or leer_contadores()
+    return {
+        'total_vehiculos': contadores.cantidad('vehiculo'),
+        'disponibles': contadores.cantidad('vehiculo', 'DISPONIBLE'),
+        'precio_promedio': contadores.promedio('vehiculo'),
+    }
+
+
+def contar_vehiculos_antiguos(hoy=None):
+    """
+    Vehículos DISPONIBLES con más de DIAS_ALERTA_INVENTARIO días en inventario
+
+    Depende de la fecha actual, por lo que no se puede mantener como contador.
+    """
+    hoy = hoy or timezone.localdate()
+    fecha_limite = hoy - timedelta(days=DIAS_ALERTA_INVENTARIO)
+    return Vehiculo.objects.filter(
+        estado_disponibilidad='DISPONIBLE',
+        fecha_ingreso__lt=fecha_limite
+    ).count()
+
+
+def kpis_empleados(contadores=None):
+    """
+    Conteo de empleados por estado leído de kpi_contador
+
+    Returns:
+        dict: total_empleados, empleados_activos, empleados_inactivos
+    """
+    contadores = contadores or leer_contadores()
+    return {
+        'total_empleados': contadores.cantidad('empleado'),
+        'empleados_activos': contadores.cantidad('empleado', 'ACTIVO'),
+        'empleados_inactivos': contadores.cantidad('empleado', 'INACTIVO'),
+    }
+
+
+def kpis_inicio(contadores=None):
+    """
+    Indicadores de la página de inicio
+    """
+    contadores = contadores or leer_contadores()
+    return {
+        'total_vehiculos_disponibles': contadores.cantidad('vehiculo', 'DISPONIBLE'),
+        'total_clientes': contadores.cantidad('cliente', 'TOTAL'),
+        'clientes_con_compras': contadores.cantidad('cliente', 'CON_COMPRAS'),
+        'total_ventas_activas': contadores.cantidad('venta', 'ACTIVA'),
+    }
+
+
+def kpis_dashboard_admin(hoy=None, contadores=None, ventas_mes=None, vehiculos_antiguos=None):
+    """
+    Indicadores del dashboard de administrador
+
+    Lee los contadores (O(1) filas) y solo consulta vehiculo para la alerta
+    de inventario antiguo, que depende de la fecha actual. Las tres lecturas
+    son independientes: la vista asíncrona las hace en paralelo y pasa
+    ``contadores``, ``ventas_mes`` ((cantidad, ingresos) de
+    ``ventas_del_mes``) y ``vehiculos_antiguos`` ya calculados.
+    """
+    hoy = hoy or timezone.localdate()
+    contadores = contadores or leer_contadores()
+    ventas_mes, ingresos_mes = ventas_mes or ventas_del_mes(hoy)
+    if vehiculos_antiguos is None:
+        vehiculos_antiguos = contar_vehiculos_antiguos(hoy)
+
+    return {
+        'vehiculos_disponibles': contadores.cantidad('vehiculo', 'DISPONIBLE'),
+        'vehiculos_antiguos': vehiculos_antiguos,
+        'ventas_mes': ventas_mes,
+        'ingresos_mes': ingresos_mes,
+        'empleados_activos': contadores.cantidad('empleado', 'ACTIVO'),
+    }
+
+
+def _ranking_cache_key(mes):
+    version = cache.get(_RANKING_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(_RANKING_VERSION_KEY, version, None)
+    return f'ranking_vendedores:{version}:{mes:%Y-%m}'
+
+
+def ranking_vendedores(hoy=None):
+    """
+    Ranking de empleados activos por cantidad de ventas ACTIVAS del mes de
+    ``hoy`` (función SQL ranking_empleados_mes: RANK() sobre kpi_ventas_mes).
+
+    Una consulta devuelve el ranking completo, que se guarda en caché por mes
+    durante RANKING_VENDEDORES_CACHE_TIMEOUT segundos y se comparte entre
+    todos los vendedores. Registrar o cancelar ventas la invalida.
+
+    Returns:
+        list: dicts con empleado_id, nombre_completo, puesto, cantidad_ventas,
+            total_ventas, posicion_por_cantidad y total_empleados
+    """
+    mes = Periodo.mes_actual(hoy).inicio
+    key = _ranking_cache_key(mes)
+    ranking = cache.get(key)
+    if ranking is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM ranking_empleados_mes(%s)", [mes])
+            columns = [col[0] for col in cursor.description]
+            ranking = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cache.set(key, ranking, getattr(settings, 'RANKING_VENDEDORES_CACHE_TIMEOUT', 60))
+    return ranking
+
+
+def posicion_vendedor(empleado_id, hoy=None):
+    """
+    Posición de un empleado en el ranking del mes y total de empleados activos
+
+    Returns:
+        tuple: (posicion, total_empleados); posicion es None si el empleado no
+            está activo
+    """
+    ranking = ranking_vendedores(hoy)
+    for fila in ranking:
+        if fila['empleado_id'] == empleado_id:
+            return fila['posicion_por_cantidad'], fila['total_empleados']
+    return None, len(ranking)
+
+
+def invalidar_ranking_vendedores():
+    """Invalida el ranking en caché de todos los meses incrementando la versión"""
+    try:
+        cache.incr(_RANKING_VERSION_KEY)
+    except ValueError:
+        cache.set(_RANKING_VERSION_KEY, 2, None)
+
+
+def reconstruir_contadores():
+    """
+    Reconstruye kpi_contador, kpi_ventas_mes y cliente_metricas desde cero
+    (función SQL recalcular_kpis)
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT recalcular_kpis()")
+    invalidar_ranking_vendedores()
+
+
+def verificar_contadores():
+    """
+    Compara los contadores con un recálculo completo (función SQL verificar_kpis)
+
+    Returns:
+        list: Diferencias encontradas (vacía si los contadores son consistentes)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT * FROM verificar_kpis()")
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
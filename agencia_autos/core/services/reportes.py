@@ -1,101 +1,509 @@
 """
 Servicio de Reportes - Consulta vistas SQL con PIVOT y RANK
+
+El PIVOT, el top de marcas y las tendencias multianuales se arman con los
+agregados parciales por año (``agregados_por_anio``) de
+resumen_ventas_mes_marca: los años cerrados se guardan en caché sin
+expiración y solo el año en curso se vuelve a leer. El resumen y las vistas
+materializadas (mv_ventas_mes_marca, mv_top_marcas_anio, para el admin y
+consultas SQL) se refrescan de forma incremental con
+``python manage.py refrescar_reportes``.
 """
-from django.db import connection
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .. import catalogos
+from ..periodos import Periodo
+from ..pivot import CERO, MatrizPivot
+
+
+VISTAS_MATERIALIZADAS = ('mv_ventas_mes_marca', 'mv_top_marcas_anio')
+
+# Nivel de inventario -> (días mínimo exclusivo, días máximo inclusivo).
+# Mismos umbrales que la función SQL nivel_inventario().
+NIVELES_INVENTARIO = {
+    'NUEVO': (None, 30),
+    'MEDIO': (30, 90),
+    'ALTO': (90, 180),
+    'CRITICO': (180, None),
+}
 
 
-def ventas_por_mes_marca(anio):
+def agregados_por_anio(anios):
     """
-    Consulta la vista vw_ventas_mes_marca para obtener reporte PIVOT
-    
+    Agregados parciales de ventas por año, mes y marca tomados de
+    resumen_ventas_mes_marca.
+
+    Cada año se guarda en caché por separado. La llave de un año cerrado
+    lleva version_anios_cerrados (refresco_reportes), que solo cambia cuando
+    un refresco recalcula meses de años anteriores, así que se conserva sin
+    expiración; la del año en curso lleva version_resumen (cambia en cada
+    refresco que recalcula algún mes) y expira tras
+    REPORTES_ANIO_ACTUAL_CACHE_TIMEOUT. Con la caché caliente
+    basta una consulta a refresco_reportes (una fila) y los años faltantes
+    se leen juntos en una consulta por la llave primaria.
+
+    Los años cerrados son los anteriores a refresco_reportes.anio_en_curso,
+    el mismo año con el que el refresco decide si incrementar
+    version_anios_cerrados; la fecha local de la aplicación no interviene.
+    Antes del primer refresco ningún año se considera cerrado.
+
+    Args:
+        anios: Años a leer
+
     Returns:
-        list: Lista de diccionarios con ventas por mes y marca
+        dict: {anio: [(mes, marca_id, total_ventas, cantidad_ventas,
+            cantidad_vehiculos), ...]} para cada año pedido (lista vacía si
+            no tuvo ventas)
     """
+    anios = sorted({int(anio) for anio in anios})
+    if not anios:
+        return {}
     with connection.cursor() as cursor:
         cursor.execute("""
-            SELECT * FROM vw_ventas_mes_marca
-            WHERE anio = %s
-            ORDER BY mes
-        """, [anio])
-        
-        columns = [col[0] for col in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            SELECT version_resumen, version_anios_cerrados, anio_en_curso
+            FROM refresco_reportes
+            WHERE nombre = 'ventas_mes_marca'
+        """)
+        version_resumen, version_cerrados, anio_actual = cursor.fetchone() or (0, 0, None)
+    if anio_actual is None:
+        anio_actual = anios[0]
+
+    claves = {
+        anio: (f'reportes:anio:{anio}:c{version_cerrados}' if anio < anio_actual
+               else f'reportes:anio:{anio}:a{version_resumen}')
+        for anio in anios
+    }
+    en_cache = cache.get_many(claves.values())
+    resultado = {anio: en_cache[clave] for anio, clave in claves.items() if clave in en_cache}
+
+    faltantes = [anio for anio in anios if anio not in resultado]
+    if faltantes:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT anio, mes, marca_id, total_ventas, cantidad_ventas, cantidad_vehiculos
+                FROM resumen_ventas_mes_marca
+                WHERE anio = ANY(%s)
+                ORDER BY anio, mes, marca_id
+            """, [faltantes])
+            leidos = {anio: [] for anio in faltantes}
+            for anio, *agregado in cursor.fetchall():
+                leidos[anio].append(tuple(agregado))
+
+        cerrados = {claves[anio]: filas for anio, filas in leidos.items() if anio < anio_actual}
+        abiertos = {claves[anio]: filas for anio, filas in leidos.items() if anio >= anio_actual}
+        if cerrados:
+            cache.set_many(cerrados, None)
+        if abiertos:
+            cache.set_many(abiertos, getattr(settings, 'REPORTES_ANIO_ACTUAL_CACHE_TIMEOUT', 300))
+        resultado.update(leidos)
+
+    return resultado
 
 
-def top5_marcas(anio):
+def pivot_ventas_mes_marca(anio=None, ultimos_meses=12):
     """
-    Consulta la vista vw_top_marcas_anio para obtener ranking con RANK()
-    Filtra solo el top 5 (posicion_rank <= 5)
-    
+    PIVOT de ventas por mes (filas) y marca (columnas) con una columna por
+    marca vendida, sin lista fija de marcas en SQL.
+
+    Arma la matriz en Python con los agregados por año
+    (``agregados_por_anio``); los nombres de marca salen de la caché de
+    catálogos. Tiene la misma antigüedad que mv_ventas_mes_marca (ver
+    ``estado_reportes_materializados``).
+
+    Args:
+        anio: Año a mostrar; None para los últimos ``ultimos_meses`` meses con ventas
+
+    Returns:
+        MatrizPivot: filas = primer día de cada mes (date), columnas = nombre
+            de marca de mayor a menor total, medidas 'total' y 'cantidad'
+            (vehículos vendidos)
+    """
+    if anio:
+        anios = [int(anio)]
+    else:
+        recientes = anios_con_ventas()
+        anios = recientes[:ultimos_meses // 12 + 1]
+
+    agregados = agregados_por_anio(anios)
+    nombres_marca = catalogos.nombres(
+        'marca', incluir={fila[1] for filas in agregados.values() for fila in filas}
+    )
+    registros = [
+        (date(anio_fila, mes, 1), nombres_marca.get(marca_id, f'Marca {marca_id}'), total, vehiculos)
+        for anio_fila, filas in agregados.items()
+        for mes, marca_id, total, _ventas, vehiculos in filas
+    ]
+    if not anio:
+        meses = sorted({registro[0] for registro in registros})[-ultimos_meses:]
+        return MatrizPivot.desde_largo(registros, medidas=('total', 'cantidad'), filas=meses)
+    return MatrizPivot.desde_largo(registros, medidas=('total', 'cantidad'))
+
+
+def top_marcas_anio(anio, limite=5):
+    """
+    Ranking de marcas del año por total de ventas con la semántica de RANK()
+    de mv_top_marcas_anio (los empates comparten posición), calculado con
+    los agregados por año en caché.
+
+    Returns:
+        list: dicts con posicion, marca, total_ventas, cantidad_ventas,
+            cantidad_vehiculos, promedio_venta y porcentaje_del_anio de las
+            marcas con posicion <= ``limite``
+    """
+    anio = int(anio)
+    agregados = agregados_por_anio([anio])[anio]
+    nombres_marca = catalogos.nombres('marca', incluir={fila[1] for fila in agregados})
+    por_marca = {}
+    for _mes, marca_id, total, ventas, vehiculos in agregados:
+        marca = nombres_marca.get(marca_id, f'Marca {marca_id}')
+        acumulado = por_marca.setdefault(marca, [CERO, 0, 0])
+        acumulado[0] += total
+        acumulado[1] += ventas
+        acumulado[2] += vehiculos
+
+    total_anio = sum((valores[0] for valores in por_marca.values()), CERO)
+    ordenadas = sorted(por_marca.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+
+    ranking = []
+    for i, (marca, (total, ventas, vehiculos)) in enumerate(ordenadas):
+        posicion = ranking[-1]['posicion'] if ranking and ranking[-1]['total_ventas'] == total else i + 1
+        if posicion > limite:
+            break
+        ranking.append({
+            'anio': anio,
+            'posicion': posicion,
+            'marca': marca,
+            'total_ventas': total,
+            'cantidad_ventas': ventas,
+            'cantidad_vehiculos': vehiculos,
+            'promedio_venta': total / vehiculos if vehiculos else None,
+            'porcentaje_del_anio': round(total * 100 / total_anio, 2) if total_anio else None,
+        })
+    return ranking
+
+
+def _variacion(actual, anterior):
+    """Variación porcentual de ``anterior`` a ``actual``; None sin base de comparación"""
+    if not anterior:
+        return None
+    return round((actual - anterior) * 100 / anterior, 2)
+
+
+def tendencia_ventas(anio_final=None, anios=5, hoy=None):
+    """
+    Tendencia multianual y comparación contra el año anterior (YoY).
+
+    Todo sale de ``agregados_por_anio``: con la caché caliente solo se leen
+    refresco_reportes y, si cambió, el año en curso; los años cerrados no
+    vuelven a consultarse.
+
+    Args:
+        anio_final: Último año de la serie; None para el más reciente con ventas
+        anios: Número de años de la serie
+        hoy: Fecha de referencia del acumulado del año
+
+    Returns:
+        dict con:
+            anios: años de la serie en orden ascendente
+            por_anio: dicts anio, total, cantidad_ventas, cantidad_vehiculos,
+                variacion (% contra el año anterior; None sin base)
+            marcas: MatrizPivot años × marcas (medidas 'total' y 'cantidad')
+            meses: dicts mes (date del último año), valores (total por año)
+                y variacion (último año contra el anterior)
+            acumulado: comparación enero..mes actual del año en curso contra
+                los mismos meses del año anterior (None si la serie no llega
+                al año en curso)
+    """
+    hoy = hoy or timezone.localdate()
+    if anio_final is None:
+        anio_final = (anios_con_ventas() or [hoy.year])[0]
+    anio_final = int(anio_final)
+    serie = list(range(anio_final - anios + 1, anio_final + 1))
+    # El año previo al primero solo sirve de base para la primera variación
+    agregados = agregados_por_anio([serie[0] - 1] + serie)
+
+    nombres_marca = catalogos.nombres(
+        'marca', incluir={fila[1] for filas in agregados.values() for fila in filas}
+    )
+    totales = {}
+    por_mes = {}
+    registros = []
+    for anio, filas in agregados.items():
+        suma = totales.setdefault(anio, [CERO, 0, 0])
+        for mes, marca_id, total, ventas, vehiculos in filas:
+            suma[0] += total
+            suma[1] += ventas
+            suma[2] += vehiculos
+            por_mes[anio, mes] = por_mes.get((anio, mes), CERO) + total
+            if anio in serie:
+                registros.append((anio, nombres_marca.get(marca_id, f'Marca {marca_id}'), total, vehiculos))
+
+    por_anio = [
+        {
+            'anio': anio,
+            'total': totales[anio][0],
+            'cantidad_ventas': totales[anio][1],
+            'cantidad_vehiculos': totales[anio][2],
+            'variacion': _variacion(totales[anio][0], totales[anio - 1][0]),
+        }
+        for anio in serie
+    ]
+
+    meses = []
+    for mes in range(1, 13):
+        valores = [por_mes.get((anio, mes), CERO) for anio in serie]
+        meses.append({
+            'mes': date(anio_final, mes, 1),
+            'valores': valores,
+            'variacion': _variacion(valores[-1], por_mes.get((anio_final - 1, mes), CERO)),
+        })
+
+    acumulado = None
+    if anio_final == hoy.year:
+        actual = sum((por_mes.get((anio_final, mes), CERO) for mes in range(1, hoy.month + 1)), CERO)
+        anterior = sum((por_mes.get((anio_final - 1, mes), CERO) for mes in range(1, hoy.month + 1)), CERO)
+        acumulado = {
+            'hasta': date(anio_final, hoy.month, 1),
+            'actual': actual,
+            'anterior': anterior,
+            'variacion': _variacion(actual, anterior),
+        }
+
+    return {
+        'anios': serie,
+        'por_anio': por_anio,
+        'marcas': MatrizPivot.desde_largo(registros, medidas=('total', 'cantidad'), filas=serie),
+        'meses': meses,
+        'acumulado': acumulado,
+    }
+
+
+def estado_reportes_materializados():
+    """
+    Antigüedad de mv_ventas_mes_marca / mv_top_marcas_anio: fecha del último
+    refresco y cambios de ventas registrados en aud_ventas desde entonces.
+
     Returns:
-        list: Lista de diccionarios con top 5 marcas más vendidas
+        dict: fecha_refresco, ultimo_aud_id, cambios_pendientes y
+            desactualizado (True si hay cambios sin incluir)
     """
     with connection.cursor() as cursor:
         cursor.execute("""
-            SELECT anio, marca, total_ventas, cantidad_ventas, 
-                   cantidad_vehiculos, promedio_venta,
-                   posicion_rank as posicion, porcentaje_del_anio
-            FROM vw_top_marcas_anio
-            WHERE anio = %s AND posicion_rank <= 5
-            ORDER BY posicion_rank
-        """, [anio])
-        
-        columns = [col[0] for col in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            SELECT r.fecha_refresco, r.ultimo_aud_id,
+                   (SELECT COUNT(*) FROM aud_ventas a
+                    WHERE a.xid_transaccion >= pg_snapshot_xmin(r.snapshot_refresco)
+                      AND NOT pg_visible_in_snapshot(a.xid_transaccion, r.snapshot_refresco))
+            FROM refresco_reportes r
+            WHERE r.nombre = 'ventas_mes_marca'
+        """)
+        fila = cursor.fetchone()
+    if fila is None:
+        return {'fecha_refresco': None, 'ultimo_aud_id': None,
+                'cambios_pendientes': None, 'desactualizado': True}
+    fecha_refresco, ultimo_aud_id, pendientes = fila
+    return {
+        'fecha_refresco': fecha_refresco,
+        'ultimo_aud_id': ultimo_aud_id,
+        'cambios_pendientes': pendientes,
+        'desactualizado': fecha_refresco is None or pendientes > 0,
+    }
+
+
+def refrescar_reportes_materializados(completo=False):
+    """
+    Recalcula resumen_ventas_mes_marca para los meses con cambios desde el
+    último refresco (función SQL refrescar_resumen_ventas) y, si hubo
+    alguno, refresca mv_ventas_mes_marca y mv_top_marcas_anio con
+    REFRESH MATERIALIZED VIEW CONCURRENTLY (las lecturas no se bloquean).
+
+    Todo va en una transacción: si falla el REFRESH tampoco se guardan el
+    resumen ni el snapshot, y el siguiente refresco vuelve a encontrar esos
+    meses pendientes en lugar de dejar las vistas atrasadas sin marcarlas
+    como desactualizadas.
+
+    Args:
+        completo: True para recalcular todos los meses
+
+    Returns:
+        dict: meses_recalculados y ultimo_aud_id
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT * FROM refrescar_resumen_ventas(%s)", [completo])
+        meses, ultimo_aud_id = cursor.fetchone()
+        if meses or completo:
+            for vista in VISTAS_MATERIALIZADAS:
+                cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {vista}")
+
+    return {'meses_recalculados': meses, 'ultimo_aud_id': ultimo_aud_id}
+
+
+def anios_con_ventas():
+    """
+    Años entre la primera y la última venta, del más reciente al más antiguo,
+    para los selectores de año de los reportes. Lee solo los extremos de
+    idx_venta_fecha en lugar de recorrer venta con DISTINCT EXTRACT(YEAR ...).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT MIN(fecha_venta), MAX(fecha_venta) FROM venta")
+        primera, ultima = cursor.fetchone()
+    if primera is None:
+        return []
+    return list(range(ultima.year, primera.year - 1, -1))
 
 
 def obtener_disponibilidad_por_marca_tipo(fecha_desde=None, fecha_hasta=None, marca=None, tipo=None):
     """
     Obtiene la disponibilidad de vehículos agrupada por marca y tipo
     usando SQL directo para mejor rendimiento con filtros opcionales
+
+    Agrupa por marca_id / tipo_vehiculo_id sin JOIN a los catálogos; los
+    nombres (y los filtros por nombre) se resuelven con la caché de catálogos,
+    que se relee si le falta alguno.
     """
     # Construir query con filtros
     base_query = """
-        SELECT m.nombre as marca, tv.nombre as tipo_vehiculo,
+        SELECT v.marca_id, v.tipo_vehiculo_id,
                COUNT(*) as cantidad_disponible,
                AVG(v.precio) as precio_promedio
         FROM vehiculo v
-        JOIN marca m ON v.marca_id = m.id
-        JOIN tipo_vehiculo tv ON v.tipo_vehiculo_id = tv.id
         WHERE v.estado_disponibilidad = 'DISPONIBLE'
     """
     
-    conditions = []
-    params = []
-    
-    if fecha_desde:
-        conditions.append("v.fecha_ingreso >= %s")
-        params.append(fecha_desde)
-    
-    if fecha_hasta:
-        conditions.append("v.fecha_ingreso <= %s")
-        params.append(fecha_hasta)
+    conditions, params = Periodo.rango(fecha_desde, fecha_hasta).condiciones('v.fecha_ingreso')
     
     if marca:
-        conditions.append("m.nombre = %s")
-        params.append(marca)
+        marca_id = catalogos.ids('marca', incluir=(marca,)).get(marca)
+        if marca_id is None:
+            return []
+        conditions.append("v.marca_id = %s")
+        params.append(marca_id)
     
     if tipo:
-        conditions.append("tv.nombre = %s")
-        params.append(tipo)
+        tipo_id = catalogos.ids('tipo_vehiculo', incluir=(tipo,)).get(tipo)
+        if tipo_id is None:
+            return []
+        conditions.append("v.tipo_vehiculo_id = %s")
+        params.append(tipo_id)
     
     if conditions:
         base_query += " AND " + " AND ".join(conditions)
     
     base_query += """
-        GROUP BY m.nombre, tv.nombre
-        ORDER BY m.nombre, tv.nombre
+        GROUP BY v.marca_id, v.tipo_vehiculo_id
     """
     
     with connection.cursor() as cursor:
         cursor.execute(base_query, params)
-        
+        filas = cursor.fetchall()
+
+    nombres_marca = catalogos.nombres('marca', incluir={fila[0] for fila in filas})
+    nombres_tipo = catalogos.nombres('tipo_vehiculo', incluir={fila[1] for fila in filas})
+    results = [
+        {
+            'marca': nombres_marca.get(marca_id, ''),
+            'tipo_vehiculo': nombres_tipo.get(tipo_id, ''),
+            'cantidad_disponible': cantidad,
+            'precio_promedio': precio_promedio,
+        }
+        for marca_id, tipo_id, cantidad, precio_promedio in filas
+    ]
+    
+    results.sort(key=lambda fila: (fila['marca'], fila['tipo_vehiculo']))
+    return results
+
+
+def analisis_inventario(estado=None, nivel=None, despues=None, hacia_atras=False, limite=50):
+    """
+    Página del análisis de inventario (mismas columnas que
+    vw_inventario_analisis), de los vehículos con más días en inventario a
+    los más recientes.
+
+    A diferencia de consultar la vista con WHERE/LIMIT, los filtros se
+    aplican directamente sobre vehiculo (el nivel se traduce a un rango de
+    fecha_ingreso) y la página se corta con el cursor y el LIMIT usando
+    idx_vehiculo_ingreso / idx_vehiculo_estado_ingreso. El precio promedio
+    por marca sale de kpi_contador (entidad vehiculo_marca, mantenida por
+    triggers), así que el costo no depende del tamaño del inventario. Un
+    vehículo cuya marca aún no tenga contador se lista igual, sin promedio.
+
+    Args:
+        estado: estado_disponibilidad o None
+        nivel: clave de NIVELES_INVENTARIO o None
+        despues: [fecha_ingreso, vehiculo_id] de la última fila vista, o None
+        hacia_atras: True para leer las filas anteriores al cursor (en orden inverso)
+        limite: número máximo de filas
+
+    Returns:
+        list: Lista de diccionarios ordenada por (fecha_ingreso, vehiculo_id)
+    """
+    conditions = []
+    params = []
+
+    if estado:
+        conditions.append("v.estado_disponibilidad = %s")
+        params.append(estado)
+
+    if nivel:
+        if nivel not in NIVELES_INVENTARIO:
+            return []
+        minimo, maximo = NIVELES_INVENTARIO[nivel]
+        if minimo is not None:
+            conditions.append("v.fecha_ingreso < CURRENT_DATE - %s")
+            params.append(minimo)
+        if maximo is not None:
+            conditions.append("v.fecha_ingreso >= CURRENT_DATE - %s")
+            params.append(maximo)
+
+    if despues:
+        try:
+            fecha_ingreso, vehiculo_id = date.fromisoformat(str(despues[0])), int(despues[1])
+        except (TypeError, ValueError, IndexError):
+            fecha_ingreso = None
+        if fecha_ingreso is not None:
+            comparacion = '<' if hacia_atras else '>'
+            conditions.append(f"(v.fecha_ingreso, v.id) {comparacion} (%s, %s)")
+            params.extend([fecha_ingreso, vehiculo_id])
+
+    direccion = 'DESC' if hacia_atras else 'ASC'
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    params.append(limite)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH pagina AS (
+                SELECT v.id, v.marca_id, v.modelo, v.anio, v.precio, v.color,
+                       v.tipo_vehiculo_id, v.estado_disponibilidad, v.fecha_ingreso
+                FROM vehiculo v
+                {where}
+                ORDER BY v.fecha_ingreso {direccion}, v.id {direccion}
+                LIMIT %s
+            )
+            SELECT p.id AS vehiculo_id, p.marca_id, p.modelo, p.anio, p.precio, p.color,
+                   p.tipo_vehiculo_id, p.estado_disponibilidad, p.fecha_ingreso,
+                   CURRENT_DATE - p.fecha_ingreso AS dias_en_inventario,
+                   nivel_inventario(CURRENT_DATE - p.fecha_ingreso) AS nivel_inventario,
+                   k.monto / NULLIF(k.cantidad, 0) AS precio_promedio_marca,
+                   p.precio - k.monto / NULLIF(k.cantidad, 0) AS diferencia_promedio
+            FROM pagina p
+            LEFT JOIN kpi_contador k
+              ON k.entidad = 'vehiculo_marca' AND k.clave = p.marca_id::VARCHAR
+            ORDER BY p.fecha_ingreso {direccion}, p.id {direccion}
+        """, params)
+
         columns = [col[0] for col in cursor.description]
-        results = []
-        for row in cursor.fetchall():
-            results.append(dict(zip(columns, row)))
-        
-        return results
+        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    nombres_marca = catalogos.nombres('marca', incluir={fila['marca_id'] for fila in results})
+    nombres_tipo = catalogos.nombres('tipo_vehiculo', incluir={fila['tipo_vehiculo_id'] for fila in results})
+    for fila in results:
+        fila['marca'] = nombres_marca.get(fila.pop('marca_id'), '')
+        fila['tipo_vehiculo'] = nombres_tipo.get(fila.pop('tipo_vehiculo_id'), '')
+    return results
 
 
 def historial_cliente(cliente_id):
@@ -1,7 +1,9 @@
 """
 Servicio de Ventas - Usa SQL directo para llamar funciones PostgreSQL
 """
-from django.db import connection, DatabaseError
+from django.db import connection, transaction, DatabaseError
+
+from .kpis import invalidar_ranking_vendedores
 
 
 def registrar_venta_service(cliente_id, empleado_id, metodo_pago_id, vehiculo_id, 
@@ -22,12 +24,56 @@ def registrar_venta_service(cliente_id, empleado_id, metodo_pago_id, vehiculo_id
                  precio, cantidad, descuento_temporada, cliente_frecuente]
             )
             result = cursor.fetchone()
-            return result[0] if result else None
+        transaction.on_commit(invalidar_ranking_vendedores)
+        return result[0] if result else None
     except DatabaseError as e:
         # La BD ya registró el error en aud_errores
         raise DatabaseError(f"Error al registrar venta: {str(e)}")
 
 
+def registrar_venta_lote_service(cliente_id, empleado_id, metodo_pago_id, vehiculos,
+                                 descuento_temporada=False, cliente_frecuente=False,
+                                 permitir_parcial=False):
+    """
+    Registra varios vehículos para un cliente en una sola venta llamando a la
+    función SQL registrar_venta_lote() (un viaje a la BD y una transacción).
+
+    Args:
+        vehiculos: Lista de tuplas (vehiculo_id, precio)
+        permitir_parcial: True registra los vehículos válidos aunque otros
+            fallen; False (por defecto) no registra nada si alguno falla
+
+    Returns:
+        dict: venta_id (None si no se registró nada), resultados (una fila
+            por vehículo con vehiculo_id, venta_id y error), registrados y
+            errores (subconjuntos de resultados)
+    Raises:
+        DatabaseError: Si hay error en la transacción
+    """
+    vehiculo_ids = [vehiculo_id for vehiculo_id, _ in vehiculos]
+    precios = [precio for _, precio in vehiculos]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT * FROM registrar_venta_lote(%s, %s, %s, %s::BIGINT[], %s::NUMERIC[], %s, %s, %s)",
+                [cliente_id, empleado_id, metodo_pago_id, vehiculo_ids, precios,
+                 descuento_temporada, cliente_frecuente, permitir_parcial]
+            )
+            columns = [col[0] for col in cursor.description]
+            resultados = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        transaction.on_commit(invalidar_ranking_vendedores)
+    except DatabaseError as e:
+        raise DatabaseError(f"Error al registrar venta por lote: {str(e)}")
+
+    registrados = [r for r in resultados if r['venta_id'] is not None]
+    return {
+        'venta_id': registrados[0]['venta_id'] if registrados else None,
+        'resultados': resultados,
+        'registrados': registrados,
+        'errores': [r for r in resultados if r['error']],
+    }
+
+
 def cancelar_venta_service(venta_id):
     """
     Cancela una venta existente llamando a la función SQL cancelar_venta()
@@ -41,12 +87,39 @@ def cancelar_venta_service(venta_id):
         with connection.cursor() as cursor:
             cursor.execute("SELECT cancelar_venta(%s)", [venta_id])
             result = cursor.fetchone()
-            return result[0] if result else False
+        transaction.on_commit(invalidar_ranking_vendedores)
+        return result[0] if result else False
     except DatabaseError as e:
         # La BD ya registró el error en aud_errores
         raise DatabaseError(f"Error al cancelar venta: {str(e)}")
 
 
+def cancelar_ventas_lote_service(venta_ids):
+    """
+    Cancela varias ventas en una sola llamada a la función SQL
+    cancelar_ventas_lote() (sentencias basadas en conjuntos, una transacción)
+
+    Args:
+        venta_ids: Lista de IDs de venta
+
+    Returns:
+        list: Una fila por ID con venta_id, cancelada, vehiculos_liberados y error
+    Raises:
+        DatabaseError: Si hay error en la transacción
+    """
+    if not venta_ids:
+        return []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM cancelar_ventas_lote(%s::BIGINT[])", [list(venta_ids)])
+            columns = [col[0] for col in cursor.description]
+            resultados = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        transaction.on_commit(invalidar_ranking_vendedores)
+        return resultados
+    except DatabaseError as e:
+        raise DatabaseError(f"Error al cancelar ventas por lote: {str(e)}")
+
+
 def obtener_ventas_por_cliente(cliente_id):
     """
     Obtiene el historial de ventas de un cliente
@@ -0,0 +1,50 @@
+"""
+Señales para mantener coherentes las cachés de proceso (roles y catálogos).
+"""
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .catalogos import invalidar_catalogos
+from .models import Marca, TipoVehiculo, MetodoPago, TipoDocumento
+from .roles import invalidar_roles
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def roles_membresia_cambiada(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalida los roles cuando se agregan o quitan usuarios de un grupo"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        # user.groups.add(...) / remove / clear
+        invalidar_roles(instance.pk)
+    elif pk_set:
+        # group.user_set.add(...) / remove
+        for user_id in pk_set:
+            invalidar_roles(user_id)
+    else:
+        # group.user_set.clear(): no se conocen los usuarios afectados
+        invalidar_roles()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def roles_usuario_cambiado(sender, instance, **kwargs):
+    invalidar_roles(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def roles_grupo_cambiado(sender, instance, **kwargs):
+    """Un grupo renombrado o eliminado afecta a todos sus usuarios"""
+    invalidar_roles()
+
+
+@receiver([post_save, post_delete], sender=Marca)
+@receiver([post_save, post_delete], sender=TipoVehiculo)
+@receiver([post_save, post_delete], sender=MetodoPago)
+@receiver([post_save, post_delete], sender=TipoDocumento)
+def catalogo_cambiado(sender, **kwargs):
+    """Cualquier alta, cambio o baja en un catálogo invalida la caché de catálogos"""
+    invalidar_catalogos()
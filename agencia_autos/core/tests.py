@@ -1,3 +1,714 @@
-from django.test import TestCase
+"""
+Presupuestos de consultas por vista.
 
-# Create your tests here.
+Cada prueba pide una vista con el cliente de pruebas y falla si ejecuta más
+consultas SQL que su presupuesto declarado en ``PRESUPUESTOS``. Así una
+regresión N+1 (por ejemplo, leer la clasificación de cada cliente con una
+consulta por fila en el listado del admin) se detecta antes de llegar a
+producción.
+
+Los modelos de ``core`` no son administrados por Django, por lo que la BD de
+pruebas se prepara ejecutando ``db/01-ddl.sql`` a ``db/05-views.sql`` antes
+de la primera clase que la usa. Requiere PostgreSQL y un usuario con permiso
+para crear la BD de pruebas (las pruebas puras, como ``MatrizPivotTests``,
+no la necesitan):
+
+    python manage.py test core
+
+El conteo incluye las consultas de sesión y usuario que hace el middleware
+de autenticación. Cada URL se pide una vez antes de medir para que las
+cachés (roles, catálogos) estén calientes, como en producción.
+"""
+import re
+from datetime import date
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+
+from config import urls as urls_proyecto
+
+from . import catalogos, paralelo, views_async
+from .models import Cliente, Vehiculo, Venta
+from .paginacion import PARAM_DESPUES, KeysetPaginator, codificar_cursor
+from .periodos import Periodo
+from .pivot import MatrizPivot
+from .services import reportes
+from .services.cache_reportes import version_datos
+from .services.ventas import cancelar_venta_service
+from .services.reportes import (
+    agregados_por_anio, estado_reportes_materializados, obtener_disponibilidad_por_marca_tipo,
+    refrescar_reportes_materializados, top_marcas_anio,
+)
+
+
+SCRIPTS_BD = [
+    '01-ddl.sql',
+    '02-audit.sql',
+    '03-triggers.sql',
+    '04-functions.sql',
+    '05-views.sql',
+]
+
+# URLconf de VistasAsincronasTests: las vistas de core.views_async en lugar
+# de las síncronas (como con VISTAS_ASINCRONAS=True), el resto igual
+urlpatterns = [
+    path('', views_async.home, name='home'),
+    path('dashboard/', views_async.dashboard, name='dashboard'),
+    path('reportes/ventas-mes-marca/', views_async.reporte_ventas_mes_marca, name='reportes_ventas_mes_marca'),
+    path('reportes/top5-marcas/', views_async.reporte_top5_marcas, name='reportes_top5_marcas'),
+    path('reportes/tendencias/', views_async.reporte_tendencias, name='reportes_tendencias'),
+] + urls_proyecto.urlpatterns
+
+# Nombre de la URL -> máximo de consultas por request
+PRESUPUESTOS = {
+    'vehiculo_lista': 5,
+    'admin:core_cliente_changelist': 6,
+    'venta_detalle': 3,
+    'dashboard': 5,
+    'dashboard_admin': 6,
+    'admin_inventario_analisis': 3,
+    'reportes_ventas_mes_marca': 5,
+    'reportes_tendencias': 5,
+}
+
+TAMANO_PAGINA_VEHICULOS = 20
+VEHICULOS = 45
+CLIENTES = 30
+VENTAS = 25
+
+
+def crear_esquema():
+    """Crea (o recrea: los scripts borran antes de crear) tablas, triggers, funciones y vistas"""
+    directorio = settings.BASE_DIR.parent / 'db'
+    with connection.cursor() as cursor:
+        for script in SCRIPTS_BD:
+            cursor.execute((directorio / script).read_text(encoding='utf-8'))
+
+
+_esquema_creado = False
+
+
+class DatosPrueba:
+    """
+    Marcas, vehículos, clientes, ventas y usuarios de prueba.
+
+    El esquema se crea antes de la primera clase que usa la BD (fuera de la
+    transacción de la clase, para que no se deshaga al terminarla); las
+    pruebas sin BD (``SimpleTestCase``) no lo necesitan.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        global _esquema_creado
+        if not _esquema_creado:
+            crear_esquema()
+            _esquema_creado = True
+        super().setUpClass()
+
+    @classmethod
+    def crear_datos(cls):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO marca (nombre) SELECT 'Marca ' || n FROM generate_series(1, 3) n;
+                INSERT INTO tipo_vehiculo (nombre) VALUES ('Sedán'), ('SUV');
+                INSERT INTO metodo_pago (nombre) VALUES ('Efectivo'), ('Tarjeta');
+                INSERT INTO tipo_documento (nombre) VALUES ('DNI'), ('Pasaporte');
+                INSERT INTO empleado (nombre_completo, puesto, usuario, contrasena)
+                VALUES ('Vendedor de Prueba', 'Vendedor', 'vendedor', 'x');
+            """)
+            cursor.execute("""
+                INSERT INTO cliente (nombre_completo, email, tipo_documento_id, numero_documento)
+                SELECT 'Cliente ' || n, 'cliente' || n || '@prueba.com',
+                       (SELECT MIN(id) FROM tipo_documento), LPAD(n::TEXT, 8, '0')
+                FROM generate_series(1, %s) n
+            """, [CLIENTES])
+            cursor.execute("""
+                INSERT INTO vehiculo (marca_id, modelo, anio, precio, color, tipo_vehiculo_id, vin)
+                SELECT (SELECT MIN(id) FROM marca) + n %% 3, 'Modelo ' || n, 2020 + n %% 5,
+                       20000 + n * 100, 'Blanco', (SELECT MIN(id) FROM tipo_vehiculo) + n %% 2,
+                       'VIN' || LPAD(n::TEXT, 14, '0')
+                FROM generate_series(1, %s) n
+            """, [VEHICULOS])
+            # Ventas con las funciones del esquema para que los triggers llenen
+            # kpi_contador, kpi_ventas_mes y cliente_metricas
+            cursor.execute("""
+                SELECT registrar_venta(c.id, e.id, m.id, v.id, v.precio)
+                FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS n FROM cliente) c
+                JOIN (SELECT id, precio, ROW_NUMBER() OVER (ORDER BY id) AS n FROM vehiculo) v
+                  ON v.n = c.n
+                CROSS JOIN (SELECT MIN(id) AS id FROM empleado) e
+                CROSS JOIN (SELECT MIN(id) AS id FROM metodo_pago) m
+                WHERE c.n <= %s
+                ORDER BY c.n
+            """, [VENTAS])
+
+        # Venta de flotilla: varias líneas de detalle en una sola venta
+        cliente = Cliente.objects.order_by('-id').first()
+        disponibles = list(
+            Vehiculo.objects.filter(estado_disponibilidad='DISPONIBLE')
+            .order_by('id').values_list('id', 'precio')[:3]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT DISTINCT venta_id FROM registrar_venta_lote(
+                    %s, (SELECT MIN(id) FROM empleado), (SELECT MIN(id) FROM metodo_pago),
+                    %s::BIGINT[], %s::DECIMAL(10,2)[]
+                )
+                """,
+                [cliente.id, [v[0] for v in disponibles], [v[1] for v in disponibles]]
+            )
+            cls.venta_flotilla_id = cursor.fetchone()[0]
+
+        administradores = Group.objects.create(name='Administrador')
+        cls.admin = User.objects.create_superuser('admin', 'admin@prueba.com', 'clave')
+        cls.admin.groups.add(administradores)
+
+        # Usuario del empleado 'vendedor' (Empleado.usuario = username)
+        vendedores = Group.objects.create(name='Vendedor')
+        cls.vendedor = User.objects.create_user('vendedor', 'vendedor@prueba.com', 'clave')
+        cls.vendedor.groups.add(vendedores)
+
+
+class PresupuestoConsultasTestCase(DatosPrueba, TestCase):
+    """Datos de prueba y aserción de presupuesto compartidos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def assertPresupuesto(self, nombre, url):
+        """
+        Pide la URL dos veces (la primera calienta las cachés) y falla si la
+        segunda ejecuta más consultas que el presupuesto de ``nombre``.
+
+        Returns:
+            int: número de consultas de la petición medida
+        """
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+
+        presupuesto = PRESUPUESTOS[nombre]
+        if len(capturadas) > presupuesto:
+            detalle = '\n'.join(
+                f"{i}. {consulta['sql']}" for i, consulta in enumerate(capturadas, start=1)
+            )
+            self.fail(
+                f'{url} ejecutó {len(capturadas)} consultas; '
+                f'presupuesto de {nombre}: {presupuesto}\n{detalle}'
+            )
+        return len(capturadas)
+
+
+class DatosConfirmadosTestCase(DatosPrueba, TransactionTestCase):
+    """
+    Datos de prueba confirmados, para lo que deben ver otras conexiones o
+    transacciones (hilos de ``en_paralelo``, snapshots de los refrescos).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.crear_datos()
+        refrescar_reportes_materializados(completo=True)
+
+    def tearDown(self):
+        # El flush de TransactionTestCase no toca las tablas no administradas
+        crear_esquema()
+
+
+def cerrar_anio(anio):
+    """Simula que el último refresco se hizo ya en el año siguiente a ``anio``"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE refresco_reportes SET anio_en_curso = %s WHERE nombre = 'ventas_mes_marca'",
+            [anio + 1]
+        )
+
+
+class ListaVehiculosTests(PresupuestoConsultasTestCase):
+
+    def test_presupuesto(self):
+        self.assertPresupuesto('vehiculo_lista', reverse('vehiculo_lista'))
+
+    def test_no_depende_del_tamano_de_pagina(self):
+        """La página llena y la última (incompleta) cuestan lo mismo"""
+        url = reverse('vehiculo_lista')
+        ids = list(Vehiculo.objects.order_by('id').values_list('id', flat=True))
+        ultima_pagina = ids[(len(ids) - 1) // TAMANO_PAGINA_VEHICULOS * TAMANO_PAGINA_VEHICULOS - 1]
+
+        llena = self.assertPresupuesto('vehiculo_lista', url)
+        incompleta = self.assertPresupuesto(
+            'vehiculo_lista', f'{url}?{PARAM_DESPUES}={codificar_cursor([ultima_pagina])}'
+        )
+        self.assertEqual(llena, incompleta)
+
+    def test_filtros(self):
+        url = reverse('vehiculo_lista')
+        self.assertPresupuesto('vehiculo_lista', f'{url}?estado=DISPONIBLE')
+        self.assertPresupuesto('vehiculo_lista', f'{url}?estado=VENDIDO&tipo=1')
+
+
+class ClienteAdminTests(PresupuestoConsultasTestCase):
+
+    def test_presupuesto_listado(self):
+        self.assertPresupuesto(
+            'admin:core_cliente_changelist', reverse('admin:core_cliente_changelist')
+        )
+
+    def test_presupuesto_ordenado_por_clasificacion(self):
+        url = reverse('admin:core_cliente_changelist')
+        self.assertPresupuesto('admin:core_cliente_changelist', f'{url}?o=7')
+
+    def test_presupuesto_busqueda(self):
+        url = reverse('admin:core_cliente_changelist')
+        self.assertPresupuesto('admin:core_cliente_changelist', f'{url}?q=cliente')
+
+
+class ListaClientesTests(PresupuestoConsultasTestCase):
+
+    def clientes_con_compras(self):
+        respuesta = self.client.get(reverse('lista_clientes'))
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.context['clientes_con_compras']
+
+    def test_contador_igual_al_conteo_real(self):
+        real = Cliente.objects.filter(venta__isnull=False).distinct().count()
+        self.assertEqual(self.clientes_con_compras(), real)
+
+        # Cancelar no cambia el conteo (la venta sigue registrada)
+        venta = Venta.objects.exclude(id=self.venta_flotilla_id).order_by('id').first()
+        cancelar_venta_service(venta.id)
+        self.assertEqual(self.clientes_con_compras(), real)
+
+        # Pasar una venta a un cliente sin compras no cambia el total; a uno
+        # que ya tenía, deja al cliente original sin compras
+        sin_compras = Cliente.objects.filter(venta__isnull=True).order_by('id').first()
+        otra = Venta.objects.exclude(id__in=[venta.id, self.venta_flotilla_id]).order_by('id').first()
+        Venta.objects.filter(id=venta.id).update(cliente=sin_compras)
+        self.assertEqual(self.clientes_con_compras(), real)
+        Venta.objects.filter(id=venta.id).update(cliente=otra.cliente)
+        self.assertEqual(self.clientes_con_compras(), real - 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM verificar_kpis()")
+            self.assertEqual(cursor.fetchall(), [])
+
+
+class ExportacionVentasTests(PresupuestoConsultasTestCase):
+
+    def test_csv_solo_administradores(self):
+        url = reverse('venta_lista')
+        self.client.force_login(self.vendedor)
+        respuesta = self.client.get(url, {'formato': 'csv'})
+        self.assertRedirects(respuesta, reverse('dashboard'), fetch_redirect_response=False)
+
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(url, {'formato': 'csv'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'].split(';')[0], 'text/csv')
+
+
+class ListaVentasTests(PresupuestoConsultasTestCase):
+
+    def test_fecha_creacion_obligatoria(self):
+        """El cursor del listado (fecha_creacion, id) no admite ventas sin fecha_creacion"""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Venta.objects.filter(id=self.venta_flotilla_id).update(fecha_creacion=None)
+
+
+class CatalogosTests(PresupuestoConsultasTestCase):
+
+    def test_marca_creada_sin_senales(self):
+        """Una marca que la caché no conoce (otro proceso, COPY) se resuelve releyendo el catálogo"""
+        catalogos.nombres('marca')  # caché caliente sin la marca nueva
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO marca (nombre) VALUES ('Marca Nueva') RETURNING id")
+            marca_id = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO vehiculo (marca_id, modelo, anio, precio, color, tipo_vehiculo_id, vin)
+                VALUES (%s, 'Nuevo', 2024, 30000, 'Negro', (SELECT MIN(id) FROM tipo_vehiculo), 'VINNUEVO000000001')
+            """, [marca_id])
+
+        datos = obtener_disponibilidad_por_marca_tipo(marca='Marca Nueva')
+        self.assertEqual([(fila['marca'], fila['cantidad_disponible']) for fila in datos], [('Marca Nueva', 1)])
+        self.assertIn('Marca Nueva', {fila['marca'] for fila in obtener_disponibilidad_por_marca_tipo()})
+
+    def test_sin_faltantes_no_relee(self):
+        catalogos.nombres('marca')
+        with CaptureQueriesContext(connection) as consultas:
+            catalogos.nombres('marca', incluir=set(catalogos.nombres('marca')))
+        self.assertEqual(len(consultas), 0)
+
+
+class VersionDatosTests(PresupuestoConsultasTestCase):
+
+    def test_cambia_con_cada_cambio_auditado(self):
+        version = version_datos()
+        self.assertEqual(version_datos(), version)
+
+        Vehiculo.objects.filter(pk=Vehiculo.objects.order_by('id').first().pk).update(color='Rojo')
+        self.assertNotEqual(version_datos(), version)
+
+        version = version_datos()
+        cancelar_venta_service(self.venta_flotilla_id)
+        self.assertNotEqual(version_datos(), version)
+
+    def test_sentencia_sin_filas_no_cambia_la_version(self):
+        version = version_datos()
+        Vehiculo.objects.filter(pk=-1).update(color='Rojo')
+        self.assertEqual(version_datos(), version)
+
+
+class DetalleVentaTests(PresupuestoConsultasTestCase):
+
+    def test_presupuesto_venta_simple(self):
+        venta = Venta.objects.order_by('id').first()
+        self.assertPresupuesto('venta_detalle', reverse('venta_detalle', args=[venta.id]))
+
+    def test_presupuesto_venta_flotilla(self):
+        """El costo no crece con el número de líneas de detalle"""
+        self.assertPresupuesto(
+            'venta_detalle', reverse('venta_detalle', args=[self.venta_flotilla_id])
+        )
+
+
+class DashboardVendedorTests(PresupuestoConsultasTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.vendedor)
+
+    def test_presupuesto(self):
+        self.assertPresupuesto('dashboard', reverse('dashboard'))
+
+    def test_no_depende_del_numero_de_vendedores(self):
+        """El ranking se calcula en la BD: más vendedores no agregan consultas"""
+        url = reverse('dashboard')
+        pocos = self.assertPresupuesto('dashboard', url)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO empleado (nombre_completo, puesto, usuario, contrasena)
+                SELECT 'Vendedor ' || n, 'Vendedor', 'vendedor' || n, 'x'
+                FROM generate_series(1, 40) n
+            """)
+        cache.clear()
+        muchos = self.assertPresupuesto('dashboard', url)
+        self.assertEqual(pocos, muchos)
+
+
+class InventarioAnalisisTests(PresupuestoConsultasTestCase):
+
+    def test_presupuesto(self):
+        self.assertPresupuesto('admin_inventario_analisis', reverse('admin_inventario_analisis'))
+
+    def test_filtros(self):
+        url = reverse('admin_inventario_analisis')
+        self.assertPresupuesto('admin_inventario_analisis', f'{url}?estado=DISPONIBLE')
+        self.assertPresupuesto('admin_inventario_analisis', f'{url}?estado=VENDIDO&nivel=NUEVO')
+
+    def test_promedio_por_marca_igual_a_la_vista(self):
+        """Los promedios de kpi_contador coinciden con AVG() de vw_inventario_analisis"""
+        respuesta = self.client.get(reverse('admin_inventario_analisis'))
+        pagina = respuesta.context['results']
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT vehiculo_id, ROUND(precio_promedio_marca, 2) FROM vw_inventario_analisis"
+            )
+            esperado = dict(cursor.fetchall())
+        self.assertEqual(len(pagina), VEHICULOS)
+        for fila in pagina:
+            self.assertEqual(round(fila['precio_promedio_marca'], 2), esperado[fila['vehiculo_id']])
+
+    def test_marca_sin_contador(self):
+        """Sin fila en kpi_contador los vehículos de la marca se listan sin promedio"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM kpi_contador
+                WHERE entidad = 'vehiculo_marca' AND clave = (SELECT MIN(id) FROM marca)::VARCHAR
+            """)
+        respuesta = self.client.get(reverse('admin_inventario_analisis'))
+        pagina = respuesta.context['results']
+        self.assertEqual(len(pagina), VEHICULOS)
+        self.assertTrue(any(fila['precio_promedio_marca'] is None for fila in pagina))
+
+    def test_cursor_manipulado(self):
+        """Un cursor con valores que no son fecha/id devuelve la primera página"""
+        url = reverse('admin_inventario_analisis')
+        for valores in (['no-es-fecha', 1], ['2024-01-01', 'x'], [None, 1], [[1], 1]):
+            respuesta = self.client.get(url, {PARAM_DESPUES: codificar_cursor(valores)})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertFalse(respuesta.context['results'].has_previous())
+
+
+class PivotVentasTests(PresupuestoConsultasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        refrescar_reportes_materializados(completo=True)
+
+    def test_presupuesto(self):
+        anio = Venta.objects.order_by('-fecha_venta').first().fecha_venta.year
+        url = reverse('reportes_ventas_mes_marca')
+        self.assertPresupuesto('reportes_ventas_mes_marca', f'{url}?anio={anio}')
+
+    def test_una_columna_por_marca(self):
+        """Todas las marcas vendidas aparecen como columna, sin 'otras'"""
+        anio = Venta.objects.order_by('-fecha_venta').first().fecha_venta.year
+        respuesta = self.client.get(reverse('reportes_ventas_mes_marca'), {'anio': anio})
+        pivot = respuesta.context['pivot']
+        self.assertEqual(sorted(pivot.columnas), ['Marca 1', 'Marca 2', 'Marca 3'])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COALESCE(SUM(total_mes), 0) FROM vw_ventas_mes_marca WHERE anio = %s", [anio]
+            )
+            self.assertEqual(pivot.total(), cursor.fetchone()[0])
+
+
+class TendenciasTests(PresupuestoConsultasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        refrescar_reportes_materializados(completo=True)
+        self.anio = Venta.objects.order_by('-fecha_venta').first().fecha_venta.year
+
+    def test_presupuesto(self):
+        self.assertPresupuesto('reportes_tendencias', reverse('reportes_tendencias'))
+
+    def test_anio_cerrado_en_cache(self):
+        """Un año cerrado se lee una vez; después solo se consulta refresco_reportes"""
+        cerrar_anio(self.anio)
+        agregados_por_anio([self.anio])
+        with CaptureQueriesContext(connection) as consultas:
+            agregados = agregados_por_anio([self.anio])
+        self.assertEqual(len(consultas), 1)
+        self.assertTrue(agregados[self.anio])
+
+    def test_anio_fuera_de_rango(self):
+        """?anio= fuera del rango de date usa el año por defecto en lugar de fallar"""
+        for anio in ('0', '-3', '10000'):
+            respuesta = self.client.get(reverse('reportes_tendencias'), {'anio': anio})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.context['anio'], self.anio)
+
+    def test_top_marcas_igual_a_vista(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT posicion_rank, marca, total_ventas, cantidad_ventas
+                FROM mv_top_marcas_anio
+                WHERE anio = %s AND posicion_rank <= 5
+                ORDER BY posicion_rank, marca
+            """, [self.anio])
+            esperado = cursor.fetchall()
+        ranking = [
+            (fila['posicion'], fila['marca'], fila['total_ventas'], fila['cantidad_ventas'])
+            for fila in top_marcas_anio(self.anio)
+        ]
+        self.assertEqual(sorted(ranking), esperado)
+
+
+class AniosCerradosTests(DatosConfirmadosTestCase):
+    """
+    Caché de años cerrados con refrescos en transacciones separadas, como en
+    producción (dentro de un TestCase cada refresco vuelve a procesar los
+    eventos de la transacción del test).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.anio = Venta.objects.order_by('-fecha_venta').first().fecha_venta.year
+        cerrar_anio(self.anio)
+
+    def test_refresco_sin_cambios_conserva_la_llave(self):
+        agregados_por_anio([self.anio])
+        refrescar_reportes_materializados()
+        with CaptureQueriesContext(connection) as consultas:
+            agregados_por_anio([self.anio])
+        self.assertEqual(len(consultas), 1)
+
+    def test_correccion_de_anio_cerrado(self):
+        """Cancelar una venta de un año cerrado invalida su llave en el siguiente refresco"""
+        antes = agregados_por_anio([self.anio])[self.anio]
+        cancelar_venta_service(self.venta_flotilla_id)
+        refrescar_reportes_materializados()
+        despues = agregados_por_anio([self.anio])[self.anio]
+        self.assertEqual(sum(f[4] for f in antes) - sum(f[4] for f in despues), 3)
+
+
+class RefrescoReportesTests(DatosConfirmadosTestCase):
+
+    def test_refresco_fallido_no_pierde_meses(self):
+        """Si falla el REFRESH de las vistas, el siguiente refresco vuelve a recalcular los meses"""
+        cancelar_venta_service(self.venta_flotilla_id)
+        with mock.patch.object(reportes, 'VISTAS_MATERIALIZADAS', ('mv_inexistente',)):
+            with self.assertRaises(DatabaseError):
+                refrescar_reportes_materializados()
+        self.assertTrue(estado_reportes_materializados()['desactualizado'])
+
+        self.assertGreater(refrescar_reportes_materializados()['meses_recalculados'], 0)
+        self.assertFalse(estado_reportes_materializados()['desactualizado'])
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class VistasAsincronasTests(PresupuestoConsultasTestCase):
+    """
+    Las vistas asíncronas devuelven lo mismo que las síncronas con el mismo
+    presupuesto. Dentro de la transacción del test ``en_paralelo`` ejecuta
+    las consultas en el hilo del request, así que el conteo las incluye.
+    """
+
+    def setUp(self):
+        super().setUp()
+        refrescar_reportes_materializados(completo=True)
+
+    def test_dashboard_admin(self):
+        self.assertPresupuesto('dashboard_admin', reverse('dashboard'))
+        respuesta = self.client.get(reverse('dashboard'))
+        self.assertEqual(respuesta.context['ventas_mes'], VENTAS + 1)
+        self.assertEqual(len(respuesta.context['ventas_recientes']), 5)
+
+    def test_dashboard_vendedor(self):
+        self.client.force_login(self.vendedor)
+        self.assertPresupuesto('dashboard', reverse('dashboard'))
+        respuesta = self.client.get(reverse('dashboard'))
+        self.assertEqual(respuesta.context['mis_ventas_mes'], VENTAS + 1)
+        self.assertEqual(respuesta.context['mi_ranking'], 1)
+
+    def test_reportes(self):
+        self.assertPresupuesto('reportes_ventas_mes_marca', reverse('reportes_ventas_mes_marca'))
+        self.assertPresupuesto('reportes_tendencias', reverse('reportes_tendencias'))
+        respuesta = self.client.get(reverse('reportes_top5_marcas'))
+        anio = Venta.objects.order_by('-fecha_venta').first().fecha_venta.year
+        self.assertEqual(respuesta.context['anio'], anio)
+        self.assertEqual(respuesta.context['datos'], top_marcas_anio(anio))
+
+    def test_requiere_login(self):
+        self.client.logout()
+        respuesta = self.client.get(reverse('reportes_tendencias'))
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertIn(settings.LOGIN_URL, respuesta['Location'])
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class VistasAsincronasParalelasTests(DatosConfirmadosTestCase):
+    """
+    Sin la transacción de ``TestCase`` las consultas de ``en_paralelo`` corren
+    en hilos con su propia conexión. Los resultados deben ser los de las
+    vistas síncronas y la métrica de consultas (``Server-Timing``) debe
+    incluir las de los hilos.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def _pedir(self, url):
+        """Respuesta y número de consultas de la segunda petición (cachés calientes)"""
+        self.client.get(url)
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, int(re.search(r'"(\d+) consultas"', respuesta['Server-Timing']).group(1))
+
+    def test_dashboard_admin(self):
+        url = reverse('dashboard')
+        with mock.patch('core.paralelo._en_hilo', wraps=paralelo._en_hilo) as en_hilo:
+            respuesta, consultas = self._pedir(url)
+        self.assertEqual(en_hilo.call_count, 8)  # 4 lecturas por petición
+        self.assertEqual(respuesta.context['ventas_mes'], VENTAS + 1)
+
+        with override_settings(ROOT_URLCONF=urls_proyecto):
+            sincrona, consultas_sincrona = self._pedir(url)
+        self.assertEqual(consultas, consultas_sincrona)
+        self.assertLessEqual(consultas, PRESUPUESTOS['dashboard_admin'])
+        for clave in ('vehiculos_disponibles', 'ventas_mes', 'ingresos_mes', 'empleados_activos', 'alertas'):
+            self.assertEqual(respuesta.context[clave], sincrona.context[clave])
+        self.assertEqual(
+            [v.id for v in respuesta.context['ventas_recientes']],
+            [v.id for v in sincrona.context['ventas_recientes']],
+        )
+
+    def test_top5_marcas(self):
+        with mock.patch('core.paralelo._en_hilo', wraps=paralelo._en_hilo) as en_hilo:
+            respuesta, consultas = self._pedir(reverse('reportes_top5_marcas'))
+        self.assertTrue(en_hilo.called)
+        anio = Venta.objects.order_by('-fecha_venta').first().fecha_venta.year
+        self.assertEqual(respuesta.context['datos'], top_marcas_anio(anio))
+        self.assertGreater(consultas, 0)
+
+
+class PeriodoTests(SimpleTestCase):
+
+    def test_extremos_del_rango_de_fechas(self):
+        periodo = Periodo.desde_parametros({'fecha_desde': '0001-01-01', 'fecha_hasta': '9999-12-31'})
+        self.assertEqual(periodo, Periodo(date.min, None))
+        self.assertTrue(periodo.contiene(date.max))
+        self.assertEqual(periodo.condiciones('v.fecha_venta'), (['v.fecha_venta >= %s'], [date.min]))
+
+        self.assertEqual(Periodo.desde_parametros({'fecha_hasta': '9999-12-31'}).filtro('fecha_venta'), {})
+        self.assertEqual(Periodo.anio(9999), Periodo(date(9999, 1, 1), None))
+        self.assertEqual(Periodo.mes(9999, 12), Periodo(date(9999, 12, 1), None))
+
+    def test_rango_inclusivo(self):
+        periodo = Periodo.rango('2024-02-01', '2024-02-29')
+        self.assertEqual(periodo, Periodo(date(2024, 2, 1), date(2024, 3, 1)))
+        self.assertEqual(periodo.hasta, date(2024, 2, 29))
+
+
+class KeysetPaginatorTests(SimpleTestCase):
+
+    def test_limite_de_rango_en_la_primera_columna(self):
+        """El OR del cursor va acompañado de un límite sobre la columna inicial del índice"""
+        paginator = KeysetPaginator(Vehiculo.objects.all(), 20, orden=('-fecha_ingreso', '-id'))
+        valores = [date(2024, 1, 1), 10]
+        sql = str(Vehiculo.objects.filter(paginator._filtro_despues(valores)).query)
+        self.assertIn('"fecha_ingreso" <= 2024-01-01', sql)
+        sql = str(Vehiculo.objects.filter(paginator._filtro_despues(valores, invertido=True)).query)
+        self.assertIn('"fecha_ingreso" >= 2024-01-01', sql)
+
+    def test_tipos_del_cursor(self):
+        paginator = KeysetPaginator(lambda *args: [], 10, orden=('fecha', 'id'), tipos=(date.fromisoformat, int))
+        self.assertEqual(paginator._convertir(['2024-03-01', '7']), [date(2024, 3, 1), 7])
+        self.assertIsNone(paginator._convertir(['2024-13-01', 7]))
+        self.assertIsNone(paginator._convertir([None, 7]))
+        self.assertIsNone(KeysetPaginator([], 10, orden=('marca',))._convertir([{'a': 1}]))
+
+
+class MatrizPivotTests(SimpleTestCase):
+
+    def test_desde_largo(self):
+        pivot = MatrizPivot.desde_largo(
+            [(2, 'B', 5, 1), (1, 'A', 1, 1), (2, 'A', 2, 2), (1, 'C', 7, 1), (2, 'A', 1, 1)],
+            medidas=('total', 'cantidad'),
+        )
+        self.assertEqual(pivot.filas, [1, 2])
+        self.assertEqual(pivot.columnas, ['C', 'B', 'A'])  # de mayor a menor total
+        self.assertEqual(pivot.matriz(), [[7, 0, 1], [0, 5, 3]])
+        self.assertEqual(pivot.matriz('cantidad'), [[1, 0, 1], [0, 1, 3]])
+        self.assertEqual(pivot.totales_fila(), [8, 8])
+        self.assertEqual(pivot.totales_columna(), [7, 5, 4])
+        self.assertEqual(pivot.total('cantidad'), 6)
+        self.assertEqual(pivot.valor(1, 'Z'), 0)
+        self.assertEqual(pivot.renglones()[1]['totales'], {'total': 8, 'cantidad': 4})
+
+    def test_filas_y_columnas_fijas(self):
+        pivot = MatrizPivot.desde_largo(
+            [(1, 'A', 1), (3, 'B', 2), (2, 'A', 4)], filas=[1, 2], columnas=['B', 'A']
+        )
+        self.assertEqual(pivot.matriz(), [[0, 1], [0, 4]])  # la fila 3 se ignora
+
+    def test_vacia(self):
+        pivot = MatrizPivot.desde_largo([])
+        self.assertTrue(pivot.vacia)
+        self.assertEqual(pivot.total(), 0)
+        self.assertEqual(pivot.totales_columna(), [])
@@ -1,12 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_async
+
+# Inicio, dashboard y reportes por año: versión asíncrona (consultas en
+# paralelo) o síncrona según VISTAS_ASINCRONAS
+vistas = views_async if settings.VISTAS_ASINCRONAS else views
 
 urlpatterns = [
     # Home
-    path('', views.home, name='home'),
+    path('', vistas.home, name='home'),
     
     # Dashboard
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', vistas.dashboard, name='dashboard'),
     
     # Empleados
     path('empleados/', views.lista_empleados, name='empleado_lista'),
@@ -22,6 +27,7 @@ urlpatterns = [
     # Ventas
     path('ventas/', views.lista_ventas, name='venta_lista'),
     path('ventas/nueva/', views.nueva_venta, name='venta_nueva'),
+    path('ventas/nueva-lote/', views.nueva_venta_lote, name='venta_nueva_lote'),
     path('ventas/<int:venta_id>/', views.detalle_venta, name='venta_detalle'),
     path('ventas/<int:venta_id>/cancelar/', views.cancelar_venta, name='cancelar_venta'),
     
@@ -32,7 +38,12 @@ urlpatterns = [
     path('clientes/<int:cliente_id>/editar/', views.editar_cliente, name='editar_cliente'),
     
     # Reportes
-    path('reportes/ventas-mes-marca/', views.reporte_ventas_mes_marca, name='reportes_ventas_mes_marca'),
-    path('reportes/top5-marcas/', views.reporte_top5_marcas, name='reportes_top5_marcas'),
+    path('reportes/ventas-mes-marca/', vistas.reporte_ventas_mes_marca, name='reportes_ventas_mes_marca'),
+    path('reportes/top5-marcas/', vistas.reporte_top5_marcas, name='reportes_top5_marcas'),
+    path('reportes/tendencias/', vistas.reporte_tendencias, name='reportes_tendencias'),
     path('reportes/disponibilidad/', views.reporte_disponibilidad, name='reportes_disponibilidad'),
+    
+    # Exportaciones en segundo plano
+    path('exportaciones/<int:trabajo_id>/', views.exportacion_estado, name='exportacion_estado'),
+    path('exportaciones/<int:trabajo_id>/descargar/', views.exportacion_descargar, name='exportacion_descargar'),
 ]
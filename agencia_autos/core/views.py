@@ -1,21 +1,32 @@
+from datetime import MAXYEAR, MINYEAR
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import DatabaseError
-from django.db import models
-from .models import Vehiculo, Cliente, Empleado, MetodoPago, Venta, Marca, TipoVehiculo
-from .services.ventas import registrar_venta_service, cancelar_venta_service
-from .services.reportes import ventas_por_mes_marca, top5_marcas, obtener_disponibilidad_por_marca_tipo
+from django.utils import timezone
+from .models import Vehiculo, Cliente, Empleado, Venta, DetalleVenta, TrabajoExportacion
+from .services.ventas import registrar_venta_service, registrar_venta_lote_service, cancelar_venta_service
+from .services.kpis import (
+    kpis_inicio, kpis_ventas, kpis_vehiculos, kpis_empleados, kpis_dashboard_admin,
+    posicion_vendedor
+)
+from .services.reportes import (
+    pivot_ventas_mes_marca, top_marcas_anio, tendencia_ventas, anios_con_ventas,
+    obtener_disponibilidad_por_marca_tipo, estado_reportes_materializados,
+)
+from .services.exportaciones import TIPOS_REPORTE, encolar_exportacion, exportacion_en_segundo_plano
+from .services.cache_reportes import cache_activo, respuesta_reporte
 from .decorators import admin_required, vendedor_or_admin_required, active_employee_required
+from .roles import obtener_roles
+from . import catalogos
+from .paginacion import KeysetPaginator
+from .periodos import Periodo
 
 
 def home(request):
     """Vista principal del sistema"""
-    context = {
-        'total_vehiculos_disponibles': Vehiculo.objects.filter(estado_disponibilidad='DISPONIBLE').count(),
-        'total_clientes': Cliente.objects.count(),
-        'total_ventas_activas': Venta.objects.filter(estado_venta='ACTIVA').count(),
-    }
+    # Contadores mantenidos por triggers (una consulta de pocas filas)
+    context = kpis_inicio()
     return render(request, 'home.html', context)
 
 
@@ -23,9 +34,6 @@ def home(request):
 @vendedor_or_admin_required
 def lista_vehiculos(request):
     """Lista de vehículos con filtros - Vendedores y Administradores"""
-    from django.core.paginator import Paginator
-    from django.db.models import Avg
-    
     # Ordenar por ID (del más antiguo al más reciente)
     vehiculos = Vehiculo.objects.select_related('marca', 'tipo_vehiculo').all().order_by('id')
     
@@ -41,27 +49,24 @@ def lista_vehiculos(request):
     if estado:
         vehiculos = vehiculos.filter(estado_disponibilidad=estado)
     
-    # Calcular métricas
-    total_vehiculos = Vehiculo.objects.count()
-    disponibles = Vehiculo.objects.filter(estado_disponibilidad='DISPONIBLE').count()
-    precio_promedio = Vehiculo.objects.aggregate(promedio=Avg('precio'))['promedio'] or 0
+    # Calcular métricas (desde kpi_contador)
+    metricas = kpis_vehiculos()
     
-    # Paginación
-    paginator = Paginator(vehiculos, 20)  # 20 vehículos por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor
+    paginator = KeysetPaginator(vehiculos, 20, orden=('id',))  # 20 vehículos por página
+    page_obj = paginator.get_page(request.GET)
     
     context = {
         'vehiculos': page_obj,
         'page_obj': page_obj,
-        'marcas': Marca.objects.filter(activo=True),
-        'tipos': TipoVehiculo.objects.filter(activo=True),
+        'marcas': catalogos.activos('marca'),
+        'tipos': catalogos.activos('tipo_vehiculo'),
         'marca_seleccionada': marca_id,
         'tipo_seleccionado': tipo_id,
         'estado_seleccionado': estado,
-        'total_vehiculos': total_vehiculos,
-        'disponibles': disponibles,
-        'precio_promedio': precio_promedio,
+        'total_vehiculos': metricas['total_vehiculos'],
+        'disponibles': metricas['disponibles'],
+        'precio_promedio': metricas['precio_promedio'],
     }
     return render(request, 'vehiculos/lista.html', context)
 
@@ -113,7 +118,7 @@ def nueva_venta(request):
     context = {
         'clientes': Cliente.objects.all().order_by('nombre_completo'),
         'empleados': Empleado.objects.filter(estado='ACTIVO').order_by('nombre_completo'),
-        'metodos_pago': MetodoPago.objects.filter(activo=True),
+        'metodos_pago': catalogos.activos('metodo_pago'),
         'vehiculos_disponibles': Vehiculo.objects.filter(
             estado_disponibilidad='DISPONIBLE'
         ).select_related('marca', 'tipo_vehiculo').order_by('marca__nombre', 'modelo'),
@@ -121,15 +126,95 @@ def nueva_venta(request):
     return render(request, 'ventas/nueva.html', context)
 
 
+@login_required
+@vendedor_or_admin_required
+def nueva_venta_lote(request):
+    """
+    Venta de flotilla: varios vehículos para un mismo cliente en un solo
+    envío. Se registra con una sola llamada a registrar_venta_lote().
+    """
+    from decimal import Decimal, InvalidOperation
+    
+    resultados = None
+    seleccionados = {}
+    if request.method == 'POST':
+        vehiculos = []
+        for valor in request.POST.getlist('vehiculo_id'):
+            precio = request.POST.get(f'precio_{valor}')
+            try:
+                vehiculos.append((int(valor), Decimal(precio)))
+            except (TypeError, ValueError, InvalidOperation):
+                messages.error(request, f'Precio inválido para el vehículo {valor}')
+                vehiculos = []
+                break
+            seleccionados[valor] = precio
+        
+        if not vehiculos:
+            if not seleccionados:
+                messages.error(request, 'Seleccione al menos un vehículo')
+        else:
+            try:
+                lote = registrar_venta_lote_service(
+                    cliente_id=request.POST.get('cliente_id'),
+                    empleado_id=request.POST.get('empleado_id'),
+                    metodo_pago_id=request.POST.get('metodo_pago_id'),
+                    vehiculos=vehiculos,
+                    descuento_temporada=request.POST.get('descuento_temporada') == 'on',
+                    cliente_frecuente=request.POST.get('cliente_frecuente') == 'on',
+                    permitir_parcial=request.POST.get('permitir_parcial') == 'on'
+                )
+                if lote['venta_id']:
+                    messages.success(
+                        request,
+                        f"Venta #{lote['venta_id']} registrada con {len(lote['registrados'])} vehículo(s)"
+                    )
+                    for fila in lote['errores']:
+                        messages.warning(request, f"Vehículo {fila['vehiculo_id']}: {fila['error']}")
+                    return redirect('venta_detalle', venta_id=lote['venta_id'])
+                
+                messages.error(request, 'No se registró la venta. Revise los errores por vehículo.')
+                resultados = lote['resultados']
+            except DatabaseError as e:
+                messages.error(request, f'Error al registrar venta: {str(e)}')
+    
+    # Conservar la selección y los precios capturados si hay que corregir algo
+    vehiculos_disponibles = list(Vehiculo.objects.filter(
+        estado_disponibilidad='DISPONIBLE'
+    ).select_related('marca', 'tipo_vehiculo').order_by('marca__nombre', 'modelo'))
+    for vehiculo in vehiculos_disponibles:
+        vehiculo.seleccionado = str(vehiculo.id) in seleccionados
+        vehiculo.precio_lote = seleccionados.get(str(vehiculo.id), vehiculo.precio)
+    
+    context = {
+        'clientes': Cliente.objects.all().order_by('nombre_completo'),
+        'empleados': Empleado.objects.filter(estado='ACTIVO').order_by('nombre_completo'),
+        'metodos_pago': catalogos.activos('metodo_pago'),
+        'vehiculos_disponibles': vehiculos_disponibles,
+        'resultados': resultados,
+        'post': request.POST if request.method == 'POST' else {},
+    }
+    return render(request, 'ventas/nueva_lote.html', context)
+
+
 @login_required
 def detalle_venta(request, venta_id):
     """Detalle de una venta específica"""
-    venta = get_object_or_404(
-        Venta.objects.select_related('cliente', 'empleado', 'metodo_pago'),
-        id=venta_id
+    # La venta viaja en la misma consulta que sus líneas de detalle; solo si no
+    # tiene líneas se consulta por separado.
+    detalles = list(
+        DetalleVenta.objects.select_related(
+            'venta__cliente', 'venta__empleado', 'venta__metodo_pago',
+            'vehiculo__marca', 'vehiculo__tipo_vehiculo',
+        ).filter(venta_id=venta_id).order_by('id')
     )
-    detalles = venta.detalles.select_related('vehiculo__marca', 'vehiculo__tipo_vehiculo').all()
-    
+    if detalles:
+        venta = detalles[0].venta
+    else:
+        venta = get_object_or_404(
+            Venta.objects.select_related('cliente', 'empleado', 'metodo_pago'),
+            id=venta_id
+        )
+
     context = {
         'venta': venta,
         'detalles': detalles,
@@ -162,80 +247,130 @@ def cancelar_venta(request, venta_id):
     return render(request, 'ventas/cancelar.html', {'venta': venta})
 
 
+@admin_required
+def _exportar_ventas_csv(request, filtros):
+    """Venta + detalle + vehículo + marca vía COPY, para cargas de BI - Solo administradores"""
+    from .services.export_csv import exportar_ventas_csv
+    return exportar_ventas_csv(filtros, comprimir=request.GET.get('gzip') == '1')
+
+
 @login_required
 def lista_ventas(request):
     """Lista de todas las ventas"""
-    from django.core.paginator import Paginator
-    from django.db.models import Sum, Avg
-    from datetime import datetime
-    
     ventas = Venta.objects.select_related(
         'cliente', 'empleado', 'metodo_pago'
-    ).order_by('-fecha_creacion')
+    ).order_by('-fecha_creacion', '-id')
     
     # Filtro por estado
     estado = request.GET.get('estado')
     if estado:
         ventas = ventas.filter(estado_venta=estado)
     
-    # Calcular métricas
-    total_ventas = Venta.objects.count()
-    
-    # Ventas del mes actual
-    mes_actual = datetime.now().month
-    anio_actual = datetime.now().year
-    ventas_mes = Venta.objects.filter(
-        fecha_venta__month=mes_actual,
-        fecha_venta__year=anio_actual,
-        estado_venta='ACTIVA'
-    ).count()
-    
-    # Ingresos del mes actual
-    ingresos_mes = Venta.objects.filter(
-        fecha_venta__month=mes_actual,
-        fecha_venta__year=anio_actual,
-        estado_venta='ACTIVA'
-    ).aggregate(total=Sum('total_venta'))['total'] or 0
-    
-    # Promedio por venta (solo ventas activas)
-    promedio_venta = Venta.objects.filter(
-        estado_venta='ACTIVA'
-    ).aggregate(promedio=Avg('total_venta'))['promedio'] or 0
-    
-    # Paginación
-    paginator = Paginator(ventas, 15)  # 15 ventas por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Filtro por período (fecha_desde / fecha_hasta, o anio y mes) como rango
+    # de fechas sobre idx_venta_fecha
+    periodo = Periodo.desde_parametros(request.GET)
+    ventas = ventas.filter(**periodo.filtro('fecha_venta'))
+    
+    # Exportaciones (se generan por lotes, sin cargar todas las ventas)
+    formato = request.GET.get('formato')
+    if formato in ('excel', 'csv'):
+        filtros = {
+            'fecha_desde': periodo.inicio.isoformat() if periodo.inicio else None,
+            'fecha_hasta': periodo.hasta.isoformat() if periodo.hasta else None,
+            'estado': estado,
+        }
+        if formato == 'csv':
+            return _exportar_ventas_csv(request, filtros)
+        if exportacion_en_segundo_plano():
+            trabajo_id = encolar_exportacion('ventas', 'excel', filtros, request.user.id)
+            return redirect('exportacion_estado', trabajo_id=trabajo_id)
+        if cache_activo():
+            return respuesta_reporte('ventas', 'excel', filtros)
+        from .services.export_excel import exportar_ventas_excel
+        return exportar_ventas_excel(filtros)
+    
+    # Calcular métricas (desde las tablas de contadores)
+    metricas = kpis_ventas()
+    
+    # Paginación por cursor (índice idx_venta_fecha_creacion)
+    paginator = KeysetPaginator(ventas, 15, orden=('-fecha_creacion', '-id'))  # 15 ventas por página
+    page_obj = paginator.get_page(request.GET)
     
     context = {
         'ventas': page_obj,
         'page_obj': page_obj,
         'estado_seleccionado': estado,
-        'total_ventas': total_ventas,
-        'ventas_mes': ventas_mes,
-        'ingresos_mes': ingresos_mes,
-        'promedio_venta': promedio_venta,
+        'fecha_desde': periodo.inicio.isoformat() if periodo.inicio else '',
+        'fecha_hasta': periodo.hasta.isoformat() if periodo.hasta else '',
+        'total_ventas': metricas['total_ventas'],
+        'ventas_mes': metricas['ventas_mes'],
+        'ingresos_mes': metricas['ingresos_mes'],
+        'promedio_venta': metricas['promedio_venta'],
     }
     return render(request, 'ventas/lista.html', context)
 
 
+def _anio_pedido(request):
+    """Año de ?anio=, o None si falta, no es un número o está fuera del rango de ``date``"""
+    try:
+        anio = int(request.GET['anio'])
+    except (KeyError, ValueError):
+        return None
+    return anio if MINYEAR <= anio <= MAXYEAR else None
+
+
+def _anio_por_defecto(anios_disponibles):
+    """Año más reciente con ventas (o el actual si no hay ventas)"""
+    return anios_disponibles[0] if anios_disponibles else timezone.localdate().year
+
+
+def _anio_reporte(request):
+    """
+    Año pedido en ?anio= y años con ventas para el selector; sin año (o con
+    uno inválido) se usa el más reciente con ventas.
+    """
+    anios_disponibles = anios_con_ventas()
+    anio = _anio_pedido(request)
+    if anio is None:
+        anio = _anio_por_defecto(anios_disponibles)
+    return anio, anios_disponibles
+
+
+def _anios_tendencia(request):
+    """Número de años de ?anios= para el reporte de tendencias (2 a 10, 5 por defecto)"""
+    try:
+        return min(max(int(request.GET.get('anios', 5)), 2), 10)
+    except ValueError:
+        return 5
+
+
 @login_required
 @admin_required
 def reporte_ventas_mes_marca(request):
     """Reporte PIVOT de ventas por mes y marca - Solo administradores"""
-    anio = request.GET.get('anio', 2024)
-    
     try:
-        # Llamar al servicio que consulta la vista SQL
-        datos = ventas_por_mes_marca(anio)
+        anio, anios_disponibles = _anio_reporte(request)
+
+        # Meses × marcas desde los agregados por año en caché (una columna por marca)
+        pivot = pivot_ventas_mes_marca(anio)
+        
+        formato = request.GET.get('formato')  # 'excel' o 'csv'
+        if formato == 'excel':
+            from .services.export_excel import exportar_pivot_ventas_excel
+            return exportar_pivot_ventas_excel(pivot, f'Año {anio}')
+        elif formato == 'csv':
+            from .services.export_csv import exportar_pivot_ventas_csv
+            return exportar_pivot_ventas_csv(pivot)
         
         context = {
-            'datos': datos,
+            'pivot': pivot,
             'anio': anio,
+            'anios_disponibles': anios_disponibles,
+            'frescura': estado_reportes_materializados(),
         }
         return render(request, 'reportes/ventas_mes_marca.html', context)
         
-    except DatabaseError as e:
+    except (DatabaseError, ValueError) as e:
         messages.error(request, f'Error al generar reporte: {str(e)}')
         return redirect('home')
 
@@ -244,15 +379,17 @@ def reporte_ventas_mes_marca(request):
 @admin_required
 def reporte_top5_marcas(request):
     """Reporte Top 5 marcas con RANK() - Solo administradores"""
-    anio = request.GET.get('anio', 2024)
-    
     try:
-        # Llamar al servicio que consulta la vista SQL
-        datos = top5_marcas(anio)
+        anio, anios_disponibles = _anio_reporte(request)
+
+        # Ranking calculado con los agregados por año en caché
+        datos = top_marcas_anio(anio, limite=5)
         
         context = {
             'datos': datos,
             'anio': anio,
+            'anios_disponibles': anios_disponibles,
+            'frescura': estado_reportes_materializados(),
         }
         return render(request, 'reportes/top5_marcas.html', context)
         
@@ -261,19 +398,59 @@ def reporte_top5_marcas(request):
         return redirect('home')
 
 
+@login_required
+@admin_required
+def reporte_tendencias(request):
+    """Tendencia de ventas de varios años y comparación anual (YoY) - Solo administradores"""
+    try:
+        anio, anios_disponibles = _anio_reporte(request)
+        anios = _anios_tendencia(request)
+
+        context = {
+            'tendencia': tendencia_ventas(anio, anios),
+            'anio': anio,
+            'anios': anios,
+            'anios_disponibles': anios_disponibles,
+            'frescura': estado_reportes_materializados(),
+        }
+        return render(request, 'reportes/tendencias.html', context)
+
+    except (DatabaseError, ValueError) as e:
+        messages.error(request, f'Error al generar reporte: {str(e)}')
+        return redirect('home')
+
+
 @login_required
 @admin_required
 def reporte_disponibilidad(request):
     """Reporte de disponibilidad de vehículos por marca y tipo - Solo administradores"""
-    from django.core.paginator import Paginator
-    
     try:
         # Obtener filtros
         fecha_desde = request.GET.get('fecha_desde')
         fecha_hasta = request.GET.get('fecha_hasta')
         marca_filtro = request.GET.get('marca')
         tipo_filtro = request.GET.get('tipo')
-        formato = request.GET.get('formato')  # 'excel' o 'pdf'
+        formato = request.GET.get('formato')  # 'excel', 'pdf' o 'csv'
+        filtros = {
+            'fecha_desde': fecha_desde,
+            'fecha_hasta': fecha_hasta,
+            'marca': marca_filtro,
+            'tipo': tipo_filtro
+        }
+        
+        # CSV: lo genera PostgreSQL con COPY y se envía sin cargar los datos
+        if formato == 'csv':
+            from .services.export_csv import exportar_disponibilidad_csv
+            return exportar_disponibilidad_csv(filtros, comprimir=request.GET.get('gzip') == '1')
+        
+        if formato in ('excel', 'pdf'):
+            # Exportación en segundo plano: se encola y se muestra la página de estado
+            if exportacion_en_segundo_plano():
+                trabajo_id = encolar_exportacion('disponibilidad', formato, filtros, request.user.id)
+                return redirect('exportacion_estado', trabajo_id=trabajo_id)
+            # Mismos filtros y datos sin cambios: se sirve el archivo ya generado
+            if cache_activo():
+                return respuesta_reporte('disponibilidad', formato, filtros)
         
         # Obtener datos con filtros
         datos = obtener_disponibilidad_por_marca_tipo(
@@ -286,28 +463,15 @@ def reporte_disponibilidad(request):
         # Si se solicita exportación
         if formato == 'excel':
             from .services.export_excel import exportar_disponibilidad_excel
-            filtros = {
-                'fecha_desde': fecha_desde,
-                'fecha_hasta': fecha_hasta,
-                'marca': marca_filtro,
-                'tipo': tipo_filtro
-            }
             return exportar_disponibilidad_excel(datos, filtros)
         
         elif formato == 'pdf':
             from .services.export_pdf import exportar_disponibilidad_pdf
-            filtros = {
-                'fecha_desde': fecha_desde,
-                'fecha_hasta': fecha_hasta,
-                'marca': marca_filtro,
-                'tipo': tipo_filtro
-            }
             return exportar_disponibilidad_pdf(datos, filtros)
         
-        # Paginación
-        paginator = Paginator(datos, 20)  # 20 registros por página
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # Paginación por cursor (los datos vienen ordenados por marca y tipo)
+        paginator = KeysetPaginator(datos, 20, orden=('marca', 'tipo_vehiculo'), tipos=(str, str))  # 20 registros por página
+        page_obj = paginator.get_page(request.GET)
         
         # Calcular métricas
         total_disponibles = sum(d['cantidad_disponible'] for d in datos)
@@ -339,6 +503,79 @@ def reporte_disponibilidad(request):
         return redirect('home')
 
 
+def _trabajo_del_usuario(request, trabajo_id):
+    """Trabajo de exportación visible para el usuario (propio, o cualquiera si es administrador)"""
+    trabajos = TrabajoExportacion.objects.all()
+    if not obtener_roles(request).es_admin:
+        trabajos = trabajos.filter(usuario_id=request.user.id)
+    return get_object_or_404(trabajos, id=trabajo_id)
+
+
+@login_required
+def exportacion_estado(request, trabajo_id):
+    """Estado de una exportación en segundo plano (se refresca hasta que termina)"""
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    context = {
+        'trabajo': trabajo,
+        'tipo_reporte': TIPOS_REPORTE.get(trabajo.tipo_reporte, trabajo.tipo_reporte),
+    }
+    return render(request, 'reportes/exportacion.html', context)
+
+
+@login_required
+def exportacion_descargar(request, trabajo_id):
+    """Descarga el archivo generado por una exportación completada"""
+    from django.http import FileResponse, Http404
+    
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    if trabajo.estado != 'COMPLETADO' or not trabajo.ruta_archivo:
+        messages.warning(request, 'La exportación todavía no está lista.')
+        return redirect('exportacion_estado', trabajo_id=trabajo.id)
+    
+    try:
+        archivo = open(trabajo.ruta_archivo, 'rb')
+    except FileNotFoundError:
+        raise Http404('El archivo de la exportación ya no existe')
+    return FileResponse(archivo, as_attachment=True, filename=trabajo.nombre_archivo)
+
+
+def _ventas_recientes(empleado_id=None):
+    """Últimas 5 ventas registradas (de un empleado, si se indica)"""
+    ventas = Venta.objects.select_related('cliente', 'empleado', 'metodo_pago')
+    if empleado_id is not None:
+        ventas = ventas.filter(empleado_id=empleado_id)
+    return ventas.order_by('-fecha_creacion')[:5]
+
+
+def _contexto_dashboard_admin(kpis, ventas_recientes):
+    # Alertas (vehículos con más de 90 días sin vender)
+    vehiculos_antiguos = kpis['vehiculos_antiguos']
+    
+    alertas = []
+    if vehiculos_antiguos > 0:
+        alertas.append(f'Hay {vehiculos_antiguos} vehículo(s) con más de 90 días sin vender')
+    
+    return {
+        'vehiculos_disponibles': kpis['vehiculos_disponibles'],
+        'ventas_mes': kpis['ventas_mes'],
+        'ingresos_mes': kpis['ingresos_mes'],
+        'empleados_activos': kpis['empleados_activos'],
+        'ventas_recientes': ventas_recientes,
+        'alertas': alertas,
+    }
+
+
+def _contexto_dashboard_vendedor(mis_kpis, posicion, mis_ventas_recientes):
+    mi_ranking, total_vendedores = posicion
+    return {
+        'mis_ventas_mes': mis_kpis['ventas_mes'],
+        'mi_total_vendido': mis_kpis['ingresos_mes'],
+        'mi_ranking': mi_ranking,
+        'total_vendedores': total_vendedores,
+        'mis_ventas_recientes': mis_ventas_recientes,
+    }
+
+
 @login_required
 def dashboard(request):
     """
@@ -346,62 +583,17 @@ def dashboard(request):
     - Administrador: Ve estadísticas completas del sistema
     - Vendedor: Ve solo sus estadísticas personales
     """
-    from datetime import datetime
-    from django.db.models import Sum, Count
-    
     # Detectar si el usuario es administrador
-    es_admin = request.user.groups.filter(name='Administrador').exists()
+    es_admin = obtener_roles(request).es_admin
     
     if es_admin:
         # ========== DASHBOARD ADMINISTRADOR ==========
         
-        # Estadísticas generales
-        vehiculos_disponibles = Vehiculo.objects.filter(estado_disponibilidad='DISPONIBLE').count()
-        
-        # Ventas del mes actual
-        mes_actual = datetime.now().month
-        anio_actual = datetime.now().year
-        ventas_mes = Venta.objects.filter(
-            fecha_venta__month=mes_actual,
-            fecha_venta__year=anio_actual,
-            estado_venta='ACTIVA'
-        ).count()
-        
-        # Ingresos del mes actual
-        ingresos_mes = Venta.objects.filter(
-            fecha_venta__month=mes_actual,
-            fecha_venta__year=anio_actual,
-            estado_venta='ACTIVA'
-        ).aggregate(total=Sum('total_venta'))['total'] or 0
-        
-        # Empleados activos
-        empleados_activos = Empleado.objects.filter(estado='ACTIVO').count()
+        # Estadísticas generales (contadores mantenidos por triggers)
+        kpis = kpis_dashboard_admin()
         
         # Ventas recientes (últimas 5)
-        ventas_recientes = Venta.objects.select_related(
-            'cliente', 'empleado', 'metodo_pago'
-        ).order_by('-fecha_creacion')[:5]
-        
-        # Alertas (vehículos con más de 90 días sin vender)
-        from datetime import timedelta
-        fecha_limite = datetime.now() - timedelta(days=90)
-        vehiculos_antiguos = Vehiculo.objects.filter(
-            estado_disponibilidad='DISPONIBLE',
-            fecha_ingreso__lt=fecha_limite
-        ).count()
-        
-        alertas = []
-        if vehiculos_antiguos > 0:
-            alertas.append(f'Hay {vehiculos_antiguos} vehículo(s) con más de 90 días sin vender')
-        
-        context = {
-            'vehiculos_disponibles': vehiculos_disponibles,
-            'ventas_mes': ventas_mes,
-            'ingresos_mes': ingresos_mes,
-            'empleados_activos': empleados_activos,
-            'ventas_recientes': ventas_recientes,
-            'alertas': alertas,
-        }
+        context = _contexto_dashboard_admin(kpis, _ventas_recientes())
         
         return render(request, 'dashboard/admin.html', context)
     
@@ -415,57 +607,15 @@ def dashboard(request):
             messages.error(request, 'No se encontró un empleado asociado a tu usuario')
             return redirect('home')
         
-        # Ventas del vendedor en el mes actual
-        mes_actual = datetime.now().month
-        anio_actual = datetime.now().year
-        mis_ventas_mes = Venta.objects.filter(
-            empleado=empleado,
-            fecha_venta__month=mes_actual,
-            fecha_venta__year=anio_actual,
-            estado_venta='ACTIVA'
-        ).count()
+        # Ventas del vendedor en el mes actual (conteo y total en una consulta)
+        mis_kpis = kpis_ventas(empleado_id=empleado.id)
         
-        # Total vendido por el vendedor este mes
-        mi_total_vendido = Venta.objects.filter(
-            empleado=empleado,
-            fecha_venta__month=mes_actual,
-            fecha_venta__year=anio_actual,
-            estado_venta='ACTIVA'
-        ).aggregate(total=Sum('total_venta'))['total'] or 0
-        
-        # Ranking del vendedor (por número de ventas este mes)
-        # Obtener todos los vendedores activos con su conteo de ventas
-        vendedores_ranking = Empleado.objects.filter(
-            estado='ACTIVO'
-        ).annotate(
-            num_ventas=Count('venta', filter=models.Q(
-                venta__fecha_venta__month=mes_actual,
-                venta__fecha_venta__year=anio_actual,
-                venta__estado_venta='ACTIVA'
-            ))
-        ).order_by('-num_ventas')
-        
-        mi_ranking = 1
-        total_vendedores = vendedores_ranking.count()
-        for idx, vendedor in enumerate(vendedores_ranking, 1):
-            if vendedor.id == empleado.id:
-                mi_ranking = idx
-                break
+        # Ranking del vendedor (por número de ventas este mes): posición y
+        # total calculados con RANK() en la BD y compartidos en caché por mes
+        posicion = posicion_vendedor(empleado.id)
         
         # Mis ventas recientes (últimas 5)
-        mis_ventas_recientes = Venta.objects.filter(
-            empleado=empleado
-        ).select_related(
-            'cliente', 'metodo_pago'
-        ).order_by('-fecha_creacion')[:5]
-        
-        context = {
-            'mis_ventas_mes': mis_ventas_mes,
-            'mi_total_vendido': mi_total_vendido,
-            'mi_ranking': mi_ranking,
-            'total_vendedores': total_vendedores,
-            'mis_ventas_recientes': mis_ventas_recientes,
-        }
+        context = _contexto_dashboard_vendedor(mis_kpis, posicion, _ventas_recientes(empleado.id))
         
         return render(request, 'dashboard/vendedor.html', context)
 
@@ -479,8 +629,6 @@ def lista_empleados(request):
     Lista de empleados - Solo para administradores
     Muestra todos los empleados con opción de filtrar por estado
     """
-    from django.core.paginator import Paginator
-    
     # Filtros
     estado_filtro = request.GET.get('estado', '')
     
@@ -490,23 +638,20 @@ def lista_empleados(request):
     if estado_filtro:
         empleados = empleados.filter(estado=estado_filtro)
     
-    # Calcular estadísticas
-    total_empleados = Empleado.objects.count()
-    empleados_activos = Empleado.objects.filter(estado='ACTIVO').count()
-    empleados_inactivos = Empleado.objects.filter(estado='INACTIVO').count()
+    # Calcular estadísticas (desde kpi_contador)
+    metricas = kpis_empleados()
     
-    # Paginación
-    paginator = Paginator(empleados, 15)  # 15 empleados por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor
+    paginator = KeysetPaginator(empleados, 15, orden=('id',))  # 15 empleados por página
+    page_obj = paginator.get_page(request.GET)
     
     context = {
         'empleados': page_obj,
         'page_obj': page_obj,
         'estado_filtro': estado_filtro,
-        'total_empleados': total_empleados,
-        'empleados_activos': empleados_activos,
-        'empleados_inactivos': empleados_inactivos,
+        'total_empleados': metricas['total_empleados'],
+        'empleados_activos': metricas['empleados_activos'],
+        'empleados_inactivos': metricas['empleados_inactivos'],
     }
     
     return render(request, 'empleados/lista.html', context)
@@ -645,8 +790,8 @@ def nuevo_vehiculo(request):
                 messages.error(request, f'Ya existe un vehículo con el VIN "{vin}"')
                 # Mantener los datos del formulario
                 context = {
-                    'marcas': Marca.objects.filter(activo=True),
-                    'tipos': TipoVehiculo.objects.filter(activo=True),
+                    'marcas': catalogos.activos('marca'),
+                    'tipos': catalogos.activos('tipo_vehiculo'),
                     'datos': request.POST,
                 }
                 return render(request, 'vehiculos/nuevo.html', context)
@@ -677,8 +822,8 @@ def nuevo_vehiculo(request):
     
     # GET - Mostrar formulario
     context = {
-        'marcas': Marca.objects.filter(activo=True).order_by('nombre'),
-        'tipos': TipoVehiculo.objects.filter(activo=True).order_by('nombre'),
+        'marcas': catalogos.activos('marca'),
+        'tipos': catalogos.activos('tipo_vehiculo'),
     }
     return render(request, 'vehiculos/nuevo.html', context)
 
@@ -768,19 +913,17 @@ def editar_vehiculo(request, vehiculo_id):
 @admin_required
 def lista_clientes(request):
     """Lista todos los clientes - Solo administradores"""
-    from django.core.paginator import Paginator
-    
     clientes = Cliente.objects.all().order_by('id')
     
-    # Estadísticas
-    total_clientes = Cliente.objects.count()
-    clientes_con_compras = Cliente.objects.filter(venta__isnull=False).distinct().count()
+    # Estadísticas (kpi_contador, mantenido por triggers)
+    indicadores = kpis_inicio()
+    total_clientes = indicadores['total_clientes']
+    clientes_con_compras = indicadores['clientes_con_compras']
     clientes_sin_compras = total_clientes - clientes_con_compras
     
-    # Paginación
-    paginator = Paginator(clientes, 15)  # 15 clientes por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor
+    paginator = KeysetPaginator(clientes, 15, orden=('id',))  # 15 clientes por página
+    page_obj = paginator.get_page(request.GET)
     
     context = {
         'clientes': page_obj,
@@ -815,8 +958,7 @@ def nuevo_cliente(request):
         except Exception as e:
             messages.error(request, f'Error al crear cliente: {str(e)}')
     
-    from .models import TipoDocumento
-    tipos_documento = TipoDocumento.objects.filter(activo=True)
+    tipos_documento = catalogos.activos('tipo_documento')
     context = {
         'tipos_documento': tipos_documento,
     }
@@ -844,8 +986,7 @@ def editar_cliente(request, cliente_id):
         except Exception as e:
             messages.error(request, f'Error al actualizar cliente: {str(e)}')
     
-    from .models import TipoDocumento
-    tipos_documento = TipoDocumento.objects.filter(activo=True)
+    tipos_documento = catalogos.activos('tipo_documento')
     context = {
         'cliente': cliente,
         'tipos_documento': tipos_documento,
@@ -858,7 +999,11 @@ def detalle_cliente(request, cliente_id):
     """Ver detalle de un cliente con su historial de compras"""
     from django.db import connection
     
-    cliente = get_object_or_404(Cliente, id=cliente_id)
+    # Métricas y clasificación en la misma consulta del cliente (cliente_metricas por PK)
+    cliente = get_object_or_404(
+        Cliente.objects.select_related('tipo_documento', 'metricas'),
+        id=cliente_id
+    )
     
     # Obtener historial usando el procedimiento almacenado
     try:
@@ -870,44 +1015,14 @@ def detalle_cliente(request, cliente_id):
         historial = []
         messages.error(request, f'Error al obtener historial: {str(e)}')
     
-    # Obtener clasificación del cliente
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT 
-                    COUNT(v.id)::bigint AS total_compras,
-                    COALESCE(SUM(v.total_venta), 0)::numeric AS monto_total,
-                    CASE 
-                        WHEN COUNT(v.id) >= 5 THEN 'VIP'
-                        WHEN COUNT(v.id) >= 3 THEN 'FRECUENTE'
-                        WHEN COUNT(v.id) >= 1 THEN 'REGULAR'
-                        ELSE 'NUEVO'
-                    END AS clasificacion
-                FROM cliente c
-                LEFT JOIN venta v ON c.id = v.cliente_id AND v.estado_venta = 'ACTIVA'
-                WHERE c.id = %s
-                GROUP BY c.id
-            """, [cliente_id])
-            result = cursor.fetchone()
-            if result:
-                total_compras = result[0]
-                monto_total = result[1]
-                clasificacion = result[2]
-            else:
-                clasificacion = 'NUEVO'
-                total_compras = 0
-                monto_total = 0
-    except Exception as e:
-        clasificacion = 'N/A'
-        total_compras = 0
-        monto_total = 0
-        messages.error(request, f'Error al obtener clasificación: {str(e)}')
+    metricas = getattr(cliente, 'metricas', None)
     
     context = {
         'cliente': cliente,
         'historial': historial,
-        'clasificacion': clasificacion,
-        'total_compras': total_compras,
-        'monto_total': monto_total,
+        'clasificacion': metricas.segmento if metricas else 'NUEVO',
+        'total_compras': metricas.total_compras if metricas else 0,
+        'monto_total': metricas.monto_total if metricas else 0,
+        'ultima_compra': metricas.ultima_compra if metricas else None,
     }
     return render(request, 'clientes/detalle.html', context)
@@ -0,0 +1,173 @@
+"""
+Versiones asíncronas de las páginas con varias lecturas independientes
+(inicio, dashboard y reportes de ventas por marca).
+
+Se usan en lugar de las de ``core.views`` con ``VISTAS_ASINCRONAS=True``
+(ver ``core/urls.py``). Las consultas independientes de cada página se
+lanzan a la vez con ``en_paralelo``; la página tarda lo que la consulta más
+lenta en lugar de la suma. Plantillas, contexto y mensajes son los mismos
+que en las vistas síncronas.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import DatabaseError
+from django.shortcuts import redirect, render
+from django.utils import timezone
+
+from .decorators import admin_required, vista_asincrona
+from .models import Empleado
+from .paralelo import en_paralelo
+from .roles import obtener_roles
+from .services.kpis import (
+    kpis_inicio, kpis_ventas, kpis_dashboard_admin, leer_contadores, ventas_del_mes,
+    contar_vehiculos_antiguos, posicion_vendedor,
+)
+from .services.reportes import (
+    pivot_ventas_mes_marca, top_marcas_anio, tendencia_ventas, anios_con_ventas,
+    estado_reportes_materializados,
+)
+from .views import (
+    _anio_pedido, _anio_por_defecto, _anios_tendencia, _ventas_recientes,
+    _contexto_dashboard_admin, _contexto_dashboard_vendedor,
+)
+
+
+def _lista(consulta):
+    """Evalúa un QuerySet en el hilo de la llamada (no en la plantilla)"""
+    return list(consulta())
+
+
+async def _render(request, plantilla, context):
+    # La plantilla puede leer request.roles o la sesión: se renderiza en el hilo del request
+    return await sync_to_async(render)(request, plantilla, context)
+
+
+async def home(request):
+    """Vista principal del sistema"""
+    # Contadores mantenidos por triggers (una consulta de pocas filas)
+    context, = await en_paralelo(kpis_inicio)
+    return await _render(request, 'home.html', context)
+
+
+@vista_asincrona(login_required)
+async def dashboard(request):
+    """
+    Dashboard diferenciado por rol (mismo contenido que ``views.dashboard``)
+    - Administrador: contadores, ventas del mes, inventario antiguo y ventas
+      recientes se leen en paralelo
+    - Vendedor: tras identificar al empleado, sus ventas del mes, su posición
+      en el ranking y sus ventas recientes se leen en paralelo
+    """
+    es_admin = await sync_to_async(lambda: obtener_roles(request).es_admin)()
+    hoy = timezone.localdate()
+
+    if es_admin:
+        contadores, ventas_mes, vehiculos_antiguos, ventas_recientes = await en_paralelo(
+            leer_contadores,
+            (ventas_del_mes, hoy),
+            (contar_vehiculos_antiguos, hoy),
+            (_lista, _ventas_recientes),
+        )
+        kpis = kpis_dashboard_admin(hoy, contadores, ventas_mes, vehiculos_antiguos)
+        context = _contexto_dashboard_admin(kpis, ventas_recientes)
+        return await _render(request, 'dashboard/admin.html', context)
+
+    empleado = await Empleado.objects.filter(usuario=request.user.get_username()).afirst()
+    if empleado is None:
+        messages.error(request, 'No se encontró un empleado asociado a tu usuario')
+        return redirect('home')
+
+    mis_kpis, posicion, mis_ventas_recientes = await en_paralelo(
+        (kpis_ventas, hoy, empleado.id),
+        (posicion_vendedor, empleado.id, hoy),
+        (_lista, lambda: _ventas_recientes(empleado.id)),
+    )
+    context = _contexto_dashboard_vendedor(mis_kpis, posicion, mis_ventas_recientes)
+    return await _render(request, 'dashboard/vendedor.html', context)
+
+
+async def _datos_por_anio(request, funcion, *args):
+    """
+    Año del reporte, años con ventas, frescura de los reportes y
+    ``funcion(anio, *args)``. Con ?anio= las tres lecturas van en paralelo;
+    sin él, el año por defecto sale de los años con ventas.
+    """
+    anio = _anio_pedido(request)
+    if anio is not None:
+        anios_disponibles, frescura, datos = await en_paralelo(
+            anios_con_ventas, estado_reportes_materializados, (funcion, anio, *args)
+        )
+        return anio, anios_disponibles, frescura, datos
+
+    anios_disponibles, frescura = await en_paralelo(anios_con_ventas, estado_reportes_materializados)
+    anio = _anio_por_defecto(anios_disponibles)
+    datos, = await en_paralelo((funcion, anio, *args))
+    return anio, anios_disponibles, frescura, datos
+
+
+@vista_asincrona(login_required, admin_required)
+async def reporte_ventas_mes_marca(request):
+    """Reporte PIVOT de ventas por mes y marca - Solo administradores"""
+    try:
+        anio, anios_disponibles, frescura, pivot = await _datos_por_anio(request, pivot_ventas_mes_marca)
+
+        formato = request.GET.get('formato')  # 'excel' o 'csv'
+        if formato == 'excel':
+            from .services.export_excel import exportar_pivot_ventas_excel
+            return await sync_to_async(exportar_pivot_ventas_excel)(pivot, f'Año {anio}')
+        elif formato == 'csv':
+            from .services.export_csv import exportar_pivot_ventas_csv
+            return await sync_to_async(exportar_pivot_ventas_csv)(pivot)
+
+        context = {
+            'pivot': pivot,
+            'anio': anio,
+            'anios_disponibles': anios_disponibles,
+            'frescura': frescura,
+        }
+        return await _render(request, 'reportes/ventas_mes_marca.html', context)
+
+    except (DatabaseError, ValueError) as e:
+        messages.error(request, f'Error al generar reporte: {str(e)}')
+        return redirect('home')
+
+
+@vista_asincrona(login_required, admin_required)
+async def reporte_top5_marcas(request):
+    """Reporte Top 5 marcas con RANK() - Solo administradores"""
+    try:
+        anio, anios_disponibles, frescura, datos = await _datos_por_anio(request, top_marcas_anio, 5)
+
+        context = {
+            'datos': datos,
+            'anio': anio,
+            'anios_disponibles': anios_disponibles,
+            'frescura': frescura,
+        }
+        return await _render(request, 'reportes/top5_marcas.html', context)
+
+    except DatabaseError as e:
+        messages.error(request, f'Error al generar reporte: {str(e)}')
+        return redirect('home')
+
+
+@vista_asincrona(login_required, admin_required)
+async def reporte_tendencias(request):
+    """Tendencia de ventas de varios años y comparación anual (YoY) - Solo administradores"""
+    try:
+        anios = _anios_tendencia(request)
+        anio, anios_disponibles, frescura, tendencia = await _datos_por_anio(request, tendencia_ventas, anios)
+
+        context = {
+            'tendencia': tendencia,
+            'anio': anio,
+            'anios': anios,
+            'anios_disponibles': anios_disponibles,
+            'frescura': frescura,
+        }
+        return await _render(request, 'reportes/tendencias.html', context)
+
+    except (DatabaseError, ValueError) as e:
+        messages.error(request, f'Error al generar reporte: {str(e)}')
+        return redirect('home')
@@ -8,6 +8,7 @@ django.setup()
 from django.contrib.auth.models import Group, Permission, User
 from django.contrib.contenttypes.models import ContentType
 from core.models import Vehiculo, Venta, Cliente, Empleado
+from core.roles import invalidar_roles
 
 def crear_grupos():
     
@@ -75,6 +76,10 @@ def main():
     print("\n👤 Configurando usuarios...")
     asignar_superusuario_a_admin()
     
+    # 4. Invalidar roles en caché (efectivo de inmediato si la caché es compartida;
+    #    con caché local los servidores la renuevan al expirar ROLES_CACHE_TIMEOUT)
+    invalidar_roles()
+    
     print("\n" + "="*60)
     print("CONFIGURACION COMPLETADA")
     print("="*60)
@@ -1,4 +1,8 @@
+DROP TABLE IF EXISTS trabajo_exportacion CASCADE;
 
+DROP TABLE IF EXISTS cliente_metricas CASCADE;
+DROP TABLE IF EXISTS kpi_ventas_mes CASCADE;
+DROP TABLE IF EXISTS kpi_contador CASCADE;
 DROP TABLE IF EXISTS detalle_venta CASCADE;
 DROP TABLE IF EXISTS venta CASCADE;
 DROP TABLE IF EXISTS vehiculo CASCADE;
@@ -147,6 +151,11 @@ CREATE INDEX idx_vehiculo_tipo ON vehiculo(tipo_vehiculo_id);
 CREATE INDEX idx_vehiculo_precio ON vehiculo(precio);
 CREATE INDEX idx_vehiculo_anio ON vehiculo(anio);
 
+-- Índices para el análisis de inventario (orden por antigüedad con cursor,
+-- opcionalmente filtrado por estado)
+CREATE INDEX idx_vehiculo_ingreso ON vehiculo(fecha_ingreso, id);
+CREATE INDEX idx_vehiculo_estado_ingreso ON vehiculo(estado_disponibilidad, fecha_ingreso, id);
+
 -- Tabla: Ventas
 CREATE TABLE venta (
     id BIGSERIAL PRIMARY KEY,
@@ -157,7 +166,7 @@ CREATE TABLE venta (
     total_venta DECIMAL(10,2) NOT NULL,
     descuento_aplicado DECIMAL(10,2) DEFAULT 0,
     estado_venta VARCHAR(20) NOT NULL DEFAULT 'ACTIVA',
-    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     fecha_modificacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     CONSTRAINT fk_venta_cliente FOREIGN KEY (cliente_id) 
         REFERENCES cliente(id) ON DELETE RESTRICT,
@@ -174,6 +183,7 @@ COMMENT ON TABLE venta IS 'Registro de ventas realizadas';
 COMMENT ON COLUMN venta.id IS 'Identificador único de la venta (SEQUENCE)';
 COMMENT ON COLUMN venta.estado_venta IS 'Estado: ACTIVA, CANCELADA, PENDIENTE';
 COMMENT ON COLUMN venta.descuento_aplicado IS 'Monto de descuento aplicado';
+COMMENT ON COLUMN venta.fecha_creacion IS 'NOT NULL: el listado de ventas pagina por cursor sobre (fecha_creacion, id)';
 
 -- ÍNDICES: Estado y Fecha de venta (Requisito 7)
 CREATE INDEX idx_venta_estado ON venta(estado_venta);
@@ -184,6 +194,9 @@ CREATE INDEX idx_venta_cliente ON venta(cliente_id);
 CREATE INDEX idx_venta_empleado ON venta(empleado_id);
 CREATE INDEX idx_venta_fecha_estado ON venta(fecha_venta, estado_venta);
 
+-- Índice para la paginación por cursor de la lista de ventas
+CREATE INDEX idx_venta_fecha_creacion ON venta(fecha_creacion DESC, id DESC);
+
 -- Tabla: Detalle de Ventas
 CREATE TABLE detalle_venta (
     id BIGSERIAL PRIMARY KEY,
@@ -214,4 +227,94 @@ CREATE UNIQUE INDEX idx_detalle_venta_vehiculo ON detalle_venta(venta_id, vehicu
 CREATE INDEX idx_detalle_venta ON detalle_venta(venta_id);
 CREATE INDEX idx_detalle_vehiculo ON detalle_venta(vehiculo_id);
 
+-- Tablas de métricas (mantenidas incrementalmente por triggers)
+
+-- Contadores globales por entidad y estado
+CREATE TABLE kpi_contador (
+    entidad VARCHAR(20) NOT NULL,
+    clave VARCHAR(20) NOT NULL,
+    cantidad BIGINT NOT NULL DEFAULT 0,
+    monto DECIMAL(16,2) NOT NULL DEFAULT 0,
+    fecha_modificacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT pk_kpi_contador PRIMARY KEY (entidad, clave)
+);
+
+COMMENT ON TABLE kpi_contador IS 'Contadores de vehículos, ventas, clientes y empleados por estado (mantenidos por triggers)';
+COMMENT ON COLUMN kpi_contador.entidad IS 'Entidad contada: vehiculo, vehiculo_marca, venta, cliente, empleado';
+COMMENT ON COLUMN kpi_contador.clave IS 'Estado de la entidad (DISPONIBLE, ACTIVA, etc.), marca_id (vehiculo_marca), TOTAL o CON_COMPRAS (clientes con al menos una venta)';
+COMMENT ON COLUMN kpi_contador.monto IS 'Suma de precio (vehiculo) o total_venta (venta) de las filas contadas';
+
+-- Ventas activas por mes y empleado
+CREATE TABLE kpi_ventas_mes (
+    mes DATE NOT NULL,
+    empleado_id BIGINT NOT NULL,
+    cantidad_ventas BIGINT NOT NULL DEFAULT 0,
+    total_ventas DECIMAL(16,2) NOT NULL DEFAULT 0,
+    fecha_modificacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT pk_kpi_ventas_mes PRIMARY KEY (mes, empleado_id)
+);
+
+COMMENT ON TABLE kpi_ventas_mes IS 'Cantidad e ingresos de ventas ACTIVAS por mes y empleado (mantenida por triggers)';
+COMMENT ON COLUMN kpi_ventas_mes.mes IS 'Primer día del mes de fecha_venta';
+
+-- Métricas por cliente: compras activas, monto acumulado, última compra y
+-- segmento. Una fila por cliente; el segmento es una columna generada, por
+-- lo que los umbrales VIP/FRECUENTE/REGULAR/NUEVO viven solo aquí.
+CREATE TABLE cliente_metricas (
+    cliente_id BIGINT NOT NULL,
+    total_compras BIGINT NOT NULL DEFAULT 0,
+    monto_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    ultima_compra DATE,
+    ventas_registradas BIGINT NOT NULL DEFAULT 0,
+    segmento VARCHAR(20) GENERATED ALWAYS AS (
+        CASE
+            WHEN total_compras >= 5 THEN 'VIP'
+            WHEN total_compras >= 3 THEN 'FRECUENTE'
+            WHEN total_compras >= 1 THEN 'REGULAR'
+            ELSE 'NUEVO'
+        END
+    ) STORED,
+    fecha_modificacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT pk_cliente_metricas PRIMARY KEY (cliente_id),
+    CONSTRAINT fk_cliente_metricas_cliente FOREIGN KEY (cliente_id)
+        REFERENCES cliente(id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE cliente_metricas IS 'Compras ACTIVAS, monto acumulado, última compra y segmento por cliente (mantenida por triggers)';
+COMMENT ON COLUMN cliente_metricas.total_compras IS 'Cantidad de ventas ACTIVAS del cliente';
+COMMENT ON COLUMN cliente_metricas.monto_total IS 'Suma de total_venta de las ventas ACTIVAS';
+COMMENT ON COLUMN cliente_metricas.ultima_compra IS 'fecha_venta más reciente entre las ventas ACTIVAS';
+COMMENT ON COLUMN cliente_metricas.ventas_registradas IS 'Cantidad de ventas del cliente en cualquier estado (al pasar de 0 a 1 o de 1 a 0 ajusta kpi_contador cliente/CON_COMPRAS)';
+COMMENT ON COLUMN cliente_metricas.segmento IS 'VIP (5+), FRECUENTE (3-4), REGULAR (1-2), NUEVO (0)';
+
+CREATE INDEX idx_cliente_metricas_compras ON cliente_metricas(total_compras DESC, monto_total DESC);
+
+-- Cola de trabajos de exportación (PDF / Excel en segundo plano)
+-- Las vistas encolan un trabajo y el worker (python manage.py
+-- procesar_exportaciones) los toma con SELECT ... FOR UPDATE SKIP LOCKED,
+-- de modo que varios workers pueden correr a la vez sin tomar el mismo.
+CREATE TABLE trabajo_exportacion (
+    id BIGSERIAL PRIMARY KEY,
+    tipo_reporte VARCHAR(30) NOT NULL,
+    formato VARCHAR(10) NOT NULL,
+    filtros JSONB NOT NULL DEFAULT '{}'::JSONB,
+    estado VARCHAR(20) NOT NULL DEFAULT 'PENDIENTE',
+    usuario_id INTEGER,
+    nombre_archivo VARCHAR(200),
+    ruta_archivo VARCHAR(500),
+    mensaje_error TEXT,
+    intentos INT NOT NULL DEFAULT 0,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_inicio TIMESTAMP,
+    fecha_fin TIMESTAMP,
+    CONSTRAINT chk_trabajo_formato CHECK (formato IN ('pdf', 'excel')),
+    CONSTRAINT chk_trabajo_estado CHECK (estado IN ('PENDIENTE', 'EN_PROCESO', 'COMPLETADO', 'ERROR'))
+);
+
+COMMENT ON TABLE trabajo_exportacion IS 'Cola de exportaciones de reportes generadas por el worker procesar_exportaciones';
+COMMENT ON COLUMN trabajo_exportacion.usuario_id IS 'auth_user.id de quien solicitó la exportación';
+COMMENT ON COLUMN trabajo_exportacion.ruta_archivo IS 'Ruta del archivo generado en EXPORTACIONES_DIR';
 
+-- Índice parcial: el worker solo busca trabajos pendientes
+CREATE INDEX idx_trabajo_pendiente ON trabajo_exportacion(id) WHERE estado = 'PENDIENTE';
+CREATE INDEX idx_trabajo_usuario ON trabajo_exportacion(usuario_id, fecha_creacion DESC);
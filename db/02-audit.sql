@@ -1,6 +1,7 @@
 
 
 -- Eliminar tablas si existen (para desarrollo)
+DROP TABLE IF EXISTS version_auditoria CASCADE;
 DROP TABLE IF EXISTS aud_errores CASCADE;
 DROP TABLE IF EXISTS aud_vehiculos CASCADE;
 DROP TABLE IF EXISTS aud_ventas CASCADE;
@@ -15,6 +16,7 @@ CREATE TABLE aud_ventas (
     fecha_evento TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     old_data JSONB,
     new_data JSONB,
+    xid_transaccion XID8 NOT NULL DEFAULT pg_current_xact_id(),
     CONSTRAINT chk_aud_ventas_accion CHECK (accion IN ('INSERT', 'UPDATE', 'DELETE'))
 );
 
@@ -26,12 +28,14 @@ COMMENT ON COLUMN aud_ventas.usuario_bd IS 'Usuario de base de datos que realiz
 COMMENT ON COLUMN aud_ventas.fecha_evento IS 'Fecha y hora del evento';
 COMMENT ON COLUMN aud_ventas.old_data IS 'Datos anteriores (JSON) - NULL en INSERT';
 COMMENT ON COLUMN aud_ventas.new_data IS 'Datos nuevos (JSON) - NULL en DELETE';
+COMMENT ON COLUMN aud_ventas.xid_transaccion IS 'Transacción que registró el evento; los refrescos incrementales comparan contra su snapshot porque el id se asigna antes del COMMIT';
 
 -- Índices para consultas de auditoría
 CREATE INDEX idx_aud_ventas_venta_id ON aud_ventas(venta_id);
 CREATE INDEX idx_aud_ventas_fecha ON aud_ventas(fecha_evento);
 CREATE INDEX idx_aud_ventas_accion ON aud_ventas(accion);
 CREATE INDEX idx_aud_ventas_usuario ON aud_ventas(usuario_bd);
+CREATE INDEX idx_aud_ventas_xid ON aud_ventas(xid_transaccion);
 
 -- Tabla de auditoría: Vehículos
 
@@ -89,4 +93,22 @@ CREATE INDEX idx_aud_errores_origen ON aud_errores(origen);
 CREATE INDEX idx_aud_errores_fecha ON aud_errores(fecha_evento);
 CREATE INDEX idx_aud_errores_usuario ON aud_errores(usuario_bd);
 
+-- Versión de los datos auditados (caché de reportes en disco)
+-- Los triggers de auditoría incrementan la fila de su tabla en la misma
+-- transacción del cambio. El UPDATE bloquea la fila hasta el COMMIT, así que
+-- los incrementos se confirman en orden: quien lee la versión N ve todos los
+-- cambios que la produjeron, y un cambio confirmado después siempre da una
+-- versión mayor. MAX(id) o MAX(fecha_evento) de la auditoría no sirven: el id
+-- y la fecha se asignan antes del COMMIT y una transacción lenta puede
+-- confirmarse con valores menores a los ya leídos.
+
+CREATE TABLE version_auditoria (
+    tabla VARCHAR(30) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+COMMENT ON TABLE version_auditoria IS 'Contador de cambios por tabla auditada, incrementado por los triggers de auditoría';
+COMMENT ON COLUMN version_auditoria.tabla IS 'Tabla de auditoría (aud_ventas, aud_vehiculos)';
+COMMENT ON COLUMN version_auditoria.version IS 'Número de sentencias auditadas confirmadas';
 
+INSERT INTO version_auditoria (tabla) VALUES ('aud_ventas'), ('aud_vehiculos');
@@ -83,132 +83,441 @@ COMMENT ON FUNCTION fn_update_estado_vehiculo() IS
 -- Trigger 3: Auditoría de ventas
 -- Requisito: Registro de auditoría automática al modificar, cancelar o eliminar una venta
 -- Se ejecuta AFTER INSERT, UPDATE, DELETE en venta
+-- Es un trigger por sentencia con tablas de transición: una cancelación o
+-- alta masiva genera todas sus filas de auditoría con un solo INSERT ... SELECT.
+-- (PostgreSQL no permite tablas de transición en un trigger con varios
+-- eventos, por eso hay un trigger por evento que comparten la función.)
 
 CREATE OR REPLACE FUNCTION fn_audit_ventas()
 RETURNS TRIGGER AS $$
 DECLARE
-    v_accion VARCHAR(10);
-    v_old_data JSONB;
-    v_new_data JSONB;
-    v_venta_id BIGINT;
+    v_filas BIGINT;
 BEGIN
-    -- Determinar la acción
     IF TG_OP = 'INSERT' THEN
-        v_accion := 'INSERT';
-        v_old_data := NULL;
-        v_new_data := to_jsonb(NEW);
-        v_venta_id := NEW.id;
+        INSERT INTO aud_ventas (venta_id, accion, usuario_bd, fecha_evento, old_data, new_data)
+        SELECT n.id, 'INSERT', CURRENT_USER, CURRENT_TIMESTAMP, NULL, to_jsonb(n)
+        FROM filas_nuevas n;
     ELSIF TG_OP = 'UPDATE' THEN
-        v_accion := 'UPDATE';
-        v_old_data := to_jsonb(OLD);
-        v_new_data := to_jsonb(NEW);
-        v_venta_id := NEW.id;
+        INSERT INTO aud_ventas (venta_id, accion, usuario_bd, fecha_evento, old_data, new_data)
+        SELECT n.id, 'UPDATE', CURRENT_USER, CURRENT_TIMESTAMP, to_jsonb(o), to_jsonb(n)
+        FROM filas_nuevas n
+        JOIN filas_anteriores o ON o.id = n.id;
     ELSIF TG_OP = 'DELETE' THEN
-        v_accion := 'DELETE';
-        v_old_data := to_jsonb(OLD);
-        v_new_data := NULL;
-        v_venta_id := OLD.id;
+        INSERT INTO aud_ventas (venta_id, accion, usuario_bd, fecha_evento, old_data, new_data)
+        SELECT o.id, 'DELETE', CURRENT_USER, CURRENT_TIMESTAMP, to_jsonb(o), NULL
+        FROM filas_anteriores o;
     END IF;
-    
-    -- Insertar registro de auditoría
-    INSERT INTO aud_ventas (
-        venta_id,
-        accion,
-        usuario_bd,
-        fecha_evento,
-        old_data,
-        new_data
-    ) VALUES (
-        v_venta_id,
-        v_accion,
-        CURRENT_USER,
-        CURRENT_TIMESTAMP,
-        v_old_data,
-        v_new_data
-    );
-    
-    -- Retornar el registro apropiado
-    IF TG_OP = 'DELETE' THEN
-        RETURN OLD;
-    ELSE
-        RETURN NEW;
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+
+    -- Nueva versión de los datos para la caché de reportes (ver version_auditoria)
+    IF v_filas > 0 THEN
+        UPDATE version_auditoria SET version = version + 1 WHERE tabla = 'aud_ventas';
     END IF;
+    
+    -- El valor de retorno se ignora en triggers por sentencia
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Crear el trigger
+-- Crear los triggers
 DROP TRIGGER IF EXISTS trg_audit_ventas ON venta;
-CREATE TRIGGER trg_audit_ventas
-    AFTER INSERT OR UPDATE OR DELETE ON venta
-    FOR EACH ROW
+DROP TRIGGER IF EXISTS trg_audit_ventas_insert ON venta;
+DROP TRIGGER IF EXISTS trg_audit_ventas_update ON venta;
+DROP TRIGGER IF EXISTS trg_audit_ventas_delete ON venta;
+
+CREATE TRIGGER trg_audit_ventas_insert
+    AFTER INSERT ON venta
+    REFERENCING NEW TABLE AS filas_nuevas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION fn_audit_ventas();
+
+CREATE TRIGGER trg_audit_ventas_update
+    AFTER UPDATE ON venta
+    REFERENCING OLD TABLE AS filas_anteriores NEW TABLE AS filas_nuevas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION fn_audit_ventas();
+
+CREATE TRIGGER trg_audit_ventas_delete
+    AFTER DELETE ON venta
+    REFERENCING OLD TABLE AS filas_anteriores
+    FOR EACH STATEMENT
     EXECUTE FUNCTION fn_audit_ventas();
 
 COMMENT ON FUNCTION fn_audit_ventas() IS 
-'Registra automáticamente todos los cambios (INSERT/UPDATE/DELETE) en la tabla venta';
+'Registra automáticamente todos los cambios (INSERT/UPDATE/DELETE) en la tabla venta, una sentencia a la vez';
 
 -- Trigger 4: Auditoría de vehículos
 -- Requisito: Registro de auditoría automática en tabla separada (NO UNA SOLA TABLA)
 -- Se ejecuta AFTER INSERT, UPDATE, DELETE en vehiculo
+-- Es un trigger por sentencia con tablas de transición: una cancelación o
+-- alta masiva genera todas sus filas de auditoría con un solo INSERT ... SELECT.
+-- (PostgreSQL no permite tablas de transición en un trigger con varios
+-- eventos, por eso hay un trigger por evento que comparten la función.)
 
 CREATE OR REPLACE FUNCTION fn_audit_vehiculos()
 RETURNS TRIGGER AS $$
 DECLARE
-    v_accion VARCHAR(10);
-    v_old_data JSONB;
-    v_new_data JSONB;
-    v_vehiculo_id BIGINT;
+    v_filas BIGINT;
 BEGIN
-    -- Determinar la acción
     IF TG_OP = 'INSERT' THEN
-        v_accion := 'INSERT';
-        v_old_data := NULL;
-        v_new_data := to_jsonb(NEW);
-        v_vehiculo_id := NEW.id;
+        INSERT INTO aud_vehiculos (vehiculo_id, accion, usuario_bd, fecha_evento, old_data, new_data)
+        SELECT n.id, 'INSERT', CURRENT_USER, CURRENT_TIMESTAMP, NULL, to_jsonb(n)
+        FROM filas_nuevas n;
     ELSIF TG_OP = 'UPDATE' THEN
-        v_accion := 'UPDATE';
-        v_old_data := to_jsonb(OLD);
-        v_new_data := to_jsonb(NEW);
-        v_vehiculo_id := NEW.id;
+        INSERT INTO aud_vehiculos (vehiculo_id, accion, usuario_bd, fecha_evento, old_data, new_data)
+        SELECT n.id, 'UPDATE', CURRENT_USER, CURRENT_TIMESTAMP, to_jsonb(o), to_jsonb(n)
+        FROM filas_nuevas n
+        JOIN filas_anteriores o ON o.id = n.id;
     ELSIF TG_OP = 'DELETE' THEN
-        v_accion := 'DELETE';
-        v_old_data := to_jsonb(OLD);
-        v_new_data := NULL;
-        v_vehiculo_id := OLD.id;
+        INSERT INTO aud_vehiculos (vehiculo_id, accion, usuario_bd, fecha_evento, old_data, new_data)
+        SELECT o.id, 'DELETE', CURRENT_USER, CURRENT_TIMESTAMP, to_jsonb(o), NULL
+        FROM filas_anteriores o;
+    END IF;
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+
+    -- Nueva versión de los datos para la caché de reportes (ver version_auditoria)
+    IF v_filas > 0 THEN
+        UPDATE version_auditoria SET version = version + 1 WHERE tabla = 'aud_vehiculos';
     END IF;
     
-    -- Insertar registro de auditoría
-    INSERT INTO aud_vehiculos (
-        vehiculo_id,
-        accion,
-        usuario_bd,
-        fecha_evento,
-        old_data,
-        new_data
-    ) VALUES (
-        v_vehiculo_id,
-        v_accion,
-        CURRENT_USER,
-        CURRENT_TIMESTAMP,
-        v_old_data,
-        v_new_data
-    );
-    
-    -- Retornar el registro apropiado
+    -- El valor de retorno se ignora en triggers por sentencia
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Crear los triggers
+DROP TRIGGER IF EXISTS trg_audit_vehiculos ON vehiculo;
+DROP TRIGGER IF EXISTS trg_audit_vehiculos_insert ON vehiculo;
+DROP TRIGGER IF EXISTS trg_audit_vehiculos_update ON vehiculo;
+DROP TRIGGER IF EXISTS trg_audit_vehiculos_delete ON vehiculo;
+
+CREATE TRIGGER trg_audit_vehiculos_insert
+    AFTER INSERT ON vehiculo
+    REFERENCING NEW TABLE AS filas_nuevas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION fn_audit_vehiculos();
+
+CREATE TRIGGER trg_audit_vehiculos_update
+    AFTER UPDATE ON vehiculo
+    REFERENCING OLD TABLE AS filas_anteriores NEW TABLE AS filas_nuevas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION fn_audit_vehiculos();
+
+CREATE TRIGGER trg_audit_vehiculos_delete
+    AFTER DELETE ON vehiculo
+    REFERENCING OLD TABLE AS filas_anteriores
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION fn_audit_vehiculos();
+
+COMMENT ON FUNCTION fn_audit_vehiculos() IS 
+'Registra automáticamente todos los cambios (INSERT/UPDATE/DELETE) en la tabla vehiculo, una sentencia a la vez';
+
+-- Trigger 5: Contadores de KPIs
+-- Mantiene kpi_contador y kpi_ventas_mes de forma incremental para que el
+-- inicio, el dashboard y los listados lean O(1) filas en lugar de COUNT(*).
+-- Se disparan en los mismos caminos que fn_update_estado_vehiculo y
+-- fn_audit_ventas (registrar_venta, cancelar_venta, edición de vehículos).
+
+CREATE OR REPLACE FUNCTION fn_kpi_ajustar(
+    p_entidad VARCHAR(20),
+    p_clave VARCHAR(20),
+    p_cantidad BIGINT,
+    p_monto DECIMAL(16,2)
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO kpi_contador (entidad, clave, cantidad, monto)
+    VALUES (p_entidad, p_clave, p_cantidad, COALESCE(p_monto, 0))
+    ON CONFLICT (entidad, clave) DO UPDATE
+    SET cantidad = kpi_contador.cantidad + EXCLUDED.cantidad,
+        monto = kpi_contador.monto + EXCLUDED.monto,
+        fecha_modificacion = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_kpi_ajustar_ventas_mes(
+    p_fecha_venta DATE,
+    p_empleado_id BIGINT,
+    p_cantidad BIGINT,
+    p_monto DECIMAL(16,2)
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO kpi_ventas_mes (mes, empleado_id, cantidad_ventas, total_ventas)
+    VALUES (date_trunc('month', p_fecha_venta)::DATE, p_empleado_id, p_cantidad, COALESCE(p_monto, 0))
+    ON CONFLICT (mes, empleado_id) DO UPDATE
+    SET cantidad_ventas = kpi_ventas_mes.cantidad_ventas + EXCLUDED.cantidad_ventas,
+        total_ventas = kpi_ventas_mes.total_ventas + EXCLUDED.total_ventas,
+        fecha_modificacion = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Vehículos: cantidad y suma de precios por estado_disponibilidad y por
+-- marca (entidad vehiculo_marca, clave = marca_id; precio promedio por marca
+-- del análisis de inventario)
+CREATE OR REPLACE FUNCTION fn_kpi_vehiculos()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_cambia_marca BOOLEAN;
+BEGIN
+    v_cambia_marca := TG_OP <> 'UPDATE'
+        OR OLD.marca_id IS DISTINCT FROM NEW.marca_id
+        OR OLD.precio IS DISTINCT FROM NEW.precio;
+
+    IF TG_OP = 'UPDATE'
+       AND NOT v_cambia_marca
+       AND OLD.estado_disponibilidad IS NOT DISTINCT FROM NEW.estado_disponibilidad THEN
+        RETURN NEW;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM fn_kpi_ajustar('vehiculo', OLD.estado_disponibilidad, -1, -OLD.precio);
+        IF v_cambia_marca THEN
+            PERFORM fn_kpi_ajustar('vehiculo_marca', OLD.marca_id::VARCHAR, -1, -OLD.precio);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM fn_kpi_ajustar('vehiculo', NEW.estado_disponibilidad, 1, NEW.precio);
+        IF v_cambia_marca THEN
+            PERFORM fn_kpi_ajustar('vehiculo_marca', NEW.marca_id::VARCHAR, 1, NEW.precio);
+        END IF;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_kpi_vehiculos ON vehiculo;
+CREATE TRIGGER trg_kpi_vehiculos
+    AFTER INSERT OR UPDATE OF estado_disponibilidad, precio, marca_id OR DELETE ON vehiculo
+    FOR EACH ROW
+    EXECUTE FUNCTION fn_kpi_vehiculos();
+
+COMMENT ON FUNCTION fn_kpi_vehiculos() IS 
+'Actualiza kpi_contador (entidades vehiculo y vehiculo_marca) al insertar, eliminar o cambiar estado/precio/marca de un vehículo';
+
+-- Ventas: cantidad y monto por estado_venta + ventas activas por mes y empleado
+CREATE OR REPLACE FUNCTION fn_kpi_ventas()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.estado_venta IS NOT DISTINCT FROM NEW.estado_venta
+       AND OLD.total_venta IS NOT DISTINCT FROM NEW.total_venta
+       AND OLD.fecha_venta IS NOT DISTINCT FROM NEW.fecha_venta
+       AND OLD.empleado_id IS NOT DISTINCT FROM NEW.empleado_id THEN
+        RETURN NEW;
+    END IF;
+
+    -- Restar la contribución anterior
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM fn_kpi_ajustar('venta', OLD.estado_venta, -1, -OLD.total_venta);
+        IF OLD.estado_venta = 'ACTIVA' THEN
+            PERFORM fn_kpi_ajustar_ventas_mes(OLD.fecha_venta, OLD.empleado_id, -1, -OLD.total_venta);
+        END IF;
+    END IF;
+
+    -- Sumar la contribución nueva
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM fn_kpi_ajustar('venta', NEW.estado_venta, 1, NEW.total_venta);
+        IF NEW.estado_venta = 'ACTIVA' THEN
+            PERFORM fn_kpi_ajustar_ventas_mes(NEW.fecha_venta, NEW.empleado_id, 1, NEW.total_venta);
+        END IF;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_kpi_ventas ON venta;
+CREATE TRIGGER trg_kpi_ventas
+    AFTER INSERT OR UPDATE OR DELETE ON venta
+    FOR EACH ROW
+    EXECUTE FUNCTION fn_kpi_ventas();
+
+COMMENT ON FUNCTION fn_kpi_ventas() IS 
+'Actualiza kpi_contador (entidad venta) y kpi_ventas_mes al registrar, cancelar, modificar o eliminar ventas';
+
+-- Clientes y empleados: conteos por estado
+CREATE OR REPLACE FUNCTION fn_kpi_personas()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_old_clave VARCHAR(20);
+    v_new_clave VARCHAR(20);
+BEGIN
+    IF TG_TABLE_NAME = 'empleado' THEN
+        IF TG_OP <> 'INSERT' THEN v_old_clave := OLD.estado; END IF;
+        IF TG_OP <> 'DELETE' THEN v_new_clave := NEW.estado; END IF;
+    ELSE
+        v_old_clave := 'TOTAL';
+        v_new_clave := 'TOTAL';
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND v_old_clave IS NOT DISTINCT FROM v_new_clave THEN
+        RETURN NEW;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM fn_kpi_ajustar(TG_TABLE_NAME::VARCHAR, v_old_clave, -1, 0);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM fn_kpi_ajustar(TG_TABLE_NAME::VARCHAR, v_new_clave, 1, 0);
+    END IF;
+
     IF TG_OP = 'DELETE' THEN
         RETURN OLD;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_kpi_clientes ON cliente;
+CREATE TRIGGER trg_kpi_clientes
+    AFTER INSERT OR DELETE ON cliente
+    FOR EACH ROW
+    EXECUTE FUNCTION fn_kpi_personas();
+
+DROP TRIGGER IF EXISTS trg_kpi_empleados ON empleado;
+CREATE TRIGGER trg_kpi_empleados
+    AFTER INSERT OR UPDATE OF estado OR DELETE ON empleado
+    FOR EACH ROW
+    EXECUTE FUNCTION fn_kpi_personas();
+
+COMMENT ON FUNCTION fn_kpi_personas() IS 
+'Actualiza kpi_contador para clientes (TOTAL) y empleados (por estado)';
+
+-- Trigger 6: Métricas por cliente
+-- Mantiene cliente_metricas al registrar, cancelar (cancelar_venta cambia
+-- estado_venta a CANCELADA), modificar o eliminar ventas, y crea la fila en
+-- cero al dar de alta un cliente. Solo cuentan las ventas ACTIVAS.
+
+CREATE OR REPLACE FUNCTION fn_cliente_metricas_ajustar(
+    p_cliente_id BIGINT,
+    p_cantidad BIGINT,
+    p_monto DECIMAL(14,2),
+    p_fecha_venta DATE
+)
+RETURNS VOID AS $$
+BEGIN
+    IF p_cantidad > 0 THEN
+        INSERT INTO cliente_metricas (cliente_id, total_compras, monto_total, ultima_compra)
+        VALUES (p_cliente_id, p_cantidad, COALESCE(p_monto, 0), p_fecha_venta)
+        ON CONFLICT (cliente_id) DO UPDATE
+        SET total_compras = cliente_metricas.total_compras + EXCLUDED.total_compras,
+            monto_total = cliente_metricas.monto_total + EXCLUDED.monto_total,
+            ultima_compra = GREATEST(cliente_metricas.ultima_compra, EXCLUDED.ultima_compra),
+            fecha_modificacion = CURRENT_TIMESTAMP;
     ELSE
+        -- Al quitar una venta solo se recalcula la última compra si era esa fecha
+        -- (usa el índice idx_venta_cliente)
+        UPDATE cliente_metricas m
+        SET total_compras = m.total_compras + p_cantidad,
+            monto_total = m.monto_total + COALESCE(p_monto, 0),
+            ultima_compra = CASE
+                WHEN m.ultima_compra IS DISTINCT FROM p_fecha_venta THEN m.ultima_compra
+                ELSE (SELECT MAX(v.fecha_venta) FROM venta v
+                      WHERE v.cliente_id = p_cliente_id AND v.estado_venta = 'ACTIVA')
+            END,
+            fecha_modificacion = CURRENT_TIMESTAMP
+        WHERE m.cliente_id = p_cliente_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Ventas del cliente en cualquier estado. Cuando el cliente pasa de 0 a 1
+-- venta (o de 1 a 0) ajusta kpi_contador cliente/CON_COMPRAS, que lee el
+-- listado de clientes en lugar de un COUNT(DISTINCT) sobre venta. El UPSERT
+-- bloquea la fila del cliente, así que dos ventas concurrentes del mismo
+-- cliente ven el total de la otra y solo una cuenta la transición.
+CREATE OR REPLACE FUNCTION fn_cliente_metricas_registradas(
+    p_cliente_id BIGINT,
+    p_cantidad BIGINT
+)
+RETURNS VOID AS $$
+DECLARE
+    v_total BIGINT;
+BEGIN
+    INSERT INTO cliente_metricas (cliente_id, ventas_registradas)
+    VALUES (p_cliente_id, p_cantidad)
+    ON CONFLICT (cliente_id) DO UPDATE
+    SET ventas_registradas = cliente_metricas.ventas_registradas + EXCLUDED.ventas_registradas,
+        fecha_modificacion = CURRENT_TIMESTAMP
+    RETURNING ventas_registradas INTO v_total;
+
+    IF p_cantidad > 0 AND v_total = p_cantidad THEN
+        PERFORM fn_kpi_ajustar('cliente', 'CON_COMPRAS', 1, 0);
+    ELSIF p_cantidad < 0 AND v_total = 0 THEN
+        PERFORM fn_kpi_ajustar('cliente', 'CON_COMPRAS', -1, 0);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_cliente_metricas_ventas()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE'
+       OR (TG_OP = 'UPDATE' AND OLD.cliente_id IS DISTINCT FROM NEW.cliente_id) THEN
+        PERFORM fn_cliente_metricas_registradas(OLD.cliente_id, -1);
+    END IF;
+    IF TG_OP = 'INSERT'
+       OR (TG_OP = 'UPDATE' AND OLD.cliente_id IS DISTINCT FROM NEW.cliente_id) THEN
+        PERFORM fn_cliente_metricas_registradas(NEW.cliente_id, 1);
+    END IF;
+
+    IF TG_OP = 'UPDATE'
+       AND OLD.estado_venta IS NOT DISTINCT FROM NEW.estado_venta
+       AND OLD.total_venta IS NOT DISTINCT FROM NEW.total_venta
+       AND OLD.fecha_venta IS NOT DISTINCT FROM NEW.fecha_venta
+       AND OLD.cliente_id IS NOT DISTINCT FROM NEW.cliente_id THEN
         RETURN NEW;
     END IF;
+
+    -- Restar la contribución anterior
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.estado_venta = 'ACTIVA' THEN
+        PERFORM fn_cliente_metricas_ajustar(OLD.cliente_id, -1, -OLD.total_venta, OLD.fecha_venta);
+    END IF;
+
+    -- Sumar la contribución nueva
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.estado_venta = 'ACTIVA' THEN
+        PERFORM fn_cliente_metricas_ajustar(NEW.cliente_id, 1, NEW.total_venta, NEW.fecha_venta);
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
 
--- Crear el trigger
-DROP TRIGGER IF EXISTS trg_audit_vehiculos ON vehiculo;
-CREATE TRIGGER trg_audit_vehiculos
-    AFTER INSERT OR UPDATE OR DELETE ON vehiculo
+DROP TRIGGER IF EXISTS trg_cliente_metricas_ventas ON venta;
+CREATE TRIGGER trg_cliente_metricas_ventas
+    AFTER INSERT OR UPDATE OR DELETE ON venta
     FOR EACH ROW
-    EXECUTE FUNCTION fn_audit_vehiculos();
+    EXECUTE FUNCTION fn_cliente_metricas_ventas();
 
-COMMENT ON FUNCTION fn_audit_vehiculos() IS 
-'Registra automáticamente todos los cambios (INSERT/UPDATE/DELETE) en la tabla vehiculo';
+COMMENT ON FUNCTION fn_cliente_metricas_ventas() IS 
+'Actualiza cliente_metricas (y kpi_contador cliente/CON_COMPRAS) al registrar, cancelar, modificar o eliminar ventas';
+
+CREATE OR REPLACE FUNCTION fn_cliente_metricas_alta()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO cliente_metricas (cliente_id)
+    VALUES (NEW.id)
+    ON CONFLICT (cliente_id) DO NOTHING;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_cliente_metricas_alta ON cliente;
+CREATE TRIGGER trg_cliente_metricas_alta
+    AFTER INSERT ON cliente
+    FOR EACH ROW
+    EXECUTE FUNCTION fn_cliente_metricas_alta();
 
+COMMENT ON FUNCTION fn_cliente_metricas_alta() IS 
+'Crea la fila de cliente_metricas (en cero) al registrar un cliente';
@@ -148,6 +148,237 @@ $$ LANGUAGE plpgsql;
 COMMENT ON FUNCTION registrar_venta IS 
 'Registra una nueva venta con validaciones, transacción atómica y manejo de errores. Aplica descuentos del 5% si es temporada o cliente frecuente.';
 
+-- Función 1b: Registrar venta por lote
+-- Registra varios vehículos para un mismo cliente en una sola venta
+-- (ventas de flotilla). Valida todos los vehículos con una sola consulta,
+-- inserta el detalle con un INSERT ... SELECT sobre los arreglos y reporta
+-- el resultado por vehículo. Los errores de validación se registran en
+-- UNA fila de aud_errores por lote (no una por vehículo).
+
+CREATE OR REPLACE FUNCTION registrar_venta_lote(
+    p_cliente_id BIGINT,
+    p_empleado_id BIGINT,
+    p_metodo_pago_id BIGINT,
+    p_vehiculo_ids BIGINT[],
+    p_precios DECIMAL(10,2)[],
+    p_descuento_temporada BOOLEAN DEFAULT FALSE,
+    p_cliente_frecuente BOOLEAN DEFAULT FALSE,
+    p_permitir_parcial BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (
+    vehiculo_id BIGINT,
+    venta_id BIGINT,
+    error TEXT
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_venta_id BIGINT;
+    v_subtotal DECIMAL(12,2);
+    v_descuento DECIMAL(12,2);
+    v_total DECIMAL(12,2);
+    v_porcentaje_descuento DECIMAL(5,2);
+    v_ok_ids BIGINT[];
+    v_ok_precios DECIMAL(10,2)[];
+    v_errores JSONB;
+BEGIN
+    -- Validaciones de la cabecera (iguales a registrar_venta)
+    IF NOT EXISTS (SELECT 1 FROM cliente WHERE id = p_cliente_id) THEN
+        RAISE EXCEPTION 'Cliente con ID % no existe', p_cliente_id;
+    END IF;
+    
+    IF NOT EXISTS (SELECT 1 FROM empleado WHERE id = p_empleado_id AND estado = 'ACTIVO') THEN
+        RAISE EXCEPTION 'Empleado con ID % no existe o no está activo', p_empleado_id;
+    END IF;
+    
+    IF NOT EXISTS (SELECT 1 FROM metodo_pago WHERE id = p_metodo_pago_id) THEN
+        RAISE EXCEPTION 'Método de pago con ID % no existe', p_metodo_pago_id;
+    END IF;
+    
+    IF COALESCE(cardinality(p_vehiculo_ids), 0) = 0 THEN
+        RAISE EXCEPTION 'El lote no tiene vehículos';
+    END IF;
+    
+    IF cardinality(p_vehiculo_ids) <> COALESCE(cardinality(p_precios), 0) THEN
+        RAISE EXCEPTION 'Se recibieron % vehículos y % precios',
+            cardinality(p_vehiculo_ids), COALESCE(cardinality(p_precios), 0);
+    END IF;
+    
+    -- Bloquear los vehículos del lote (en orden de ID para evitar deadlocks
+    -- entre lotes concurrentes) antes de validar su disponibilidad
+    PERFORM 1
+    FROM vehiculo v
+    WHERE v.id = ANY(p_vehiculo_ids)
+    ORDER BY v.id
+    FOR UPDATE;
+    
+    -- Validar todos los vehículos en una sola consulta
+    WITH entrada AS (
+        SELECT e.vehiculo_id, e.precio, e.posicion,
+               ROW_NUMBER() OVER (PARTITION BY e.vehiculo_id ORDER BY e.posicion) AS repeticion
+        FROM unnest(p_vehiculo_ids, p_precios) WITH ORDINALITY AS e(vehiculo_id, precio, posicion)
+    ),
+    validacion AS (
+        SELECT en.vehiculo_id, en.precio, en.posicion,
+               CASE
+                   WHEN en.vehiculo_id IS NULL THEN 'El ID de vehículo es obligatorio'
+                   WHEN en.repeticion > 1 THEN
+                       format('El vehículo con ID %s está repetido en el lote', en.vehiculo_id)
+                   WHEN en.precio IS NULL OR en.precio <= 0 THEN 'El precio debe ser mayor a 0'
+                   WHEN v.id IS NULL THEN
+                       format('El vehículo con ID %s no existe', en.vehiculo_id)
+                   WHEN v.estado_disponibilidad <> 'DISPONIBLE' THEN
+                       format('El vehículo %s %s (ID: %s) no está disponible. Estado actual: %s',
+                              m.nombre, v.modelo, en.vehiculo_id, v.estado_disponibilidad)
+               END AS error
+        FROM entrada en
+        LEFT JOIN vehiculo v ON v.id = en.vehiculo_id
+        LEFT JOIN marca m ON m.id = v.marca_id
+    )
+    SELECT array_agg(vehiculo_id ORDER BY posicion) FILTER (WHERE error IS NULL),
+           array_agg(precio ORDER BY posicion) FILTER (WHERE error IS NULL),
+           jsonb_agg(jsonb_build_object('posicion', posicion, 'vehiculo_id', vehiculo_id, 'error', error)
+                     ORDER BY posicion) FILTER (WHERE error IS NOT NULL)
+    INTO v_ok_ids, v_ok_precios, v_errores
+    FROM validacion;
+    
+    -- Un solo registro en aud_errores con todos los rechazos del lote
+    IF v_errores IS NOT NULL THEN
+        INSERT INTO aud_errores (
+            origen,
+            detalle,
+            sqlstate,
+            sqlerrm,
+            usuario_bd,
+            fecha_evento,
+            contexto
+        ) VALUES (
+            'registrar_venta_lote',
+            format('Lote con %s de %s vehículo(s) rechazado(s). Cliente: %s',
+                   jsonb_array_length(v_errores), cardinality(p_vehiculo_ids), p_cliente_id),
+            'P0001',
+            v_errores -> 0 ->> 'error',
+            CURRENT_USER,
+            CURRENT_TIMESTAMP,
+            jsonb_build_object(
+                'cliente_id', p_cliente_id,
+                'empleado_id', p_empleado_id,
+                'permitir_parcial', p_permitir_parcial,
+                'errores', v_errores
+            )
+        );
+    END IF;
+    
+    -- Sin vehículos válidos, o con errores en modo todo-o-nada: no se registra nada
+    IF v_ok_ids IS NULL OR (v_errores IS NOT NULL AND NOT p_permitir_parcial) THEN
+        RETURN QUERY
+        SELECT e.vehiculo_id, NULL::BIGINT,
+               COALESCE(
+                   (SELECT x ->> 'error' FROM jsonb_array_elements(v_errores) AS x
+                    WHERE (x ->> 'posicion')::BIGINT = e.posicion),
+                   'No registrado: el lote tiene vehículos con errores'
+               )
+        FROM unnest(p_vehiculo_ids) WITH ORDINALITY AS e(vehiculo_id, posicion)
+        ORDER BY e.posicion;
+        RETURN;
+    END IF;
+    
+    -- Totales (mismo cálculo de descuentos que registrar_venta)
+    SELECT SUM(precio) INTO v_subtotal FROM unnest(v_ok_precios) AS precio;
+    
+    v_porcentaje_descuento := 0;
+    IF p_descuento_temporada THEN
+        v_porcentaje_descuento := v_porcentaje_descuento + 10.00;
+    END IF;
+    IF p_cliente_frecuente THEN
+        v_porcentaje_descuento := v_porcentaje_descuento + 5.00;
+    END IF;
+    
+    v_descuento := v_subtotal * (v_porcentaje_descuento / 100);
+    v_total := v_subtotal - v_descuento;
+    
+    INSERT INTO venta (
+        cliente_id,
+        empleado_id,
+        metodo_pago_id,
+        fecha_venta,
+        total_venta,
+        descuento_aplicado,
+        estado_venta
+    ) VALUES (
+        p_cliente_id,
+        p_empleado_id,
+        p_metodo_pago_id,
+        CURRENT_DATE,
+        v_total,
+        v_descuento,
+        'ACTIVA'
+    ) RETURNING id INTO v_venta_id;
+    
+    -- Detalle en un solo INSERT; los triggers de detalle_venta siguen
+    -- validando disponibilidad y marcando cada vehículo como VENDIDO
+    INSERT INTO detalle_venta (
+        venta_id,
+        vehiculo_id,
+        cantidad,
+        precio_unitario,
+        subtotal
+    )
+    SELECT v_venta_id, d.vehiculo_id, 1, d.precio, d.precio
+    FROM unnest(v_ok_ids, v_ok_precios) AS d(vehiculo_id, precio);
+    
+    RAISE NOTICE 'Venta por lote registrada. ID: %, Vehículos: %, Total: $%',
+        v_venta_id, cardinality(v_ok_ids), v_total;
+    
+    RETURN QUERY
+    SELECT e.vehiculo_id,
+           CASE WHEN e.vehiculo_id = ANY(v_ok_ids) AND x.error IS NULL THEN v_venta_id END,
+           x.error
+    FROM unnest(p_vehiculo_ids) WITH ORDINALITY AS e(vehiculo_id, posicion)
+    LEFT JOIN LATERAL (
+        SELECT y ->> 'error' AS error
+        FROM jsonb_array_elements(COALESCE(v_errores, '[]'::JSONB)) AS y
+        WHERE (y ->> 'posicion')::BIGINT = e.posicion
+    ) x ON TRUE
+    ORDER BY e.posicion;
+    
+EXCEPTION
+    WHEN OTHERS THEN
+        -- Error de cabecera o inesperado: un registro de auditoría y el
+        -- mismo mensaje para todos los vehículos del lote
+        INSERT INTO aud_errores (
+            origen,
+            detalle,
+            sqlstate,
+            sqlerrm,
+            usuario_bd,
+            fecha_evento,
+            contexto
+        ) VALUES (
+            'registrar_venta_lote',
+            format('Error al registrar venta por lote. Cliente: %s, Vehículos: %s',
+                   p_cliente_id, COALESCE(cardinality(p_vehiculo_ids), 0)),
+            SQLSTATE,
+            SQLERRM,
+            CURRENT_USER,
+            CURRENT_TIMESTAMP,
+            jsonb_build_object(
+                'cliente_id', p_cliente_id,
+                'empleado_id', p_empleado_id,
+                'vehiculo_ids', to_jsonb(p_vehiculo_ids),
+                'precios', to_jsonb(p_precios)
+            )
+        );
+        
+        RETURN QUERY
+        SELECT e.vehiculo_id, NULL::BIGINT, SQLERRM::TEXT
+        FROM unnest(p_vehiculo_ids) WITH ORDINALITY AS e(vehiculo_id, posicion)
+        ORDER BY e.posicion;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION registrar_venta_lote IS 
+'Registra varios vehículos para un cliente en una sola venta con inserts basados en conjuntos. Devuelve una fila por vehículo (venta_id o error) y registra los rechazos en un único aud_errores por lote.';
+
 -- Función 2: Cancelar venta
 -- Cancela una venta y libera automáticamente los vehículos asociados
 -- Incluye manejo de errores con transacción atómica
@@ -178,6 +409,7 @@ BEGIN
     -- INICIAR TRANSACCIÓN (implícita en PostgreSQL)
     
     -- Actualizar el estado de la venta a CANCELADA
+    -- (los triggers descuentan la venta de kpi_contador, kpi_ventas_mes y cliente_metricas)
     UPDATE venta
     SET estado_venta = 'CANCELADA',
         fecha_modificacion = CURRENT_TIMESTAMP
@@ -233,6 +465,147 @@ $$ LANGUAGE plpgsql;
 COMMENT ON FUNCTION cancelar_venta IS 
 'Cancela una venta y libera automáticamente los vehículos asociados (regresa a DISPONIBLE). Incluye manejo de errores con TRY/CATCH.';
 
+-- Función 2b: Cancelar ventas por lote
+-- Cancela un conjunto de ventas con sentencias basadas en conjuntos: un
+-- UPDATE para las ventas, un UPDATE para liberar sus vehículos y, por los
+-- triggers de auditoría por sentencia, un INSERT por tabla de auditoría.
+-- Devuelve el resultado por cada ID recibido y registra los rechazos en
+-- un único aud_errores por lote.
+
+CREATE OR REPLACE FUNCTION cancelar_ventas_lote(
+    p_venta_ids BIGINT[]
+)
+RETURNS TABLE (
+    venta_id BIGINT,
+    cancelada BOOLEAN,
+    vehiculos_liberados INT,
+    error TEXT
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_validas BIGINT[];
+    v_errores JSONB;
+BEGIN
+    IF COALESCE(cardinality(p_venta_ids), 0) = 0 THEN
+        RETURN;
+    END IF;
+    
+    -- Bloquear las ventas (en orden de ID para evitar deadlocks) antes de validar
+    PERFORM 1
+    FROM venta v
+    WHERE v.id = ANY(p_venta_ids)
+    ORDER BY v.id
+    FOR UPDATE;
+    
+    -- Validar todas las ventas en una sola consulta
+    WITH entrada AS (
+        SELECT e.venta_id, e.posicion,
+               ROW_NUMBER() OVER (PARTITION BY e.venta_id ORDER BY e.posicion) AS repeticion
+        FROM unnest(p_venta_ids) WITH ORDINALITY AS e(venta_id, posicion)
+    ),
+    validacion AS (
+        SELECT en.venta_id, en.posicion,
+               CASE
+                   WHEN en.venta_id IS NULL THEN 'El ID de venta es obligatorio'
+                   WHEN en.repeticion > 1 THEN
+                       format('La venta con ID %s está repetida en el lote', en.venta_id)
+                   WHEN v.id IS NULL THEN format('Venta con ID %s no existe', en.venta_id)
+                   WHEN v.estado_venta = 'CANCELADA' THEN
+                       format('La venta con ID %s ya está cancelada', en.venta_id)
+               END AS error
+        FROM entrada en
+        LEFT JOIN venta v ON v.id = en.venta_id
+    )
+    SELECT array_agg(venta_id) FILTER (WHERE error IS NULL),
+           jsonb_agg(jsonb_build_object('posicion', posicion, 'venta_id', venta_id, 'error', error)
+                     ORDER BY posicion) FILTER (WHERE error IS NOT NULL)
+    INTO v_validas, v_errores
+    FROM validacion;
+    
+    IF v_validas IS NOT NULL THEN
+        UPDATE venta
+        SET estado_venta = 'CANCELADA',
+            fecha_modificacion = CURRENT_TIMESTAMP
+        WHERE id = ANY(v_validas);
+        
+        -- Liberar los vehículos de todas las ventas canceladas
+        UPDATE vehiculo ve
+        SET estado_disponibilidad = 'DISPONIBLE',
+            fecha_modificacion = CURRENT_TIMESTAMP
+        FROM detalle_venta dv
+        WHERE dv.venta_id = ANY(v_validas)
+          AND ve.id = dv.vehiculo_id;
+        
+        RAISE NOTICE '% venta(s) cancelada(s) por lote', cardinality(v_validas);
+    END IF;
+    
+    IF v_errores IS NOT NULL THEN
+        INSERT INTO aud_errores (
+            origen,
+            detalle,
+            sqlstate,
+            sqlerrm,
+            usuario_bd,
+            fecha_evento,
+            contexto
+        ) VALUES (
+            'cancelar_ventas_lote',
+            format('Lote con %s de %s venta(s) rechazada(s)',
+                   jsonb_array_length(v_errores), cardinality(p_venta_ids)),
+            'P0001',
+            v_errores -> 0 ->> 'error',
+            CURRENT_USER,
+            CURRENT_TIMESTAMP,
+            jsonb_build_object('errores', v_errores)
+        );
+    END IF;
+    
+    RETURN QUERY
+    SELECT e.venta_id,
+           x.error IS NULL,
+           CASE WHEN x.error IS NULL THEN
+               (SELECT COUNT(*)::INT FROM detalle_venta dv WHERE dv.venta_id = e.venta_id)
+           ELSE 0 END,
+           x.error
+    FROM unnest(p_venta_ids) WITH ORDINALITY AS e(venta_id, posicion)
+    LEFT JOIN LATERAL (
+        SELECT y ->> 'error' AS error
+        FROM jsonb_array_elements(COALESCE(v_errores, '[]'::JSONB)) AS y
+        WHERE (y ->> 'posicion')::BIGINT = e.posicion
+    ) x ON TRUE
+    ORDER BY e.posicion;
+    
+EXCEPTION
+    WHEN OTHERS THEN
+        -- Error inesperado: no se cancela ninguna venta del lote
+        INSERT INTO aud_errores (
+            origen,
+            detalle,
+            sqlstate,
+            sqlerrm,
+            usuario_bd,
+            fecha_evento,
+            contexto
+        ) VALUES (
+            'cancelar_ventas_lote',
+            format('Error al cancelar %s venta(s) por lote', cardinality(p_venta_ids)),
+            SQLSTATE,
+            SQLERRM,
+            CURRENT_USER,
+            CURRENT_TIMESTAMP,
+            jsonb_build_object('venta_ids', to_jsonb(p_venta_ids))
+        );
+        
+        RETURN QUERY
+        SELECT e.venta_id, FALSE, 0, SQLERRM::TEXT
+        FROM unnest(p_venta_ids) WITH ORDINALITY AS e(venta_id, posicion)
+        ORDER BY e.posicion;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION cancelar_ventas_lote IS 
+'Cancela varias ventas y libera sus vehículos con sentencias basadas en conjuntos. Devuelve una fila por ID (cancelada, vehículos liberados o error) y registra los rechazos en un único aud_errores por lote.';
+
 -- Función 3: Historial de compras de un cliente
 -- Consulta el historial completo de compras con información detallada
 
@@ -359,7 +732,10 @@ BEGIN
     INNER JOIN venta vt ON dv.venta_id = vt.id
     WHERE 
         vt.estado_venta = 'ACTIVA'
-        AND (p_anio IS NULL OR EXTRACT(YEAR FROM vt.fecha_venta) = p_anio)
+        -- Rango [1 ene, 1 ene siguiente) en lugar de EXTRACT(YEAR ...) para
+        -- poder usar idx_venta_fecha_estado
+        AND (p_anio IS NULL OR (vt.fecha_venta >= make_date(p_anio, 1, 1)
+                                AND vt.fecha_venta < make_date(p_anio + 1, 1, 1)))
     GROUP BY m.nombre, v.modelo
     ORDER BY cantidad_vendida DESC, total_ventas DESC
     LIMIT p_limite;
@@ -382,27 +758,171 @@ RETURNS TABLE (
     clasificacion VARCHAR(20)
 ) AS $$
 BEGIN
+    -- Lee cliente_metricas (mantenida por triggers) en lugar de agrupar venta
     RETURN QUERY
     SELECT 
         c.id AS cliente_id,
         c.nombre_completo,
         c.email,
-        COUNT(v.id) AS total_compras,
-        COALESCE(SUM(v.total_venta), 0) AS monto_total,
-        CASE 
-            WHEN COUNT(v.id) >= 5 THEN 'VIP'
-            WHEN COUNT(v.id) >= 3 THEN 'FRECUENTE'
-            WHEN COUNT(v.id) >= 1 THEN 'REGULAR'
-            ELSE 'NUEVO'
-        END::VARCHAR(20) AS clasificacion
+        m.total_compras,
+        m.monto_total::DECIMAL(12,2),
+        m.segmento AS clasificacion
     FROM cliente c
-    LEFT JOIN venta v ON c.id = v.cliente_id AND v.estado_venta = 'ACTIVA'
-    GROUP BY c.id, c.nombre_completo, c.email
-    ORDER BY total_compras DESC, monto_total DESC;
+    JOIN cliente_metricas m ON m.cliente_id = c.id
+    ORDER BY m.total_compras DESC, m.monto_total DESC;
 END;
 $$ LANGUAGE plpgsql;
 
 COMMENT ON FUNCTION clasificar_clientes IS 
-'Clasifica clientes por frecuencia de compra usando CASE: VIP (5+), FRECUENTE (3-4), REGULAR (1-2), NUEVO (0).';
+'Clasifica clientes por frecuencia de compra desde cliente_metricas: VIP (5+), FRECUENTE (3-4), REGULAR (1-2), NUEVO (0).';
+
+-- Función 7: Reconstruir contadores de KPIs
+-- Recalcula kpi_contador, kpi_ventas_mes y cliente_metricas desde cero a partir de las tablas base.
+-- Bloquea escrituras en las tablas base mientras dura para obtener una foto consistente.
+
+CREATE OR REPLACE FUNCTION recalcular_kpis()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE vehiculo, venta, cliente, empleado IN SHARE MODE;
+
+    DELETE FROM kpi_contador;
+    DELETE FROM kpi_ventas_mes;
+    DELETE FROM cliente_metricas;
+
+    INSERT INTO kpi_contador (entidad, clave, cantidad, monto)
+    SELECT 'vehiculo', estado_disponibilidad, COUNT(*), COALESCE(SUM(precio), 0)
+    FROM vehiculo
+    GROUP BY estado_disponibilidad
+    UNION ALL
+    SELECT 'vehiculo_marca', marca_id::VARCHAR, COUNT(*), COALESCE(SUM(precio), 0)
+    FROM vehiculo
+    GROUP BY marca_id
+    UNION ALL
+    SELECT 'venta', estado_venta, COUNT(*), COALESCE(SUM(total_venta), 0)
+    FROM venta
+    GROUP BY estado_venta
+    UNION ALL
+    SELECT 'cliente', 'TOTAL', COUNT(*), 0
+    FROM cliente
+    UNION ALL
+    SELECT 'cliente', 'CON_COMPRAS', COUNT(DISTINCT cliente_id), 0
+    FROM venta
+    UNION ALL
+    SELECT 'empleado', estado, COUNT(*), 0
+    FROM empleado
+    GROUP BY estado;
+
+    INSERT INTO kpi_ventas_mes (mes, empleado_id, cantidad_ventas, total_ventas)
+    SELECT date_trunc('month', fecha_venta)::DATE, empleado_id, COUNT(*), SUM(total_venta)
+    FROM venta
+    WHERE estado_venta = 'ACTIVA'
+    GROUP BY date_trunc('month', fecha_venta)::DATE, empleado_id;
 
+    INSERT INTO cliente_metricas (cliente_id, total_compras, monto_total, ultima_compra, ventas_registradas)
+    SELECT c.id,
+           COUNT(v.id) FILTER (WHERE v.estado_venta = 'ACTIVA'),
+           COALESCE(SUM(v.total_venta) FILTER (WHERE v.estado_venta = 'ACTIVA'), 0),
+           MAX(v.fecha_venta) FILTER (WHERE v.estado_venta = 'ACTIVA'),
+           COUNT(v.id)
+    FROM cliente c
+    LEFT JOIN venta v ON v.cliente_id = c.id
+    GROUP BY c.id;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION recalcular_kpis IS 
+'Reconstruye desde cero las tablas kpi_contador, kpi_ventas_mes y cliente_metricas.';
+
+-- Función 8: Verificar contadores de KPIs
+-- Compara los contadores guardados con un recálculo completo y devuelve solo las diferencias
+
+CREATE OR REPLACE FUNCTION verificar_kpis()
+RETURNS TABLE (
+    origen VARCHAR(20),
+    clave TEXT,
+    cantidad_guardada BIGINT,
+    cantidad_real BIGINT,
+    monto_guardado DECIMAL(16,2),
+    monto_real DECIMAL(16,2)
+) AS $$
+BEGIN
+    RETURN QUERY
+    WITH real_contador AS (
+        SELECT 'vehiculo'::VARCHAR AS entidad, estado_disponibilidad::VARCHAR AS clave,
+               COUNT(*) AS cantidad, COALESCE(SUM(precio), 0) AS monto
+        FROM vehiculo GROUP BY estado_disponibilidad
+        UNION ALL
+        SELECT 'vehiculo_marca', marca_id::VARCHAR, COUNT(*), COALESCE(SUM(precio), 0)
+        FROM vehiculo GROUP BY marca_id
+        UNION ALL
+        SELECT 'venta', estado_venta, COUNT(*), COALESCE(SUM(total_venta), 0)
+        FROM venta GROUP BY estado_venta
+        UNION ALL
+        SELECT 'cliente', 'TOTAL', COUNT(*), 0 FROM cliente
+        UNION ALL
+        SELECT 'cliente', 'CON_COMPRAS', COUNT(DISTINCT cliente_id), 0 FROM venta
+        UNION ALL
+        SELECT 'empleado', estado, COUNT(*), 0 FROM empleado GROUP BY estado
+    ),
+    real_mes AS (
+        SELECT date_trunc('month', fecha_venta)::DATE AS mes, empleado_id,
+               COUNT(*) AS cantidad, SUM(total_venta) AS monto
+        FROM venta
+        WHERE estado_venta = 'ACTIVA'
+        GROUP BY 1, 2
+    ),
+    real_cliente AS (
+        SELECT c.id AS cliente_id,
+               COUNT(v.id) FILTER (WHERE v.estado_venta = 'ACTIVA') AS cantidad,
+               COALESCE(SUM(v.total_venta) FILTER (WHERE v.estado_venta = 'ACTIVA'), 0) AS monto,
+               MAX(v.fecha_venta) FILTER (WHERE v.estado_venta = 'ACTIVA') AS ultima_compra,
+               COUNT(v.id) AS ventas_registradas
+        FROM cliente c
+        LEFT JOIN venta v ON v.cliente_id = c.id
+        GROUP BY c.id
+    )
+    SELECT COALESCE(k.entidad, r.entidad)::VARCHAR(20),
+           COALESCE(k.clave, r.clave)::TEXT,
+           COALESCE(k.cantidad, 0)::BIGINT,
+           COALESCE(r.cantidad, 0)::BIGINT,
+           COALESCE(k.monto, 0)::DECIMAL(16,2),
+           COALESCE(r.monto, 0)::DECIMAL(16,2)
+    FROM kpi_contador k
+    FULL OUTER JOIN real_contador r ON r.entidad = k.entidad AND r.clave = k.clave
+    WHERE COALESCE(k.cantidad, 0) <> COALESCE(r.cantidad, 0)
+       OR COALESCE(k.monto, 0) <> COALESCE(r.monto, 0)
+    UNION ALL
+    SELECT 'ventas_mes'::VARCHAR(20),
+           TO_CHAR(COALESCE(k.mes, r.mes), 'YYYY-MM') || '/empleado ' || COALESCE(k.empleado_id, r.empleado_id),
+           COALESCE(k.cantidad_ventas, 0)::BIGINT,
+           COALESCE(r.cantidad, 0)::BIGINT,
+           COALESCE(k.total_ventas, 0)::DECIMAL(16,2),
+           COALESCE(r.monto, 0)::DECIMAL(16,2)
+    FROM kpi_ventas_mes k
+    FULL OUTER JOIN real_mes r ON r.mes = k.mes AND r.empleado_id = k.empleado_id
+    WHERE COALESCE(k.cantidad_ventas, 0) <> COALESCE(r.cantidad, 0)
+       OR COALESCE(k.total_ventas, 0) <> COALESCE(r.monto, 0)
+    UNION ALL
+    SELECT 'cliente'::VARCHAR(20),
+           'cliente ' || COALESCE(k.cliente_id, r.cliente_id)
+               || COALESCE(' (última compra ' || k.ultima_compra || ', real ' || r.ultima_compra || ')', '')
+               || CASE WHEN k.ventas_registradas IS DISTINCT FROM r.ventas_registradas
+                       THEN ' (ventas registradas ' || COALESCE(k.ventas_registradas, 0)
+                            || ', real ' || COALESCE(r.ventas_registradas, 0) || ')'
+                       ELSE '' END,
+           COALESCE(k.total_compras, 0)::BIGINT,
+           COALESCE(r.cantidad, 0)::BIGINT,
+           COALESCE(k.monto_total, 0)::DECIMAL(16,2),
+           COALESCE(r.monto, 0)::DECIMAL(16,2)
+    FROM cliente_metricas k
+    FULL OUTER JOIN real_cliente r ON r.cliente_id = k.cliente_id
+    WHERE k.cliente_id IS NULL OR r.cliente_id IS NULL
+       OR k.total_compras <> r.cantidad
+       OR k.monto_total <> r.monto
+       OR k.ultima_compra IS DISTINCT FROM r.ultima_compra
+       OR k.ventas_registradas <> r.ventas_registradas;
+END;
+$$ LANGUAGE plpgsql;
 
+COMMENT ON FUNCTION verificar_kpis IS 
+'Devuelve las diferencias entre los contadores de KPIs guardados y un recálculo completo (vacío si son consistentes).';
@@ -157,46 +157,66 @@ COMMENT ON VIEW vw_ranking_empleados IS
 'Ranking de empleados por desempeño en ventas. Incluye clasificación con CASE.';
 
 -- Vista 6: Inventario actual con análisis
--- Vista con subconsultas y análisis de inventario
+-- Vista con funciones de ventana y análisis de inventario
 
+-- Nivel de inventario según días desde el ingreso. Los umbrales deben
+-- coincidir con NIVELES_INVENTARIO de core/services/reportes.py, que los
+-- traduce a rangos de fecha_ingreso para poder usar los índices.
+CREATE OR REPLACE FUNCTION nivel_inventario(p_dias INT)
+RETURNS TEXT AS $$
+    SELECT CASE 
+        WHEN p_dias > 180 THEN 'CRITICO'
+        WHEN p_dias > 90 THEN 'ALTO'
+        WHEN p_dias > 30 THEN 'MEDIO'
+        ELSE 'NUEVO'
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+COMMENT ON FUNCTION nivel_inventario IS 
+'Clasificación por días en inventario: NUEVO (0-30), MEDIO (31-90), ALTO (91-180), CRITICO (más de 180).';
+
+-- El promedio por marca se calcula una sola vez por marca con AVG() OVER
+-- (antes eran dos subconsultas correlacionadas por fila). Sin ORDER BY: el
+-- orden lo pone quien consulta. Para páginas filtradas usar
+-- analisis_inventario() de core/services/reportes.py, que aplica los
+-- filtros y el LIMIT sobre vehiculo y lee los promedios de kpi_contador.
 CREATE OR REPLACE VIEW vw_inventario_analisis AS
 SELECT 
-    v.id AS vehiculo_id,
-    m.nombre AS marca,
-    v.modelo,
-    v.anio,
-    v.precio,
-    v.color,
-    tv.nombre AS tipo_vehiculo,
-    v.estado_disponibilidad,
-    v.fecha_ingreso,
-    CURRENT_DATE - v.fecha_ingreso AS dias_en_inventario,
-    -- Clasificación por días en inventario usando CASE
-    CASE 
-        WHEN CURRENT_DATE - v.fecha_ingreso > 180 THEN 'CRITICO'
-        WHEN CURRENT_DATE - v.fecha_ingreso > 90 THEN 'ALTO'
-        WHEN CURRENT_DATE - v.fecha_ingreso > 30 THEN 'MEDIO'
-        ELSE 'NUEVO'
-    END AS nivel_inventario,
-    -- Comparación con precio promedio de la marca (subconsulta)
-    (
-        SELECT AVG(v2.precio)
-        FROM vehiculo v2
-        WHERE v2.marca_id = v.marca_id
-    ) AS precio_promedio_marca,
-    -- Diferencia con el promedio
-    v.precio - (
-        SELECT AVG(v2.precio)
-        FROM vehiculo v2
-        WHERE v2.marca_id = v.marca_id
-    ) AS diferencia_promedio
-FROM vehiculo v
-INNER JOIN marca m ON v.marca_id = m.id
-INNER JOIN tipo_vehiculo tv ON v.tipo_vehiculo_id = tv.id
-ORDER BY v.estado_disponibilidad, dias_en_inventario DESC;
+    vehiculo_id,
+    marca,
+    modelo,
+    anio,
+    precio,
+    color,
+    tipo_vehiculo,
+    estado_disponibilidad,
+    fecha_ingreso,
+    dias_en_inventario,
+    nivel_inventario,
+    precio_promedio_marca,
+    precio - precio_promedio_marca AS diferencia_promedio
+FROM (
+    SELECT 
+        v.id AS vehiculo_id,
+        m.nombre AS marca,
+        v.modelo,
+        v.anio,
+        v.precio,
+        v.color,
+        tv.nombre AS tipo_vehiculo,
+        v.estado_disponibilidad,
+        v.fecha_ingreso,
+        CURRENT_DATE - v.fecha_ingreso AS dias_en_inventario,
+        nivel_inventario(CURRENT_DATE - v.fecha_ingreso) AS nivel_inventario,
+        -- Comparación con precio promedio de la marca (ventana por marca)
+        AVG(v.precio) OVER (PARTITION BY v.marca_id) AS precio_promedio_marca
+    FROM vehiculo v
+    INNER JOIN marca m ON v.marca_id = m.id
+    INNER JOIN tipo_vehiculo tv ON v.tipo_vehiculo_id = tv.id
+) AS inventario;
 
 COMMENT ON VIEW vw_inventario_analisis IS 
-'Análisis completo del inventario con subconsultas, CASE y comparaciones de precios.';
+'Análisis completo del inventario con funciones de ventana, CASE y comparaciones de precios.';
 
 -- Vista 7: Resumen de auditoría
 -- Vista para consultar auditoría de forma consolidada
@@ -226,6 +246,230 @@ ORDER BY fecha_evento DESC;
 COMMENT ON VIEW vw_auditoria_consolidada IS 
 'Vista consolidada de auditoría de ventas y vehículos para consultas unificadas.';
 
+-- Vistas materializadas de reportes de ventas por marca
+--
+-- vw_ventas_mes_marca y vw_top_marcas_anio recorren venta → detalle_venta →
+-- vehiculo → marca y reagregan toda la historia en cada consulta. Sus
+-- equivalentes materializados se calculan en dos niveles:
+--   1. resumen_ventas_mes_marca: una fila por (anio, mes, marca) con los
+--      agregados necesarios para ambos reportes. Se recalcula solo para los
+--      meses tocados desde el último refresco (según aud_ventas).
+--   2. mv_ventas_mes_marca y mv_top_marcas_anio: mismas columnas que las
+--      vistas originales, calculadas sobre el resumen (pocas filas) y con
+--      índice único para REFRESH MATERIALIZED VIEW CONCURRENTLY.
+-- Para refrescar: python manage.py refrescar_reportes
+
+DROP MATERIALIZED VIEW IF EXISTS mv_ventas_mes_marca CASCADE;
+DROP MATERIALIZED VIEW IF EXISTS mv_top_marcas_anio CASCADE;
+DROP TABLE IF EXISTS resumen_ventas_mes_marca CASCADE;
+DROP TABLE IF EXISTS refresco_reportes CASCADE;
+
+-- Agregados por año, mes y marca (mismas reglas que las vistas: ventas
+-- ACTIVAS, una fila por línea de detalle)
+CREATE TABLE resumen_ventas_mes_marca (
+    anio INT NOT NULL,
+    mes INT NOT NULL,
+    marca_id BIGINT NOT NULL,
+    cantidad_ventas BIGINT NOT NULL,
+    cantidad_vehiculos BIGINT NOT NULL,
+    total_ventas DECIMAL(16,2) NOT NULL,
+    total_descuentos DECIMAL(16,2) NOT NULL,
+    CONSTRAINT pk_resumen_ventas_mes_marca PRIMARY KEY (anio, mes, marca_id)
+);
+
+COMMENT ON TABLE resumen_ventas_mes_marca IS 'Ventas ACTIVAS agregadas por año, mes y marca; base de las vistas materializadas de reportes';
+COMMENT ON COLUMN resumen_ventas_mes_marca.cantidad_ventas IS 'Ventas distintas del mes con vehículos de la marca';
+COMMENT ON COLUMN resumen_ventas_mes_marca.cantidad_vehiculos IS 'Líneas de detalle del mes con vehículos de la marca';
+COMMENT ON COLUMN resumen_ventas_mes_marca.total_ventas IS 'SUM(venta.total_venta) por línea de detalle, como en vw_ventas_mes_marca';
+
+-- Estado del último refresco incremental
+CREATE TABLE refresco_reportes (
+    nombre VARCHAR(50) PRIMARY KEY,
+    ultimo_aud_id BIGINT NOT NULL DEFAULT 0,
+    fecha_refresco TIMESTAMP,
+    meses_recalculados INT NOT NULL DEFAULT 0,
+    snapshot_refresco PG_SNAPSHOT,
+    version_resumen BIGINT NOT NULL DEFAULT 0,
+    version_anios_cerrados BIGINT NOT NULL DEFAULT 0,
+    anio_en_curso INT
+);
+
+COMMENT ON TABLE refresco_reportes IS 'Estado de cada resumen refrescado incrementalmente';
+COMMENT ON COLUMN refresco_reportes.ultimo_aud_id IS 'Mayor aud_ventas.id visto en el último refresco (informativo: los ids se asignan antes del COMMIT y no sirven como marca de agua)';
+COMMENT ON COLUMN refresco_reportes.snapshot_refresco IS 'Snapshot del último refresco; el siguiente procesa los eventos de aud_ventas cuya transacción no era visible en él';
+COMMENT ON COLUMN refresco_reportes.version_resumen IS 'Se incrementa cada vez que un refresco recalcula algún mes';
+COMMENT ON COLUMN refresco_reportes.version_anios_cerrados IS 'Se incrementa cuando un refresco recalcula meses de años anteriores a anio_en_curso; invalida la caché permanente de años cerrados';
+COMMENT ON COLUMN refresco_reportes.anio_en_curso IS 'Año en curso según el último refresco (nunca retrocede); la aplicación trata como cerrados los años anteriores, así ambos lados usan la misma fecha';
+
+INSERT INTO refresco_reportes (nombre) VALUES ('ventas_mes_marca');
+
+-- Recalcula el resumen de los meses tocados en aud_ventas desde el último
+-- refresco (o de todos con p_completo). Los meses se recalculan desde venta
+-- con un rango de fechas, así que cada uno lee solo sus ventas.
+--
+-- Los eventos pendientes son los de transacciones que no eran visibles en el
+-- snapshot del refresco anterior (en curso o posteriores). Una marca de agua
+-- por id no sirve: una transacción que tomó el id N y hace COMMIT después de
+-- un refresco que ya vio ids mayores quedaría fuera para siempre. Los eventos
+-- visibles en este snapshot pueden volver a procesarse en el siguiente
+-- refresco; recalcular un mes dos veces da el mismo resultado.
+CREATE OR REPLACE FUNCTION refrescar_resumen_ventas(p_completo BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (
+    meses_recalculados INT,
+    ultimo_aud_id BIGINT
+) AS $$
+DECLARE
+    v_anterior PG_SNAPSHOT;
+    v_snapshot PG_SNAPSHOT;
+    v_hasta BIGINT;
+    v_meses DATE[];
+    v_cerrados BOOLEAN;
+    v_anio INT;
+BEGIN
+    -- Serializa los refrescos concurrentes. El año en curso se guarda en
+    -- refresco_reportes y no retrocede aunque otra sesión tenga otra zona horaria
+    SELECT r.snapshot_refresco, GREATEST(r.anio_en_curso, EXTRACT(YEAR FROM CURRENT_DATE)::INT)
+    INTO v_anterior, v_anio
+    FROM refresco_reportes r
+    WHERE r.nombre = 'ventas_mes_marca'
+    FOR UPDATE;
+
+    -- Antes de leer aud_ventas y venta: todo lo visible aquí lo verán
+    -- también las consultas siguientes
+    v_snapshot := pg_current_snapshot();
+
+    SELECT COALESCE(MAX(a.id), 0) INTO v_hasta FROM aud_ventas a;
+
+    IF p_completo OR v_anterior IS NULL THEN
+        SELECT ARRAY_AGG(DISTINCT date_trunc('month', v.fecha_venta)::DATE)
+        INTO v_meses
+        FROM venta v;
+        DELETE FROM resumen_ventas_mes_marca;
+        v_cerrados := TRUE;
+    ELSE
+        -- Un UPDATE que cambia fecha_venta toca el mes anterior y el nuevo
+        SELECT ARRAY_AGG(DISTINCT m.mes)
+        INTO v_meses
+        FROM aud_ventas a
+        CROSS JOIN LATERAL (
+            VALUES (date_trunc('month', (a.old_data->>'fecha_venta')::DATE)::DATE),
+                   (date_trunc('month', (a.new_data->>'fecha_venta')::DATE)::DATE)
+        ) AS m(mes)
+        WHERE a.xid_transaccion >= pg_snapshot_xmin(v_anterior)
+          AND NOT pg_visible_in_snapshot(a.xid_transaccion, v_anterior)
+          AND m.mes IS NOT NULL;
+
+        DELETE FROM resumen_ventas_mes_marca r
+        WHERE make_date(r.anio, r.mes, 1) = ANY(COALESCE(v_meses, '{}'));
+
+        -- Cancelaciones o correcciones de ventas de años ya cerrados (los
+        -- anteriores a anio_en_curso, que es lo que lee agregados_por_anio)
+        v_cerrados := EXISTS (
+            SELECT 1 FROM UNNEST(COALESCE(v_meses, '{}')) AS m(mes)
+            WHERE m.mes < make_date(v_anio, 1, 1)
+        );
+    END IF;
+
+    INSERT INTO resumen_ventas_mes_marca (
+        anio, mes, marca_id, cantidad_ventas, cantidad_vehiculos, total_ventas, total_descuentos
+    )
+    SELECT 
+        EXTRACT(YEAR FROM m.mes)::INT,
+        EXTRACT(MONTH FROM m.mes)::INT,
+        vh.marca_id,
+        COUNT(DISTINCT v.id),
+        COUNT(dv.id),
+        SUM(v.total_venta),
+        SUM(v.descuento_aplicado)
+    FROM UNNEST(COALESCE(v_meses, '{}')) AS m(mes)
+    INNER JOIN venta v
+        ON v.fecha_venta >= m.mes
+       AND v.fecha_venta < (m.mes + INTERVAL '1 month')::DATE
+       AND v.estado_venta = 'ACTIVA'
+    INNER JOIN detalle_venta dv ON v.id = dv.venta_id
+    INNER JOIN vehiculo vh ON dv.vehiculo_id = vh.id
+    GROUP BY m.mes, vh.marca_id;
+
+    UPDATE refresco_reportes r
+    SET ultimo_aud_id = v_hasta,
+        snapshot_refresco = v_snapshot,
+        fecha_refresco = CURRENT_TIMESTAMP,
+        meses_recalculados = COALESCE(array_length(v_meses, 1), 0),
+        version_resumen = r.version_resumen + CASE WHEN v_meses IS NULL THEN 0 ELSE 1 END,
+        version_anios_cerrados = r.version_anios_cerrados + CASE WHEN v_cerrados THEN 1 ELSE 0 END,
+        anio_en_curso = v_anio
+    WHERE r.nombre = 'ventas_mes_marca';
+
+    RETURN QUERY SELECT COALESCE(array_length(v_meses, 1), 0), v_hasta;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION refrescar_resumen_ventas IS 
+'Recalcula resumen_ventas_mes_marca solo para los meses con eventos de aud_ventas no visibles en el snapshot del refresco anterior (o completo con p_completo).';
+
+SELECT * FROM refrescar_resumen_ventas(TRUE);
+
+-- Equivalente materializado de vw_ventas_mes_marca
+CREATE MATERIALIZED VIEW mv_ventas_mes_marca AS
+SELECT 
+    r.anio,
+    r.mes,
+    TO_CHAR(make_date(r.anio, r.mes, 1), 'Month') AS mes_nombre,
+    SUM(CASE WHEN m.nombre = 'Toyota' THEN r.total_ventas ELSE 0 END) AS toyota,
+    SUM(CASE WHEN m.nombre = 'Honda' THEN r.total_ventas ELSE 0 END) AS honda,
+    SUM(CASE WHEN m.nombre = 'Ford' THEN r.total_ventas ELSE 0 END) AS ford,
+    SUM(CASE WHEN m.nombre = 'Chevrolet' THEN r.total_ventas ELSE 0 END) AS chevrolet,
+    SUM(CASE WHEN m.nombre = 'Nissan' THEN r.total_ventas ELSE 0 END) AS nissan,
+    SUM(CASE WHEN m.nombre = 'Mazda' THEN r.total_ventas ELSE 0 END) AS mazda,
+    SUM(CASE WHEN m.nombre = 'Volkswagen' THEN r.total_ventas ELSE 0 END) AS volkswagen,
+    SUM(CASE WHEN m.nombre NOT IN ('Toyota', 'Honda', 'Ford', 'Chevrolet', 'Nissan', 'Mazda', 'Volkswagen') 
+        THEN r.total_ventas ELSE 0 END) AS otras_marcas,
+    SUM(r.total_ventas) AS total_mes,
+    SUM(r.cantidad_vehiculos)::BIGINT AS cantidad_ventas
+FROM resumen_ventas_mes_marca r
+INNER JOIN marca m ON r.marca_id = m.id
+GROUP BY r.anio, r.mes;
+
+CREATE UNIQUE INDEX idx_mv_ventas_mes_marca ON mv_ventas_mes_marca(anio, mes);
+
+COMMENT ON MATERIALIZED VIEW mv_ventas_mes_marca IS 
+'Equivalente materializado de vw_ventas_mes_marca calculado sobre resumen_ventas_mes_marca.';
+
+-- Equivalente materializado de vw_top_marcas_anio
+CREATE MATERIALIZED VIEW mv_top_marcas_anio AS
+SELECT 
+    anio,
+    marca,
+    total_ventas,
+    cantidad_ventas,
+    cantidad_vehiculos,
+    promedio_venta,
+    RANK() OVER (PARTITION BY anio ORDER BY total_ventas DESC) AS posicion_rank,
+    DENSE_RANK() OVER (PARTITION BY anio ORDER BY total_ventas DESC) AS posicion_dense,
+    ROW_NUMBER() OVER (PARTITION BY anio ORDER BY total_ventas DESC, cantidad_ventas DESC) AS posicion_row,
+    ROUND(
+        (total_ventas * 100.0) / SUM(total_ventas) OVER (PARTITION BY anio),
+        2
+    ) AS porcentaje_del_anio
+FROM (
+    SELECT 
+        r.anio,
+        m.nombre AS marca,
+        SUM(r.total_ventas) AS total_ventas,
+        SUM(r.cantidad_ventas)::BIGINT AS cantidad_ventas,
+        SUM(r.cantidad_vehiculos)::BIGINT AS cantidad_vehiculos,
+        SUM(r.total_ventas) / SUM(r.cantidad_vehiculos) AS promedio_venta
+    FROM resumen_ventas_mes_marca r
+    INNER JOIN marca m ON r.marca_id = m.id
+    GROUP BY r.anio, m.nombre
+) AS ventas_por_marca;
+
+CREATE UNIQUE INDEX idx_mv_top_marcas_anio ON mv_top_marcas_anio(anio, marca);
+CREATE INDEX idx_mv_top_marcas_anio_rank ON mv_top_marcas_anio(anio, posicion_rank);
+
+COMMENT ON MATERIALIZED VIEW mv_top_marcas_anio IS 
+'Equivalente materializado de vw_top_marcas_anio (RANK, DENSE_RANK, ROW_NUMBER) calculado sobre resumen_ventas_mes_marca.';
+
 -- Funciones auxiliares para consultar vistas
 
 -- Función para obtener ventas PIVOT de un año específico
@@ -259,14 +503,14 @@ BEGIN
         v.otras_marcas,
         v.total_mes,
         v.cantidad_ventas
-    FROM vw_ventas_mes_marca v
+    FROM mv_ventas_mes_marca v
     WHERE v.anio = p_anio
     ORDER BY v.mes;
 END;
 $$ LANGUAGE plpgsql;
 
 COMMENT ON FUNCTION obtener_ventas_pivot IS 
-'Obtiene el reporte PIVOT de ventas por mes y marca para un año específico.';
+'Obtiene el reporte PIVOT de ventas por mes y marca para un año específico (desde mv_ventas_mes_marca).';
 
 -- Función para obtener Top 5 marcas de un año
 CREATE OR REPLACE FUNCTION obtener_top5_marcas(p_anio INT)
@@ -285,13 +529,49 @@ BEGIN
         t.total_ventas,
         t.cantidad_ventas,
         t.porcentaje_del_anio
-    FROM vw_top_marcas_anio t
+    FROM mv_top_marcas_anio t
     WHERE t.anio = p_anio AND t.posicion_rank <= 5
     ORDER BY t.posicion_rank;
 END;
 $$ LANGUAGE plpgsql;
 
 COMMENT ON FUNCTION obtener_top5_marcas IS 
-'Obtiene el Top 5 de marcas más vendidas para un año específico usando RANK.';
+'Obtiene el Top 5 de marcas más vendidas para un año específico usando RANK (desde mv_top_marcas_anio).';
+
 
 
+-- Función para obtener el ranking de vendedores de un mes
+-- Mismo criterio que vw_ranking_empleados, pero para un solo mes y sin
+-- recorrer venta: lee las cantidades de kpi_ventas_mes (una fila por
+-- empleado y mes, mantenida por triggers). Devuelve la posición (RANK) y el
+-- total de empleados activos en cada fila.
+CREATE OR REPLACE FUNCTION ranking_empleados_mes(p_mes DATE DEFAULT CURRENT_DATE)
+RETURNS TABLE (
+    empleado_id BIGINT,
+    nombre_completo VARCHAR(100),
+    puesto VARCHAR(50),
+    cantidad_ventas BIGINT,
+    total_ventas DECIMAL(16,2),
+    posicion_por_cantidad BIGINT,
+    total_empleados BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT 
+        e.id,
+        e.nombre_completo,
+        e.puesto,
+        COALESCE(k.cantidad_ventas, 0),
+        COALESCE(k.total_ventas, 0),
+        RANK() OVER (ORDER BY COALESCE(k.cantidad_ventas, 0) DESC),
+        COUNT(*) OVER ()
+    FROM empleado e
+    LEFT JOIN kpi_ventas_mes k
+        ON k.empleado_id = e.id AND k.mes = date_trunc('month', p_mes)::DATE
+    WHERE e.estado = 'ACTIVO'
+    ORDER BY 6, e.nombre_completo;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION ranking_empleados_mes IS 
+'Ranking de empleados activos por cantidad de ventas ACTIVAS de un mes (RANK sobre kpi_ventas_mes), con el total de empleados en cada fila.';
@@ -182,6 +182,9 @@ SELECT registrar_venta(2, 3, 2, 6, 685000.00, 1, FALSE, FALSE); -- Toyota Highla
 SELECT registrar_venta(3, 4, 1, 16, 265000.00, 1, TRUE, FALSE); -- Honda Fit
 SELECT registrar_venta(4, 1, 3, 26, 785000.00, 1, FALSE, FALSE); -- Ford Bronco (cliente 4 segunda compra)
 
+-- Reconstruir contadores de KPIs (TRUNCATE no dispara los triggers)
+SELECT recalcular_kpis();
+
 -- Verificación de datos
 
 -- Contar registros